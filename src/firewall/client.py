@@ -25,6 +25,7 @@ from gi.repository import GLib, GObject
 import sys
 sys.modules['gobject'] = GObject
 
+import copy
 import dbus.mainloop.glib
 import slip.dbus
 
@@ -36,13 +37,17 @@ from firewall.dbus_utils import dbus_to_python
 import dbus
 from decorator import decorator
 from firewall.functions import b2u
-from firewall.core.rich import Rich_Rule
 
 import traceback
 
 exception_handler = None
 not_authorized_loop = False
 
+def _rich_rule_str(rule):
+    # the rich rule parser is only loaded if zone settings use rich rules
+    from firewall.core.rich import Rich_Rule
+    return str(Rich_Rule(rule_str=rule))
+
 @decorator
 def handle_exceptions(func, *args, **kwargs):
     """Decorator to handle exceptions
@@ -82,6 +87,126 @@ def handle_exceptions(func, *args, **kwargs):
         if not not_authorized_loop:
             break
 
+# settings cache
+
+class FirewallClientCache(object):
+    """Local cache for runtime and permanent settings
+
+    Entries are stored with tuple keys like ("zone", name) or
+    ("config", "settings", path). Changes done with the client drop the
+    affected entries right away, changes of other clients are dropped if a
+    signal reports them. Reloaded and connection changes drop all entries.
+
+    Signals are only dispatched while a GLib main loop is running. Without
+    a main loop changes of other clients are not seen in the cache, use
+    refreshCache before reading settings then.
+    """
+
+    def __init__(self):
+        self._data = { }
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return '%s(%r, %r, %r)' % (self.__class__, len(self._data), self.hits,
+                                   self.misses)
+
+    def clear(self):
+        self._data.clear()
+
+    def get(self, key, fetch):
+        # Return a copy of the cached value for key, uncached values are
+        # fetched with fetch. Failed fetches returning None are not cached.
+        if key in self._data:
+            self.hits += 1
+        else:
+            self.misses += 1
+            value = fetch()
+            if value is None:
+                return None
+            self._data[key] = value
+        return copy.deepcopy(self._data[key])
+
+    def set(self, key, value):
+        self._data[key] = value
+
+    def invalidate(self, *prefix):
+        # drop all entries with keys starting with prefix
+        for key in [ x for x in self._data if x[:len(prefix)] == prefix ]:
+            del self._data[key]
+
+    def signal(self, interface, member, path, args):
+        if interface == DBUS_INTERFACE:
+            if member in [ "Reloaded", "connection-established",
+                           "connection-lost", "connection-changed" ]:
+                self.clear()
+            elif member == "DefaultZoneChanged":
+                # interfaces bound to the default zone moved with it
+                self.invalidate("default_zone")
+                self.invalidate("zone")
+        elif interface == DBUS_INTERFACE_ZONE:
+            if member in [ "ZoneOfInterfaceChanged", "ZoneOfSourceChanged" ]:
+                # the old zone of the interface or source is not known
+                self.invalidate("zone")
+            elif len(args) > 0:
+                self.invalidate("zone", args[0])
+        elif interface == DBUS_INTERFACE_CONFIG:
+            # ZoneAdded, ServiceAdded or IcmpTypeAdded
+            for (signal, key) in [ ("ZoneAdded", "zone"),
+                                   ("ServiceAdded", "service"),
+                                   ("IcmpTypeAdded", "icmptype") ]:
+                if member == signal:
+                    self.invalidate("config", key)
+        else:
+            for (_interface, key) in [
+                    (DBUS_INTERFACE_CONFIG_ZONE, "zone"),
+                    (DBUS_INTERFACE_CONFIG_SERVICE, "service"),
+                    (DBUS_INTERFACE_CONFIG_ICMPTYPE, "icmptype") ]:
+                if interface == _interface:
+                    self.invalidate("config", "settings", path)
+                    if member in [ "Removed", "Renamed" ]:
+                        self.invalidate("config", key)
+
+def invalidates(*prefix):
+    """Decorator for changes of settings that might be in the cache of the
+    object, the entries with keys starting with prefix are dropped after
+    the call. All entries are dropped without prefix.
+    """
+    def _invalidates(func, *args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if args[0]._cache is not None:
+                args[0]._cache.invalidate(*prefix)
+    return decorator(_invalidates)
+
+@decorator
+def invalidates_zone(func, *args, **kwargs):
+    """Decorator for runtime zone changes, drops the cached settings of the
+    changed zone returned by the call, of all zones if the call failed.
+    """
+    zone = None
+    try:
+        zone = func(*args, **kwargs)
+        return zone
+    finally:
+        if args[0]._cache is not None:
+            if zone:
+                args[0]._cache.invalidate("zone", zone)
+            else:
+                args[0]._cache.invalidate("zone")
+
+@decorator
+def invalidates_settings(func, *args, **kwargs):
+    """Decorator for changes of permanent config objects, drops the cached
+    settings of the object.
+    """
+    try:
+        return func(*args, **kwargs)
+    finally:
+        if args[0]._cache is not None:
+            args[0]._cache.invalidate("config", "settings", args[0].path)
+
 # zone config setings
 
 class FirewallClientZoneSettings(object):
@@ -277,30 +402,31 @@ class FirewallClientZoneSettings(object):
         return self.settings[12]
     @handle_exceptions
     def setRichRules(self, rules):
-        rules = [ str(Rich_Rule(rule_str=r)) for r in rules ]
+        rules = [ _rich_rule_str(r) for r in rules ]
         self.settings[12] = rules
     @handle_exceptions
     def addRichRule(self, rule):
-        rule = str(Rich_Rule(rule_str=rule))
+        rule = _rich_rule_str(rule)
         if rule not in self.settings[12]:
             self.settings[12].append(rule)
     @handle_exceptions
     def removeRichRule(self, rule):
-        rule = str(Rich_Rule(rule_str=rule))
+        rule = _rich_rule_str(rule)
         if rule in self.settings[12]:
             self.settings[12].remove(rule)
     @handle_exceptions
     def queryRichRule(self, rule):
-        rule = str(Rich_Rule(rule_str=rule))
+        rule = _rich_rule_str(rule)
         return rule in self.settings[12]
 
 
 # zone config
 
 class FirewallClientConfigZone(object):
-    def __init__(self, bus, path):
+    def __init__(self, bus, path, cache=None):
         self.bus = bus
         self.path = path
+        self._cache = cache
         self.dbus_obj = self.bus.get_object(DBUS_INTERFACE, path)
         self.fw_zone = dbus.Interface(self.dbus_obj,
                                       dbus_interface=DBUS_INTERFACE_CONFIG_ZONE)
@@ -328,26 +454,43 @@ class FirewallClientConfigZone(object):
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def getSettings(self):
+        if self._cache is not None:
+            settings = self._cache.get(
+                ("config", "settings", self.path),
+                lambda: list(dbus_to_python(self.fw_zone.getSettings())))
+            return FirewallClientZoneSettings(settings)
         return FirewallClientZoneSettings(list(dbus_to_python(\
                     self.fw_zone.getSettings())))
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    def getSettingsRange(self, key, offset, count):
+        return dbus_to_python(self.fw_zone.getSettingsRange(key, offset,
+                                                            count))
+
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    @invalidates_settings
     def update(self, settings):
         self.fw_zone.update(tuple(settings.settings))
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def loadDefaults(self):
         self.fw_zone.loadDefaults()
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
+    @invalidates("config", "zone")
     def remove(self):
         self.fw_zone.remove()
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
+    @invalidates("config", "zone")
     def rename(self, name):
         self.fw_zone.rename(name)
 
@@ -360,6 +503,7 @@ class FirewallClientConfigZone(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setVersion(self, version):
         self.fw_zone.setVersion(version)
 
@@ -372,6 +516,7 @@ class FirewallClientConfigZone(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setShort(self, short):
         self.fw_zone.setShort(short)
 
@@ -384,6 +529,7 @@ class FirewallClientConfigZone(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setDescription(self, description):
         self.fw_zone.setDescription(description)
 
@@ -396,6 +542,7 @@ class FirewallClientConfigZone(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setTarget(self, target):
         self.fw_zone.setTarget(target)
 
@@ -408,16 +555,19 @@ class FirewallClientConfigZone(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setServices(self, services):
         self.fw_zone.setServices(services)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def addService(self, service):
         self.fw_zone.addService(service)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def removeService(self, service):
         self.fw_zone.removeService(service)
 
@@ -435,16 +585,19 @@ class FirewallClientConfigZone(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setPorts(self, ports):
         self.fw_zone.setPorts(ports)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def addPort(self, port, protocol):
         self.fw_zone.addPort(port, protocol)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def removePort(self, port, protocol):
         self.fw_zone.removePort(port, protocol)
 
@@ -462,16 +615,19 @@ class FirewallClientConfigZone(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setProtocols(self, protocols):
         self.fw_zone.setProtocols(protocols)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def addProtocol(self, protocol):
         self.fw_zone.addProtocol(protocol)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def removeProtocol(self, protocol):
         self.fw_zone.removeProtocol(protocol)
 
@@ -489,16 +645,19 @@ class FirewallClientConfigZone(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setIcmpBlocks(self, icmptypes):
         self.fw_zone.setIcmpBlocks(icmptypes)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def addIcmpBlock(self, icmptype):
         self.fw_zone.addIcmpBlock(icmptype)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def removeIcmpBlock(self, icmptype):
         self.fw_zone.removeIcmpBlock(icmptype)
 
@@ -516,16 +675,19 @@ class FirewallClientConfigZone(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setMasquerade(self, masquerade):
         self.fw_zone.setMasquerade(masquerade)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def addMasquerade(self):
         self.fw_zone.addMasquerade()
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def removeMasquerade(self):
         self.fw_zone.removeMasquerade()
 
@@ -543,11 +705,13 @@ class FirewallClientConfigZone(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setForwardPorts(self, ports):
         self.fw_zone.setForwardPorts(ports)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def addForwardPort(self, port, protocol, toport, toaddr):
         if toport is None:
             toport = ''
@@ -557,6 +721,7 @@ class FirewallClientConfigZone(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def removeForwardPort(self, port, protocol, toport, toaddr):
         if toport is None:
             toport = ''
@@ -582,16 +747,19 @@ class FirewallClientConfigZone(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setInterfaces(self, interfaces):
         self.fw_zone.setInterfaces(interfaces)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def addInterface(self, interface):
         self.fw_zone.addInterface(interface)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def removeInterface(self, interface):
         self.fw_zone.removeInterface(interface)
 
@@ -609,16 +777,19 @@ class FirewallClientConfigZone(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setSources(self, sources):
         self.fw_zone.setSources(sources)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def addSource(self, source):
         self.fw_zone.addSource(source)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def removeSource(self, source):
         self.fw_zone.removeSource(source)
 
@@ -636,16 +807,19 @@ class FirewallClientConfigZone(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setRichRules(self, rules):
         self.fw_zone.setRichRules(rules)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def addRichRule(self, rule):
         self.fw_zone.addRichRule(rule)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def removeRichRule(self, rule):
         self.fw_zone.removeRichRule(rule)
 
@@ -766,9 +940,10 @@ class FirewallClientServiceSettings(object):
 
 class FirewallClientConfigService(object):
     @handle_exceptions
-    def __init__(self, bus, path):
+    def __init__(self, bus, path, cache=None):
         self.bus = bus
         self.path = path
+        self._cache = cache
         self.dbus_obj = self.bus.get_object(DBUS_INTERFACE, path)
         self.fw_service = dbus.Interface(self.dbus_obj,
                                          dbus_interface=DBUS_INTERFACE_CONFIG_SERVICE)
@@ -794,26 +969,37 @@ class FirewallClientConfigService(object):
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def getSettings(self):
+        if self._cache is not None:
+            settings = self._cache.get(
+                ("config", "settings", self.path),
+                lambda: list(dbus_to_python(self.fw_service.getSettings())))
+            return FirewallClientServiceSettings(settings)
         return FirewallClientServiceSettings(list(dbus_to_python(\
                     self.fw_service.getSettings())))
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def update(self, settings):
         self.fw_service.update(tuple(settings.settings))
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def loadDefaults(self):
         self.fw_service.loadDefaults()
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
+    @invalidates("config", "service")
     def remove(self):
         self.fw_service.remove()
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
+    @invalidates("config", "service")
     def rename(self, name):
         self.fw_service.rename(name)
 
@@ -826,6 +1012,7 @@ class FirewallClientConfigService(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setVersion(self, version):
         self.fw_service.setVersion(version)
 
@@ -838,6 +1025,7 @@ class FirewallClientConfigService(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setShort(self, short):
         self.fw_service.setShort(short)
 
@@ -850,6 +1038,7 @@ class FirewallClientConfigService(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setDescription(self, description):
         self.fw_service.setDescription(description)
 
@@ -862,16 +1051,19 @@ class FirewallClientConfigService(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setPorts(self, ports):
         self.fw_service.setPorts(ports)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def addPort(self, port, protocol):
         self.fw_service.addPort(port, protocol)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def removePort(self, port, protocol):
         self.fw_service.removePort(port, protocol)
 
@@ -889,16 +1081,19 @@ class FirewallClientConfigService(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setProtocols(self, protocols):
         self.fw_service.setProtocols(protocols)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def addProtocol(self, protocol):
         self.fw_service.addProtocol(protocol)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def removeProtocol(self, protocol):
         self.fw_service.removeProtocol(protocol)
 
@@ -916,16 +1111,19 @@ class FirewallClientConfigService(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setModules(self, modules):
         self.fw_service.setModules(modules)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def addModule(self, module):
         self.fw_service.addModule(module)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def removeModule(self, module):
         self.fw_service.removeModule(module)
 
@@ -943,6 +1141,7 @@ class FirewallClientConfigService(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setDestinations(self, destinations):
         self.fw_service.setDestinations(destinations)
 
@@ -953,11 +1152,13 @@ class FirewallClientConfigService(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setDestination(self, destination, address):
         self.fw_service.setDestination(destination, address)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def removeDestination(self, destination):
         self.fw_service.removeDestination(destination)
 
@@ -1032,9 +1233,10 @@ class FirewallClientIcmpTypeSettings(object):
 
 class FirewallClientConfigIcmpType(object):
     @handle_exceptions
-    def __init__(self, bus, path):
+    def __init__(self, bus, path, cache=None):
         self.bus = bus
         self.path = path
+        self._cache = cache
         self.dbus_obj = self.bus.get_object(DBUS_INTERFACE, path)
         self.fw_icmptype = dbus.Interface(self.dbus_obj,
                                           dbus_interface=DBUS_INTERFACE_CONFIG_ICMPTYPE)
@@ -1060,26 +1262,37 @@ class FirewallClientConfigIcmpType(object):
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def getSettings(self):
+        if self._cache is not None:
+            settings = self._cache.get(
+                ("config", "settings", self.path),
+                lambda: list(dbus_to_python(self.fw_icmptype.getSettings())))
+            return FirewallClientIcmpTypeSettings(settings)
         return FirewallClientIcmpTypeSettings(list(dbus_to_python(\
                     self.fw_icmptype.getSettings())))
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def update(self, settings):
         self.fw_icmptype.update(tuple(settings.settings))
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def loadDefaults(self):
         self.fw_icmptype.loadDefaults()
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
+    @invalidates("config", "icmptype")
     def remove(self):
         self.fw_icmptype.remove()
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
+    @invalidates("config", "icmptype")
     def rename(self, name):
         self.fw_icmptype.rename(name)
 
@@ -1092,6 +1305,7 @@ class FirewallClientConfigIcmpType(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setVersion(self, version):
         self.fw_icmptype.setVersion(version)
 
@@ -1104,6 +1318,7 @@ class FirewallClientConfigIcmpType(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setShort(self, short):
         self.fw_icmptype.setShort(short)
 
@@ -1116,6 +1331,7 @@ class FirewallClientConfigIcmpType(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setDescription(self, description):
         self.fw_icmptype.setDescription(description)
 
@@ -1128,16 +1344,19 @@ class FirewallClientConfigIcmpType(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def setDestinations(self, destinations):
         self.fw_icmptype.setDestinations(destinations)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def addDestination(self, destination):
         self.fw_icmptype.addDestination(destination)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_settings
     def removeDestination(self, destination):
         self.fw_icmptype.removeDestination(destination)
 
@@ -1558,8 +1777,9 @@ class FirewallClientConfigDirect(object):
 
 class FirewallClientConfig(object):
     @handle_exceptions
-    def __init__(self, bus):
+    def __init__(self, bus, cache=None):
         self.bus = bus
+        self._cache = cache
         self.dbus_obj = self.bus.get_object(DBUS_INTERFACE,
                                             DBUS_PATH_CONFIG)
         self.fw_config = dbus.Interface(self.dbus_obj,
@@ -1592,18 +1812,27 @@ class FirewallClientConfig(object):
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def listZones(self):
+        if self._cache is not None:
+            return self._cache.get(
+                ("config", "zone"),
+                lambda: dbus_to_python(self.fw_config.listZones()))
         return dbus_to_python(self.fw_config.listZones())
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def getZone(self, path):
-        return FirewallClientConfigZone(self.bus, path)
+        return FirewallClientConfigZone(self.bus, path, self._cache)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def getZoneByName(self, name):
-        path = dbus_to_python(self.fw_config.getZoneByName(name))
-        return FirewallClientConfigZone(self.bus, path)
+        if self._cache is not None:
+            path = self._cache.get(
+                ("config", "zone", name),
+                lambda: dbus_to_python(self.fw_config.getZoneByName(name)))
+        else:
+            path = dbus_to_python(self.fw_config.getZoneByName(name))
+        return FirewallClientConfigZone(self.bus, path, self._cache)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
@@ -1617,57 +1846,105 @@ class FirewallClientConfig(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    def getZonesOfService(self, service):
+        return dbus_to_python(self.fw_config.getZonesOfService(service))
+
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    def getZonesOfIcmpType(self, icmptype):
+        return dbus_to_python(self.fw_config.getZonesOfIcmpType(icmptype))
+
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    @invalidates("config", "zone")
     def addZone(self, name, settings):
         path = self.fw_config.addZone(name, tuple(settings.settings))
-        return FirewallClientConfigZone(self.bus, path)
+        return FirewallClientConfigZone(self.bus, path, self._cache)
 
     # service
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def listServices(self):
+        if self._cache is not None:
+            return self._cache.get(
+                ("config", "service"),
+                lambda: dbus_to_python(self.fw_config.listServices()))
         return dbus_to_python(self.fw_config.listServices())
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def getService(self, path):
-        return FirewallClientConfigService(self.bus, path)
+        return FirewallClientConfigService(self.bus, path, self._cache)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def getServiceByName(self, name):
-        path = dbus_to_python(self.fw_config.getServiceByName(name))
-        return FirewallClientConfigService(self.bus, path)
+        if self._cache is not None:
+            path = self._cache.get(
+                ("config", "service", name),
+                lambda: dbus_to_python(self.fw_config.getServiceByName(name)))
+        else:
+            path = dbus_to_python(self.fw_config.getServiceByName(name))
+        return FirewallClientConfigService(self.bus, path, self._cache)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates("config", "service")
     def addService(self, name, settings):
         path = self.fw_config.addService(name, tuple(settings.settings))
-        return FirewallClientConfigService(self.bus, path)
+        return FirewallClientConfigService(self.bus, path, self._cache)
 
     # icmptype
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def listIcmpTypes(self):
+        if self._cache is not None:
+            return self._cache.get(
+                ("config", "icmptype"),
+                lambda: dbus_to_python(self.fw_config.listIcmpTypes()))
         return dbus_to_python(self.fw_config.listIcmpTypes())
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def getIcmpType(self, path):
-        return FirewallClientConfigIcmpType(self.bus, path)
+        return FirewallClientConfigIcmpType(self.bus, path, self._cache)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def getIcmpTypeByName(self, name):
-        path = dbus_to_python(self.fw_config.getIcmpTypeByName(name))
-        return FirewallClientConfigIcmpType(self.bus, path)
+        if self._cache is not None:
+            path = self._cache.get(
+                ("config", "icmptype", name),
+                lambda: dbus_to_python(self.fw_config.getIcmpTypeByName(name)))
+        else:
+            path = dbus_to_python(self.fw_config.getIcmpTypeByName(name))
+        return FirewallClientConfigIcmpType(self.bus, path, self._cache)
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates("config", "icmptype")
     def addIcmpType(self, name, settings):
         path = self.fw_config.addIcmpType(name, tuple(settings.settings))
-        return FirewallClientConfigIcmpType(self.bus, path)
+        return FirewallClientConfigIcmpType(self.bus, path, self._cache)
+
+    # all settings
+
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    def getAllSettings(self):
+        """Return dicts of the permanent zone, service and icmptype settings
+        by name, fetched with a single call
+        """
+        (zones, services, icmptypes) = \
+            dbus_to_python(self.fw_config.getAllSettings())
+        return (dict((name, FirewallClientZoneSettings(list(zones[name])))
+                     for name in zones),
+                dict((name, FirewallClientServiceSettings(
+                    list(services[name]))) for name in services),
+                dict((name, FirewallClientIcmpTypeSettings(
+                    list(icmptypes[name]))) for name in icmptypes))
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
@@ -1683,7 +1960,18 @@ class FirewallClientConfig(object):
 
 class FirewallClient(object):
     @handle_exceptions
-    def __init__(self, bus=None, wait=0, quiet=True):
+    def __init__(self, bus=None, wait=0, quiet=True, cache=False,
+                 signals=True):
+        """Connect to firewalld
+
+        With signals disabled no signal receivers are added to the bus,
+        callbacks except for the client callbacks are not called then.
+        This saves the match rule round trips to the bus daemon for one-shot
+        clients. The cache needs signals and a running GLib main loop to
+        see changes of other clients, see FirewallClientCache.
+        """
+        if cache and not signals:
+            raise ValueError("The cache needs signals")
         if not bus:
             dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
             try:
@@ -1695,27 +1983,8 @@ class FirewallClient(object):
         else:
             self.bus = bus
 
-        self.bus.add_signal_receiver(
-            handler_function=self._dbus_connection_changed,
-            signal_name="NameOwnerChanged",
-            dbus_interface="org.freedesktop.DBus",
-            arg0=DBUS_INTERFACE)
-
-        for interface in [ DBUS_INTERFACE,
-                           DBUS_INTERFACE_ZONE,
-                           DBUS_INTERFACE_DIRECT,
-                           DBUS_INTERFACE_POLICIES,
-                           DBUS_INTERFACE_CONFIG,
-                           DBUS_INTERFACE_CONFIG_ZONE,
-                           DBUS_INTERFACE_CONFIG_SERVICE,
-                           DBUS_INTERFACE_CONFIG_DIRECT,
-                           DBUS_INTERFACE_CONFIG_ICMPTYPE,
-                           DBUS_INTERFACE_CONFIG_POLICIES ]:
-            self.bus.add_signal_receiver(self._signal_receiver,
-                                         dbus_interface=interface,
-                                         interface_keyword='interface',
-                                         member_keyword='member',
-                                         path_keyword='path')
+        if signals:
+            self._add_signal_receivers()
 
         # callbacks
         self._callback = { }
@@ -1729,6 +1998,9 @@ class FirewallClient(object):
             "panic-mode-enabled": "PanicModeEnabled",
             "panic-mode-disabled": "PanicModeDisabled",
             "reloaded": "Reloaded",
+            "operation-started": "OperationStarted",
+            "operation-progress": "OperationProgress",
+            "operation-finished": "OperationFinished",
             "service-added": "ServiceAdded",
             "service-removed": "ServiceRemoved",
             "port-added": "PortAdded",
@@ -1750,6 +2022,7 @@ class FirewallClient(object):
             "source-added": "SourceAdded",
             "source-removed": "SourceRemoved",
             "zone-of-source-changed": "ZoneOfSourceChanged",
+            "zone-items-changed": "ZoneItemsChanged",
             # direct callbacks
             "direct:chain-added": "ChainAdded",
             "direct:chain-removed": "ChainRemoved",
@@ -1790,17 +2063,48 @@ class FirewallClient(object):
 
         self.quiet = quiet
 
+        # optional settings cache, kept up to date with signals
+        if cache:
+            self._cache = FirewallClientCache()
+        else:
+            self._cache = None
+
         if wait > 0:
             # connect in one second
             GLib.timeout_add_seconds(wait, self._connection_established)
         else:
             self._connection_established()
 
+    @handle_exceptions
+    def _add_signal_receivers(self):
+        self.bus.add_signal_receiver(
+            handler_function=self._dbus_connection_changed,
+            signal_name="NameOwnerChanged",
+            dbus_interface="org.freedesktop.DBus",
+            arg0=DBUS_INTERFACE)
+
+        for interface in [ DBUS_INTERFACE,
+                           DBUS_INTERFACE_ZONE,
+                           DBUS_INTERFACE_DIRECT,
+                           DBUS_INTERFACE_POLICIES,
+                           DBUS_INTERFACE_CONFIG,
+                           DBUS_INTERFACE_CONFIG_ZONE,
+                           DBUS_INTERFACE_CONFIG_SERVICE,
+                           DBUS_INTERFACE_CONFIG_DIRECT,
+                           DBUS_INTERFACE_CONFIG_ICMPTYPE,
+                           DBUS_INTERFACE_CONFIG_POLICIES ]:
+            self.bus.add_signal_receiver(self._signal_receiver,
+                                         dbus_interface=interface,
+                                         interface_keyword='interface',
+                                         member_keyword='member',
+                                         path_keyword='path')
+
     @handle_exceptions
     def _init_vars(self):
         self.fw = None
         self.fw_zone = None
         self.fw_direct = None
+        self.fw_metrics = None
         self.fw_properties = None
         self._config = None
         self.connected = False
@@ -1856,6 +2160,8 @@ class FirewallClient(object):
                 self.dbus_obj, dbus_interface=DBUS_INTERFACE_DIRECT)
             self.fw_policies = dbus.Interface(
                 self.dbus_obj, dbus_interface=DBUS_INTERFACE_POLICIES)
+            self.fw_metrics = dbus.Interface(
+                self.dbus_obj, dbus_interface=DBUS_INTERFACE_METRICS)
             self.fw_properties = dbus.Interface(
                 self.dbus_obj, dbus_interface='org.freedesktop.DBus.Properties')
         except dbus.exceptions.DBusException as e:
@@ -1867,12 +2173,13 @@ class FirewallClient(object):
             if not self.quiet:
                 print ("Exception", e)
             return
-        self._config = FirewallClientConfig(self.bus)
+        self._config = FirewallClientConfig(self.bus, self._cache)
         self.connected = True
         self._signal_receiver(member="connection-established",
                               interface=DBUS_INTERFACE)
         self._signal_receiver(member="connection-changed",
                               interface=DBUS_INTERFACE)
+        self.refreshCache()
 
     @handle_exceptions
     def _connection_lost(self):
@@ -1893,6 +2200,11 @@ class FirewallClient(object):
         signal = kwargs["member"]
         interface = kwargs["interface"]
 
+        if self._cache is not None:
+            self._cache.signal(interface, signal, kwargs.get("path"), args)
+            if interface == DBUS_INTERFACE and signal == "Reloaded":
+                self.refreshCache()
+
         cb = None
         cb_args = [ ]
 
@@ -1935,20 +2247,89 @@ class FirewallClient(object):
     def config(self):
         return self._config
 
+    # cache
+
+    @handle_exceptions
+    def getCache(self):
+        return self._cache
+
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    def refreshCache(self):
+        """Fetch all runtime and permanent zone, service and icmptype
+        settings into the cache, does nothing if the cache is not enabled
+        """
+        if self._cache is None or not self.connected:
+            return
+        self._cache.clear()
+        self.getAllSettings()
+        for path in self._config.listZones():
+            self._config.getZone(path).getSettings()
+        for path in self._config.listServices():
+            self._config.getService(path).getSettings()
+        for path in self._config.listIcmpTypes():
+            self._config.getIcmpType(path).getSettings()
+
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    @invalidates()
     def reload(self):
         self.fw.reload()
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates()
     def complete_reload(self):
         self.fw.completeReload()
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates("config")
     def runtimeToPermanent(self):
-        self.fw.runtimeToPermanent()
+        return dbus_to_python(self.fw.runtimeToPermanent())
+
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    def exportRuleset(self):
+        return dbus_to_python(self.fw.exportRuleset())
+
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    @invalidates()
+    def importRuleset(self, ruleset):
+        self.fw.importRuleset(ruleset)
+
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    def getAccessCheckStats(self):
+        return dbus_to_python(self.fw.getAccessCheckStats())
+
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    def getOperations(self):
+        return dbus_to_python(self.fw.getOperations())
+
+    # metrics
+
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    def getMetricCounters(self):
+        return dbus_to_python(self.fw_metrics.getCounters())
+
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    def getMetricGauges(self):
+        return dbus_to_python(self.fw_metrics.getGauges())
+
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    def getMetricHistograms(self):
+        return dbus_to_python(self.fw_metrics.getHistograms())
+
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    def getTraceSpans(self):
+        return dbus_to_python(self.fw_metrics.getTraceSpans())
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
@@ -1984,31 +2365,90 @@ class FirewallClient(object):
 
     # list functions
 
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    def getAllSettings(self):
+        """Return default zone and dicts of the runtime zone, service and
+        icmptype settings by name, fetched with a single call
+        """
+        (default_zone, zones, services, icmptypes) = \
+            dbus_to_python(self.fw.getAllSettings())
+        if self._cache is not None:
+            self._cache.set(("default_zone",), default_zone)
+            self._cache.set(("zones",), sorted(zones.keys()))
+            self._cache.set(("services",), sorted(services.keys()))
+            self._cache.set(("icmptypes",), sorted(icmptypes.keys()))
+            for (key, settings) in [ ("zone", zones), ("service", services),
+                                     ("icmptype", icmptypes) ]:
+                for name in settings:
+                    self._cache.set((key, name), list(settings[name]))
+        return (default_zone,
+                dict((name, FirewallClientZoneSettings(list(zones[name])))
+                     for name in zones),
+                dict((name, FirewallClientServiceSettings(
+                    list(services[name]))) for name in services),
+                dict((name, FirewallClientIcmpTypeSettings(
+                    list(icmptypes[name]))) for name in icmptypes))
+
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def getZoneSettings(self, zone):
+        if self._cache is not None:
+            if not zone:
+                zone = self.getDefaultZone()
+            return FirewallClientZoneSettings(self._cache.get(
+                ("zone", zone),
+                lambda: list(dbus_to_python(self.fw.getZoneSettings(zone)))))
         return FirewallClientZoneSettings(list(dbus_to_python(\
                     self.fw.getZoneSettings(zone))))
 
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    def getZoneSettingsRange(self, zone, key, offset, count):
+        return dbus_to_python(self.fw.getZoneSettingsRange(zone, key, offset,
+                                                           count))
+
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    def getZoneChanges(self, zone, sequence):
+        return dbus_to_python(self.fw.getZoneChanges(zone, sequence))
+
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def listServices(self):
+        if self._cache is not None:
+            return self._cache.get(
+                ("services",), lambda: dbus_to_python(self.fw.listServices()))
         return dbus_to_python(self.fw.listServices())
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def getServiceSettings(self, service):
+        if self._cache is not None:
+            return FirewallClientServiceSettings(self._cache.get(
+                ("service", service),
+                lambda: list(dbus_to_python(
+                    self.fw.getServiceSettings(service)))))
         return FirewallClientServiceSettings(list(dbus_to_python(\
                     self.fw.getServiceSettings(service))))
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def listIcmpTypes(self):
+        if self._cache is not None:
+            return self._cache.get(
+                ("icmptypes",),
+                lambda: dbus_to_python(self.fw.listIcmpTypes()))
         return dbus_to_python(self.fw.listIcmpTypes())
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def getIcmpTypeSettings(self, icmptype):
+        if self._cache is not None:
+            return FirewallClientIcmpTypeSettings(self._cache.get(
+                ("icmptype", icmptype),
+                lambda: list(dbus_to_python(
+                    self.fw.getIcmpTypeSettings(icmptype)))))
         return FirewallClientIcmpTypeSettings(list(dbus_to_python(\
                     self.fw.getIcmpTypeSettings(icmptype))))
 
@@ -2017,10 +2457,16 @@ class FirewallClient(object):
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def getDefaultZone(self):
+        if self._cache is not None:
+            return self._cache.get(
+                ("default_zone",),
+                lambda: dbus_to_python(self.fw.getDefaultZone()))
         return dbus_to_python(self.fw.getDefaultZone())
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates("default_zone")
+    @invalidates("zone")
     def setDefaultZone(self, zone):
         self.fw.setDefaultZone(zone)
 
@@ -2029,6 +2475,9 @@ class FirewallClient(object):
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def getZones(self):
+        if self._cache is not None:
+            return self._cache.get(
+                ("zones",), lambda: dbus_to_python(self.fw_zone.getZones()))
         return dbus_to_python(self.fw_zone.getZones())
 
     @slip.dbus.polkit.enable_proxy
@@ -2046,6 +2495,27 @@ class FirewallClient(object):
     def getZoneOfSource(self, source):
         return dbus_to_python(self.fw_zone.getZoneOfSource(source))
 
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    def getZonesOfService(self, service):
+        return dbus_to_python(self.fw_zone.getZonesOfService(service))
+
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    def getZonesOfIcmpType(self, icmptype):
+        return dbus_to_python(self.fw_zone.getZonesOfIcmpType(icmptype))
+
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    def getMemoryUsage(self, zone):
+        return dbus_to_python(self.fw_zone.getMemoryUsage(zone))
+
+    @slip.dbus.polkit.enable_proxy
+    @handle_exceptions
+    @invalidates("zone")
+    def bulkChange(self, operations):
+        return dbus_to_python(self.fw_zone.bulkChange(operations))
+
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
     def isImmutable(self, zone):
@@ -2055,16 +2525,19 @@ class FirewallClient(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_zone
     def addInterface(self, zone, interface):
         return dbus_to_python(self.fw_zone.addInterface(zone, interface))
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates("zone")
     def changeZone(self, zone, interface): # DEPRECATED
         return dbus_to_python(self.fw_zone.changeZone(zone, interface))
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates("zone")
     def changeZoneOfInterface(self, zone, interface):
         return dbus_to_python(self.fw_zone.changeZoneOfInterface(zone,
                                                                  interface))
@@ -2081,6 +2554,7 @@ class FirewallClient(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_zone
     def removeInterface(self, zone, interface):
         return dbus_to_python(self.fw_zone.removeInterface(zone, interface))
 
@@ -2088,11 +2562,13 @@ class FirewallClient(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_zone
     def addSource(self, zone, source):
         return dbus_to_python(self.fw_zone.addSource(zone, source))
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates("zone")
     def changeZoneOfSource(self, zone, source):
         return dbus_to_python(self.fw_zone.changeZoneOfSource(zone, source))
 
@@ -2108,6 +2584,7 @@ class FirewallClient(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_zone
     def removeSource(self, zone, source):
         return dbus_to_python(self.fw_zone.removeSource(zone, source))
 
@@ -2115,6 +2592,7 @@ class FirewallClient(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_zone
     def addRichRule(self, zone, rule, timeout=0):
         return dbus_to_python(self.fw_zone.addRichRule(zone, rule, timeout))
 
@@ -2130,6 +2608,7 @@ class FirewallClient(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_zone
     def removeRichRule(self, zone, rule):
         return dbus_to_python(self.fw_zone.removeRichRule(zone, rule))
 
@@ -2137,6 +2616,7 @@ class FirewallClient(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_zone
     def addService(self, zone, service, timeout=0):
         return dbus_to_python(self.fw_zone.addService(zone, service, timeout))
 
@@ -2152,6 +2632,7 @@ class FirewallClient(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_zone
     def removeService(self, zone, service):
         return dbus_to_python(self.fw_zone.removeService(zone, service))
 
@@ -2159,6 +2640,7 @@ class FirewallClient(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_zone
     def addPort(self, zone, port, protocol, timeout=0):
         return dbus_to_python(self.fw_zone.addPort(zone, port, protocol, timeout))
 
@@ -2174,6 +2656,7 @@ class FirewallClient(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_zone
     def removePort(self, zone, port, protocol):
         return dbus_to_python(self.fw_zone.removePort(zone, port, protocol))
 
@@ -2181,6 +2664,7 @@ class FirewallClient(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_zone
     def addProtocol(self, zone, protocol, timeout=0):
         return dbus_to_python(self.fw_zone.addProtocol(zone, protocol, timeout))
 
@@ -2196,6 +2680,7 @@ class FirewallClient(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_zone
     def removeProtocol(self, zone, protocol):
         return dbus_to_python(self.fw_zone.removeProtocol(zone, protocol))
 
@@ -2203,6 +2688,7 @@ class FirewallClient(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_zone
     def addMasquerade(self, zone, timeout=0):
         return dbus_to_python(self.fw_zone.addMasquerade(zone, timeout))
 
@@ -2213,6 +2699,7 @@ class FirewallClient(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_zone
     def removeMasquerade(self, zone):
         return dbus_to_python(self.fw_zone.removeMasquerade(zone))
 
@@ -2220,6 +2707,7 @@ class FirewallClient(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_zone
     def addForwardPort(self, zone, port, protocol, toport, toaddr,
                        timeout=0):
         if not toport:
@@ -2248,6 +2736,7 @@ class FirewallClient(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_zone
     def removeForwardPort(self, zone, port, protocol, toport, toaddr):
         if not toport:
             toport = ""
@@ -2261,6 +2750,7 @@ class FirewallClient(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_zone
     def addIcmpBlock(self, zone, icmp, timeout=0):
         return dbus_to_python(self.fw_zone.addIcmpBlock(zone, icmp, timeout))
 
@@ -2276,6 +2766,7 @@ class FirewallClient(object):
 
     @slip.dbus.polkit.enable_proxy
     @handle_exceptions
+    @invalidates_zone
     def removeIcmpBlock(self, zone, icmp):
         return dbus_to_python(self.fw_zone.removeIcmpBlock(zone, icmp))
 
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Plain D-Bus calls for one-shot queries
+
+The queries do not need a main loop, gi, slip or the settings classes of
+firewall.client, only dbus is loaded. The proxy object is created without
+introspection, so that a query is a single call to firewalld. This is
+used by firewall-cmd for --state and --get-default-zone.
+
+The calls are not authorized interactively with polkit. Callers should
+fall back to FirewallClient for the NotAuthorizedException.
+"""
+
+import dbus
+
+from firewall.config.dbus import DBUS_INTERFACE, DBUS_PATH
+
+NOT_RUNNING_ERRORS = [ "org.freedesktop.DBus.Error.ServiceUnknown",
+                       "org.freedesktop.DBus.Error.NameHasNoOwner" ]
+
+def _call(method, *args, **kwargs):
+    # Returns None if firewalld is not running
+    try:
+        obj = dbus.SystemBus().get_object(DBUS_INTERFACE, DBUS_PATH,
+                                          introspect=False)
+        return getattr(obj, method)(*args, **kwargs)
+    except dbus.exceptions.DBusException as e:
+        if e.get_dbus_name() in NOT_RUNNING_ERRORS:
+            return None
+        raise
+
+def get_state():
+    """Return the state of firewalld, None if firewalld is not running"""
+    state = _call("Get", DBUS_INTERFACE, "state",
+                  dbus_interface=dbus.PROPERTIES_IFACE)
+    if state is None:
+        return None
+    return str(state)
+
+def get_default_zone():
+    """Return the default zone, None if firewalld is not running"""
+    zone = _call("getDefaultZone", dbus_interface=DBUS_INTERFACE)
+    if zone is None:
+        return None
+    return str(zone)
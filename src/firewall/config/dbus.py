@@ -26,6 +26,7 @@ DBUS_INTERFACE = "org.fedoraproject.FirewallD%d" % DBUS_INTERFACE_VERSION
 DBUS_INTERFACE_ZONE = DBUS_INTERFACE+".zone"
 DBUS_INTERFACE_DIRECT = DBUS_INTERFACE+".direct"
 DBUS_INTERFACE_POLICIES = DBUS_INTERFACE+".policies"
+DBUS_INTERFACE_METRICS = DBUS_INTERFACE+".metrics"
 DBUS_INTERFACE_CONFIG = DBUS_INTERFACE+".config"
 DBUS_INTERFACE_CONFIG_ZONE = DBUS_INTERFACE_CONFIG+".zone"
 DBUS_INTERFACE_CONFIG_SERVICE = DBUS_INTERFACE_CONFIG+".service"
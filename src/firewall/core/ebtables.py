@@ -19,8 +19,14 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import os
+import shlex
+import tempfile
+
 from firewall.core.prog import runProg
 from firewall.core.logger import log
+from firewall.core.ipXtables import parse_ruleset, filter_ruleset, \
+    noflush_ruleset
 
 PROC_IPxTABLE_NAMES = {
 }
@@ -45,6 +51,9 @@ for table in BUILT_IN_CHAINS.keys():
 class ebtables(object):
     def __init__(self):
         self._command = "/sbin/ebtables"
+        self._restore_command = "/sbin/ebtables-restore"
+        self._save_command = "/sbin/ebtables-save"
+        self.restore_noflush_option = self._detect_restore_noflush_option()
 
     def __run(self, args):
         # convert to string list
@@ -59,6 +68,55 @@ class ebtables(object):
     def set_rule(self, rule):
         return self.__run(rule)
 
+    def save_rules(self, tables, chains):
+        # Return the chains of firewalld in the tables in the format of
+        # ebtables-save without counters, chains is a dict of table and
+        # chain names. ebtables-save has no table option, the sections of
+        # the other tables are dropped, also the built-in chains and the
+        # chains of other tools.
+        log.debug2("%s: %s", self.__class__, self._save_command)
+        (status, ret) = runProg(self._save_command)
+        if status != 0:
+            raise ValueError("'%s' failed: %s" % (self._save_command, ret))
+        return filter_ruleset(ret, dict((table, chains.get(table, [ ]))
+                                        for table in tables), commit=False)
+
+    def restore_ruleset(self, document, installed):
+        # Replace the chains of firewalld in installed, a document returned
+        # by save_rules, with the chains of document with a single
+        # ebtables-restore --noflush call.
+        document = noflush_ruleset(document, installed, commit=False)
+        if not self.restore_noflush_option:
+            # ebtables-restore would flush all tables, run the lines one
+            # after the other
+            for (table, chains, rules) in parse_ruleset(document):
+                for (chain, line) in chains:
+                    self.__run([ "-t", table, "-N", chain,
+                                 "-P", line.split()[1] ])
+                for line in rules:
+                    self.__run([ "-t", table ] + shlex.split(line))
+            return ""
+        log.debug2("%s: %s --noflush: %d lines", self.__class__,
+                   self._restore_command, document.count("\n"))
+        (fd, filename) = tempfile.mkstemp(prefix="ruleset-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(document)
+            (status, ret) = runProg(self._restore_command, [ "--noflush" ],
+                                    stdin=filename)
+        finally:
+            os.unlink(filename)
+        if status != 0:
+            raise ValueError("'%s --noflush' failed: %s" % \
+                             (self._restore_command, ret))
+        return ret
+
+    def _detect_restore_noflush_option(self):
+        # --noflush is supported since ebtables-2.0.10-4, the empty input
+        # does not change any rules
+        (status, ret) = runProg(self._restore_command, [ "--noflush" ])
+        return status == 0
+
     def append_rule(self, rule):
         self.__run([ "-A" ] + rule)
 
@@ -99,4 +157,8 @@ class ebtables(object):
             for chain in BUILT_IN_CHAINS[table]:
                 self.__run([ "-t", table, "-P", chain, policy ])
 
-ebtables_available_tables = ebtables().available_tables()
+# tables usable on the host, set by detect_available_tables
+ebtables_available_tables = [ ]
+
+def detect_available_tables(eb):
+    ebtables_available_tables[:] = eb.available_tables()
@@ -21,11 +21,14 @@
 
 import os.path
 import copy
+import time
+from collections import OrderedDict
 from firewall.config import *
 from firewall import functions
 from firewall.core import ipXtables
 from firewall.core import ebtables
 from firewall.core import modules
+from firewall.core import fw_zone
 from firewall.core.fw_icmptype import FirewallIcmpType
 from firewall.core.fw_service import FirewallService
 from firewall.core.fw_zone import FirewallZone
@@ -33,6 +36,8 @@ from firewall.core.fw_direct import FirewallDirect
 from firewall.core.fw_config import FirewallConfig
 from firewall.core.fw_policies import FirewallPolicies
 from firewall.core.logger import log
+from firewall.core.metrics import metrics
+from firewall.core.trace import trace, traced
 from firewall.core.io.firewalld_conf import firewalld_conf
 from firewall.core.io.direct import Direct
 from firewall.core.io.service import service_reader
@@ -40,6 +45,9 @@ from firewall.core.io.icmptype import icmptype_reader
 from firewall.core.io.zone import zone_reader, Zone
 from firewall.errors import *
 
+# version of the format of export_ruleset
+RULESET_VERSION = 2
+
 ############################################################################
 #
 # class Firewall
@@ -50,15 +58,11 @@ class Firewall(object):
     def __init__(self):
         self._firewalld_conf = firewalld_conf(FIREWALLD_CONF)
 
-        self._ip4tables = ipXtables.ip4tables()
+        self._create_backends()
         self.ip4tables_enabled = True
-        self._ip6tables = ipXtables.ip6tables()
         self.ip6tables_enabled = True
-        self._ebtables = ebtables.ebtables()
         self.ebtables_enabled = True
 
-        self._modules = modules.modules()
-
         self.icmptype = FirewallIcmpType(self)
         self.service = FirewallService(self)
         self.zone = FirewallZone(self)
@@ -81,9 +85,24 @@ class Firewall(object):
         self._default_zone = ""
         self._module_refcount = { }
         self._marks = [ ]
+        self._rules_batch = None
         self._min_mark = FALLBACK_MINIMAL_MARK # will be overloaded by firewalld.conf
         self.cleanup_on_exit = FALLBACK_CLEANUP_ON_EXIT
         self.ipv6_rpfilter_enabled = FALLBACK_IPV6_RPFILTER
+        self.individual_signals = True
+
+    def _create_backends(self):
+        # Create the backends and detect the tables usable on the host. This
+        # runs the backend commands, Firewall_compile overloads it with
+        # backends that do not touch the host.
+        self._ip4tables = ipXtables.ip4tables()
+        self._ip6tables = ipXtables.ip6tables()
+        self._ebtables = ebtables.ebtables()
+        self._modules = modules.modules()
+        ipXtables.detect_available_tables(self._ip4tables, self._ip6tables)
+        ebtables.detect_available_tables(self._ebtables)
+        fw_zone.update_zone_chains(ipXtables.ip4tables_available_tables,
+                                   ipXtables.ip6tables_available_tables)
 
     def _check_tables(self):
         # check if iptables, ip6tables and ebtables are usable, else disable
@@ -147,10 +166,22 @@ class Firewall(object):
             else:
                 log.debug1("IPV6 rpfilter is disabled")
 
+            if self._firewalld_conf.get("IndividualSignals"):
+                value = self._firewalld_conf.get("IndividualSignals")
+                if value is not None:
+                    if value.lower() in [ "no", "false" ]:
+                        self.individual_signals = False
+                    if value.lower() in [ "yes", "true" ]:
+                        self.individual_signals = True
+            if not self.individual_signals:
+                log.debug1("Individual zone item signals are disabled")
+
         self.config.set_firewalld_conf(copy.deepcopy(self._firewalld_conf))
 
         # apply default rules
-        self._apply_default_rules()
+        with metrics.timer("start:apply_default_rules"), \
+             trace.span("start:apply_default_rules"):
+            self._apply_default_rules()
 
         # load lockdown whitelist
         log.debug1("Loading lockdown whitelist")
@@ -166,6 +197,9 @@ class Firewall(object):
 
         # copy policies to config interface
         self.config.set_policies(copy.deepcopy(self.policies))
+        self.policies.set_synced()
+
+        _parse_start = time.time()
 
         # load icmptype files
         self._loader(FIREWALLD_ICMPTYPES, "icmptype")
@@ -185,6 +219,8 @@ class Firewall(object):
         self._loader(FIREWALLD_ZONES, "zone")
         self._loader(ETC_FIREWALLD_ZONES, "zone")
 
+        metrics.observe("start:parse", time.time() - _parse_start)
+
         if len(self.zone.get_zones()) == 0:
             log.fatal("No zones found.")
             sys.exit(1)
@@ -199,18 +235,25 @@ class Firewall(object):
             sys.exit(1)
 
         # apply settings for loaded zones
-        self.zone.apply_zones()
+        with metrics.timer("start:apply_zones"), \
+             trace.span("start:apply_zones"):
+            self.zone.apply_zones()
 
         # load direct rules
+        _direct_start = time.time()
         obj = Direct(FIREWALLD_DIRECT)
         if os.path.exists(FIREWALLD_DIRECT):
             log.debug1("Loading direct rules file '%s'" % FIREWALLD_DIRECT)
             try:
-                obj.read()
+                # rules are passed to the batches while parsing
+                self.direct.read_permanent_config(obj)
             except Exception as msg:
                 log.debug1("Failed to load direct rules file '%s': %s",
                            FIREWALLD_DIRECT, msg)
-        self.direct.set_permanent_config(obj)
+                self.direct.set_permanent_config(obj)
+        else:
+            self.direct.set_permanent_config(obj)
+        metrics.observe("start:direct", time.time() - _direct_start)
         self.config.set_direct(copy.deepcopy(obj))
 
         # check if default_zone is a valid zone
@@ -359,6 +402,22 @@ class Firewall(object):
 
         self.cleanup()
 
+    def working_copy(self, with_config=False):
+        """Return a copy of the firewall for an operation in a worker thread
+
+        The backends and the kernel modules are shared with the copy. The
+        permanent configuration is only copied with with_config, else the
+        copy uses the configuration of this firewall. Use set_firewall of the
+        configuration if the copy replaces this firewall.
+        """
+        memo = { }
+        for x in [ self._ip4tables, self._ip6tables, self._ebtables,
+                   self._modules ]:
+            memo[id(x)] = x
+        if not with_config:
+            memo[id(self.config)] = self.config
+        return copy.deepcopy(self, memo)
+
     # marks
 
     def new_mark(self):
@@ -372,8 +431,14 @@ class Firewall(object):
     def del_mark(self, mark):
         self._marks.remove(mark)
 
+    # ip forwarding
+
+    def enable_ip_forwarding(self, ipv):
+        return functions.enable_ip_forwarding(ipv)
+
     # handle rules, chains and modules
 
+    @traced
     def handle_rules(self, rules, enable, insert=False):
         if insert:
             append_delete = { True: "-I", False: "-D", }
@@ -411,6 +476,7 @@ class Firewall(object):
                 return (rules[:i], msg) # cleanup rules and error message
         return None
 
+    @traced
     def handle_rules2(self, rules, enable, insert=False):
         if insert:
             append_delete = { True: "-I", False: "-D", }
@@ -445,6 +511,7 @@ class Firewall(object):
                 return (rules[:i], msg) # cleanup rules and error message
         return None
 
+    @traced
     def handle_chains(self, rules, enable):
         new_delete = { True: "-N", False: "-X" }
 
@@ -458,6 +525,7 @@ class Firewall(object):
                 return (rules[:i], msg) # cleanup chains and error message
         return None
 
+    @traced
     def handle_modules(self, modules, enable):
         for i,module in enumerate(modules):
             if enable:
@@ -530,6 +598,7 @@ class Firewall(object):
     # flush and policy
 
     def _flush(self):
+        metrics.clear_gauges("rules:")
         if self.ip4tables_enabled:
             self._ip4tables.flush()
         if self.ip6tables_enabled:
@@ -573,23 +642,229 @@ class Firewall(object):
                 raise FirewallError(INVALID_IPV,
                                     "'%s' not in {'ipv4'|'ipv6'}" % ipv)
 
+        backend = self.__get_backend(ipv)
+        if backend is None:
+            return ""
+
+        if self._rules_batch is not None and ipv in [ "ipv4", "ipv6" ]:
+            # collected for apply_rules_batch, without the table option
+            rule = list(rule)
+            table = "filter"
+            if "-t" in rule:
+                i = rule.index("-t")
+                table = rule[i+1]
+                del rule[i:i+2]
+            self._rules_batch.setdefault((ipv, table), [ ]).append(rule)
+            return ""
+
+        metrics.count("backend_commands:%s" % ipv)
+        start = time.time()
+        try:
+            with trace.span("rule", ipv=ipv,
+                            rule=" ".join([ "%s" % x for x in rule ])):
+                ret = backend.set_rule(rule)
+        except Exception:
+            metrics.count("backend_errors:%s" % ipv)
+            raise
+        finally:
+            metrics.observe("exec:%s" % ipv, time.time() - start)
+        self.__count_rule(ipv, rule)
+        return ret
+
+    def restore_rules(self, ipv, table, rules, test=False):
+        # apply rules for table at once, rules do not contain the table
+        # with test, the rules are only checked against the current rules
+        if ipv not in [ "ipv4", "ipv6" ]:
+            raise FirewallError(INVALID_IPV,
+                                "'%s' not in {'ipv4'|'ipv6'}" % ipv)
+        backend = self.__get_backend(ipv)
+        if backend is None:
+            return ""
+
+        metrics.count("backend_commands:%s" % ipv)
+        start = time.time()
+        try:
+            with trace.span("restore_rules", ipv=ipv, table=table,
+                            count=len(rules), test=test):
+                ret = backend.restore_rules(table, rules, test)
+        except Exception:
+            metrics.count("backend_errors:%s" % ipv)
+            raise
+        finally:
+            metrics.observe("exec:%s" % ipv, time.time() - start)
+        if not test:
+            for rule in rules:
+                self.__count_rule(ipv, [ "-t", table ] + rule)
+        return ret
+
+    def begin_rules_batch(self):
+        """Collect the ipv4 and ipv6 rules of the handle_ functions from now
+        on instead of applying them. ebtables rules are applied directly.
+        """
+        self._rules_batch = OrderedDict()
+
+    def end_rules_batch(self):
+        """Stop collecting rules, returns the collected rules"""
+        batch = self._rules_batch
+        self._rules_batch = None
+        return batch
+
+    def apply_rules_batch(self, batch):
+        """Apply the collected rules with one restore call per ipv and
+        table. Every restore call is atomic, the tables after the first one
+        are tested before the first one is committed, so that a failing
+        batch is not applied in part.
+
+        :Raises FirewallError: COMMAND_FAILED
+        """
+        tables = [ x for x in batch if len(batch[x]) > 0 ]
+        try:
+            for (ipv, table) in tables[1:]:
+                self.restore_rules(ipv, table, batch[(ipv, table)], test=True)
+        except Exception as msg:
+            log.debug2(msg)
+            raise FirewallError(COMMAND_FAILED, msg)
+        for (i, (ipv, table)) in enumerate(tables):
+            try:
+                self.restore_rules(ipv, table, batch[(ipv, table)])
+            except Exception as msg:
+                if i > 0:
+                    # the tables before have been committed already
+                    log.error("Failed to apply rules. A firewall reload might solve the issue if the firewall has been modified using ip*tables or ebtables.")
+                log.debug2(msg)
+                raise FirewallError(COMMAND_FAILED, msg)
+
+    def __ruleset_tables(self, ipv):
+        if ipv == "eb":
+            tables = ebtables.BUILT_IN_CHAINS
+        else:
+            tables = ipXtables.BUILT_IN_CHAINS
+        return [ table for table in sorted(tables)
+                 if self.is_table_available(ipv, table) ]
+
+    def __ruleset_chains(self, ipv):
+        # the chains of firewalld in the available tables of ipv: the base
+        # and zone chains and the chains of the direct configuration
+        our_chains = ebtables.OUR_CHAINS if ipv == "eb" \
+                     else ipXtables.OUR_CHAINS
+        chains = { }
+        for table in self.__ruleset_tables(ipv):
+            chains[table] = set(our_chains.get(table, [ ]))
+            chains[table].update(self.direct.get_chains(ipv, table))
+        return chains
+
+    def save_ruleset(self, ipv, chains=None):
+        # return the chains of firewalld of ipv in the format of
+        # ip*tables-save or ebtables-save
+        backend = self.__get_backend(ipv)
+        if backend is None:
+            return ""
+        if chains is None:
+            chains = self.__ruleset_chains(ipv)
+
+        metrics.count("backend_commands:%s" % ipv)
+        start = time.time()
+        try:
+            with trace.span("save_ruleset", ipv=ipv):
+                return backend.save_rules(self.__ruleset_tables(ipv), chains)
+        except Exception:
+            metrics.count("backend_errors:%s" % ipv)
+            raise
+        finally:
+            metrics.observe("exec:%s" % ipv, time.time() - start)
+
+    def restore_ruleset(self, ipv, document):
+        # replace the chains of firewalld of ipv with the chains in document,
+        # other chains are not changed
+        backend = self.__get_backend(ipv)
+        if backend is None:
+            return ""
+
+        # the installed chains of firewalld are flushed or deleted, chains
+        # of document that are not known here yet are included
+        chains = self.__ruleset_chains(ipv)
+        for (table, _chains, rules) in ipXtables.parse_ruleset(document):
+            chains.setdefault(table, set()).update(
+                [ chain for (chain, line) in _chains ])
+        installed = self.save_ruleset(ipv, chains)
+
+        metrics.count("backend_commands:%s" % ipv)
+        start = time.time()
+        try:
+            with trace.span("restore_ruleset", ipv=ipv):
+                ret = backend.restore_ruleset(document, installed)
+        except Exception:
+            metrics.count("backend_errors:%s" % ipv)
+            raise
+        finally:
+            metrics.observe("exec:%s" % ipv, time.time() - start)
+        # the rules of the installed chains are gone, count the new ones
+        for (_document, option) in [ (installed, "-D"), (document, "-A") ]:
+            for (table, _chains, rules) in \
+                    ipXtables.parse_ruleset(_document):
+                for line in rules:
+                    if line.startswith("-A "):
+                        self.__count_rule(ipv, [ "-t", table, option,
+                                                 line.split()[1] ])
+        return ret
+
+    def __check_ruleset_rules(self, ipv, document):
+        # The rules of a ruleset may only use chains declared in the
+        # ruleset, as only these are flushed, built-in chains are not
+        # allowed.
+        built_in = ebtables.BUILT_IN_CHAINS if ipv == "eb" \
+                   else ipXtables.BUILT_IN_CHAINS
+        try:
+            sections = ipXtables.parse_ruleset(document)
+        except (ValueError, AttributeError) as msg:
+            raise FirewallError(INVALID_VALUE, "%s rules: %s" % (ipv, msg))
+        for (table, chains, rules) in sections:
+            if table not in built_in:
+                raise FirewallError(INVALID_TABLE,
+                                    "%s rules: '%s'" % (ipv, table))
+            names = [ chain for (chain, line) in chains ]
+            for chain in names:
+                if chain in built_in[table]:
+                    raise FirewallError(BUILTIN_CHAIN,
+                                        "%s rules: '%s' in table '%s'" % \
+                                        (ipv, chain, table))
+            for line in rules:
+                args = line.split()
+                if len(args) < 2 or args[0] != "-A" or args[1] not in names:
+                    raise FirewallError(INVALID_VALUE,
+                                        "%s rules: '%s' in table '%s'" % \
+                                        (ipv, line, table))
+
+    def __get_backend(self, ipv):
+        # returns None if the backend for ipv is disabled
         if ipv == "ipv4":
-            # do not call if disabled
             if self.ip4tables_enabled:
-                return self._ip4tables.set_rule(rule)
+                return self._ip4tables
         elif ipv == "ipv6":
-            # do not call if disabled
             if self.ip6tables_enabled:
-                return self._ip6tables.set_rule(rule)
+                return self._ip6tables
         elif ipv == "eb":
-            # do not call if disabled
             if self.ebtables_enabled:
-                return self._ebtables.set_rule(rule)
+                return self._ebtables
         else:
             raise FirewallError(INVALID_IPV,
                                 "'%s' not in {'ipv4'|'ipv6'|'eb'}" % ipv)
+        return None
 
-        return ""
+    def __count_rule(self, ipv, rule):
+        # keep track of the number of rules per table and chain
+        table = "filter"
+        if "-t" in rule:
+            i = rule.index("-t")
+            if i + 1 < len(rule):
+                table = rule[i+1]
+        for (option, value) in [ ("-A", 1), ("-I", 1), ("-D", -1) ]:
+            if option in rule:
+                i = rule.index(option)
+                if i + 1 < len(rule):
+                    metrics.gauge("rules:%s:%s:%s" % (ipv, table, rule[i+1]),
+                                  value)
+                return
 
     # check functions
 
@@ -661,7 +936,10 @@ class Firewall(object):
 
     # RELOAD
 
-    def reload(self, stop=False):
+    def reload(self, stop=False, progress=None):
+        # progress is called with the name of every reload step
+        if progress is None:
+            progress = lambda step: None
         _panic = self._panic
 
         # save zone interfaces
@@ -672,15 +950,25 @@ class Firewall(object):
         _direct_config = self.direct.get_runtime_config()
         _old_dz = self.get_default_zone()
 
+        _reload_start = time.time()
+
         # stop
-        self._set_policy("DROP")
-        self._flush()
-        if stop:
-            self._modules.unload_firewall_modules()
-        self.cleanup()
+        progress("stop")
+        with metrics.timer("reload:stop"), \
+             trace.span("reload:stop"):
+            self._set_policy("DROP")
+            self._flush()
+            if stop:
+                progress("unload_modules")
+                self._modules.unload_firewall_modules()
+            self.cleanup()
 
         # start
-        self._start()
+        progress("start")
+        with metrics.timer("reload:start"), \
+             trace.span("reload:start"):
+            self._start()
+        _restore_start = time.time()
 
         # handle interfaces in the default zone and move them to the new 
         # default zone if it changed
@@ -702,6 +990,7 @@ class Firewall(object):
                     del _zone_interfaces[_old_dz][iface]
 
         # add interfaces to zones again
+        progress("interfaces")
         for zone in self.zone.get_zones():
             if zone in _zone_interfaces:
                 self.zone.set_settings(zone, { "interfaces":
@@ -716,6 +1005,7 @@ class Firewall(object):
         del _zone_interfaces
 
         # restore direct config
+        progress("direct")
         self.direct.set_config(_direct_config)
 
         # enable panic mode again if it has been enabled before or set policy 
@@ -725,6 +1015,134 @@ class Firewall(object):
         else:
             self._set_policy("ACCEPT")
 
+        metrics.observe("reload:restore", time.time() - _restore_start)
+        metrics.observe("reload:total", time.time() - _reload_start)
+
+    # RULESET
+
+    def export_ruleset(self):
+        """Return the installed rules of the enabled backends together with
+        the runtime state of firewalld: default zone, panic mode, marks,
+        module references, the zone settings with bindings, timeouts and
+        marks and the direct configuration. The ruleset can be used with
+        import_ruleset and converted to JSON.
+
+        Only the chains of firewalld are saved: the base chains, the zone
+        chains and the chains of the direct configuration. The rules of
+        firewalld in the built-in chains are the same for every ruleset,
+        they are not saved. Built-in chains and chains of other tools are
+        not part of the ruleset and are not changed by the import. Also
+        passthrough rules outside of the chains of firewalld are not saved.
+        """
+        rules = { }
+        for ipv in [ "ipv4", "ipv6", "eb" ]:
+            if self.__get_backend(ipv) is None:
+                continue
+            try:
+                rules[ipv] = self.save_ruleset(ipv)
+            except Exception as msg:
+                raise FirewallError(COMMAND_FAILED, msg)
+
+        return { "version": RULESET_VERSION,
+                 "rules": rules,
+                 "default_zone": self._default_zone,
+                 "panic": self._panic,
+                 "marks": list(self._marks),
+                 "modules": dict(self._module_refcount),
+                 "zones": self.zone.export_runtime_state(),
+                 "direct": self.direct.export_runtime_state() }
+
+    def import_ruleset(self, ruleset):
+        """Restore a ruleset returned by export_ruleset. The rules are
+        restored with one restore call per backend, the runtime state is set
+        from the ruleset without applying zone or direct settings again. If
+        restoring the rules fails, the former rules are restored and the
+        runtime state is not changed.
+
+        The default zone of the ruleset is returned, it is not set here, as
+        firewalld.conf is written, use import_default_zone for this.
+        """
+        if not isinstance(ruleset, dict) or \
+           ruleset.get("version") != RULESET_VERSION:
+            raise FirewallError(INVALID_VALUE,
+                                "unsupported ruleset version")
+        for key in [ "rules", "default_zone", "panic", "marks", "modules",
+                     "zones", "direct" ]:
+            if key not in ruleset:
+                raise FirewallError(INVALID_VALUE,
+                                    "'%s' missing in ruleset" % key)
+        ipvs = [ ipv for ipv in [ "ipv4", "ipv6", "eb" ]
+                 if self.__get_backend(ipv) is not None ]
+        if sorted(ruleset["rules"].keys()) != sorted(ipvs):
+            raise FirewallError(INVALID_VALUE,
+                                "ruleset is for '%s', enabled are '%s'" % \
+                                ("', '".join(sorted(ruleset["rules"])),
+                                 "', '".join(sorted(ipvs))))
+        default_zone = self.check_zone(ruleset["default_zone"])
+        try:
+            marks = [ int(x) for x in ruleset["marks"] ]
+            _modules = dict((str(x), int(ruleset["modules"][x]))
+                            for x in ruleset["modules"])
+        except (TypeError, ValueError, AttributeError) as msg:
+            raise FirewallError(INVALID_VALUE, msg)
+        for ipv in ipvs:
+            self.__check_ruleset_rules(ipv, ruleset["rules"][ipv])
+        zones = self.zone.check_runtime_state(ruleset["zones"])
+        direct = self.direct.check_runtime_state(ruleset["direct"])
+        panic = bool(ruleset["panic"])
+
+        # save the rules for the rollback
+        saved = { }
+        for ipv in ipvs:
+            try:
+                saved[ipv] = self.save_ruleset(ipv)
+            except Exception as msg:
+                raise FirewallError(COMMAND_FAILED, msg)
+
+        done = [ ]
+        try:
+            for ipv in ipvs:
+                done.append(ipv)
+                self.restore_ruleset(ipv, ruleset["rules"][ipv])
+            # panic mode is set with the policies of the built-in chains,
+            # these are not part of the ruleset
+            if panic != self._panic:
+                self._set_policy("DROP" if panic else "ACCEPT", "all")
+        except Exception as msg:
+            log.error("Failed to import rules: %s", msg)
+            for _ipv in done:
+                try:
+                    self.restore_ruleset(_ipv, saved[_ipv])
+                except Exception as _msg:
+                    log.error("Failed to restore %s rules: %s", _ipv, _msg)
+            raise FirewallError(COMMAND_FAILED, msg)
+
+        # the rules are in place, set the runtime state
+        for module in _modules:
+            if module not in self._module_refcount:
+                (status, msg) = self._modules.load_module(module)
+                if status != 0:
+                    log.warning("Failed to load module '%s': %s", module, msg)
+        self._module_refcount = _modules
+        self._marks = marks
+        self._panic = panic
+        self.zone.set_runtime_state(zones)
+        self.direct.set_runtime_state(direct)
+        return default_zone
+
+    def import_default_zone(self, zone):
+        """Set the default zone of an imported ruleset and write it to
+        firewalld.conf. The rules of the default zone are part of the
+        ruleset, they are not changed. Returns True if the default zone has
+        been changed.
+        """
+        if zone == self._default_zone:
+            return False
+        self._default_zone = zone
+        self._firewalld_conf.set("DefaultZone", zone)
+        self._firewalld_conf.write()
+        return True
+
     # STATE
 
     def get_state(self):
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from collections import OrderedDict
+from firewall.core import ipXtables
+from firewall.core import ebtables
+from firewall.core import fw_zone
+from firewall.core.fw import Firewall
+from firewall.core.ipXtables import _restore_quote
+from firewall.core.logger import log
+
+# long options of ip*tables and ebtables commands
+LONG_OPTIONS = {
+    "--table": "-t",
+    "--append": "-A",
+    "--insert": "-I",
+    "--delete": "-D",
+    "--replace": "-R",
+    "--check": "-C",
+    "--new-chain": "-N",
+    "--delete-chain": "-X",
+    "--policy": "-P",
+    "--flush": "-F",
+    "--zero": "-Z",
+}
+
+COMMANDS = [ "-A", "-I", "-D", "-R", "-C", "-N", "-X", "-P", "-F", "-Z" ]
+
+############################################################################
+#
+# class compiled_ruleset
+#
+############################################################################
+
+class compiled_ruleset(object):
+    """Backend for Firewall_compile: keeps the chains and rules of the tables
+    of ip4tables, ip6tables or ebtables in memory instead of changing the
+    kernel tables. The rules are changed with the same arguments as the
+    commands would get, restore_document returns the resulting ruleset.
+    """
+    def __init__(self, ipv, built_in_chains):
+        self.ipv = ipv
+        self._built_in_chains = built_in_chains
+        self.flush()
+
+    def __repr__(self):
+        return '%s(%r, %r)' % (self.__class__, self.ipv, self._tables)
+
+    def tables(self):
+        return list(self._built_in_chains.keys())
+
+    def _chains(self, table):
+        if table not in self._tables:
+            raise ValueError("%s: table '%s' does not exist" % (self.ipv,
+                                                                table))
+        return self._tables[table]
+
+    def _chain(self, table, chain):
+        chains = self._chains(table)
+        if chain not in chains:
+            raise ValueError("%s: chain '%s' does not exist in table '%s'" % \
+                             (self.ipv, chain, table))
+        return chains[chain]
+
+    def _index(self, table, chain, spec):
+        # position of the rule in the chain, a number or a rule spec
+        rules = self._chain(table, chain)["rules"]
+        if len(spec) == 1 and spec[0].isdigit():
+            index = int(spec[0]) - 1
+            if index < 0 or index >= len(rules):
+                raise ValueError("%s: index of rule %s in chain '%s' is too "
+                                 "big" % (self.ipv, spec[0], chain))
+            return index
+        if spec not in rules:
+            raise ValueError("%s: rule '%s' does not exist in chain '%s'" % \
+                             (self.ipv, " ".join(spec), chain))
+        return rules.index(spec)
+
+    def set_rule(self, rule):
+        args = [ LONG_OPTIONS.get("%s" % item, "%s" % item) for item in rule ]
+        table = "filter"
+        if "-t" in args:
+            i = args.index("-t")
+            table = args[i+1]
+            del args[i:i+2]
+        chains = self._chains(table)
+
+        commands = [ x for x in args if x in COMMANDS ]
+        if len(commands) < 1:
+            raise ValueError("%s: '%s' is not supported by the ruleset "
+                             "compiler" % (self.ipv, " ".join(args)))
+        i = args.index(commands[0])
+        command = args[i]
+        chain = args[i+1] if i + 1 < len(args) else None
+        spec = args[:i] + args[i+2:]
+        log.debug2("%s: %s %s", self.__class__, self.ipv, " ".join(args))
+
+        if command == "-A":
+            self._chain(table, chain)["rules"].append(spec)
+        elif command == "-I":
+            index = 0
+            if len(spec) > 0 and spec[0].isdigit():
+                index = int(spec.pop(0)) - 1
+            self._chain(table, chain)["rules"].insert(index, spec)
+        elif command == "-D":
+            del self._chain(table, chain)["rules"][self._index(table, chain,
+                                                               spec)]
+        elif command == "-R":
+            self._chain(table, chain)["rules"][self._index(table, chain,
+                                                           spec[:1])] = spec[1:]
+        elif command == "-C":
+            self._index(table, chain, spec)
+        elif command == "-N":
+            if chain in chains:
+                raise ValueError("%s: chain '%s' already exists in table "
+                                 "'%s'" % (self.ipv, chain, table))
+            # ebtables chains have a policy, RETURN is set by firewalld
+            policy = "-" if self.ipv != "eb" else "ACCEPT"
+            if "-P" in spec:
+                policy = spec[spec.index("-P") + 1]
+            chains[chain] = { "policy": policy, "rules": [ ] }
+        elif command == "-X":
+            for x in ([ chain ] if chain else list(chains.keys())):
+                if x in self._built_in_chains[table]:
+                    if chain:
+                        raise ValueError("%s: can not delete built-in chain "
+                                         "'%s'" % (self.ipv, chain))
+                    continue
+                if len(self._chain(table, x)["rules"]) > 0:
+                    raise ValueError("%s: chain '%s' in table '%s' is not "
+                                     "empty" % (self.ipv, x, table))
+                del chains[x]
+        elif command == "-P":
+            self._chain(table, chain)["policy"] = spec[0]
+        elif command == "-F":
+            for x in ([ chain ] if chain else list(chains.keys())):
+                del self._chain(table, x)["rules"][:]
+        # -Z: there are no counters
+        return ""
+
+    def restore_rules(self, table, rules, test=False):
+        # rules are applied one after the other, if one rule fails, none of
+        # the rules is applied, with test the rules are checked only
+        saved = self._copy()
+        try:
+            for rule in rules:
+                self.set_rule([ "-t", table ] + rule)
+        except ValueError:
+            self._tables = saved
+            raise
+        if test:
+            self._tables = saved
+        return ""
+
+    def _copy(self):
+        return OrderedDict((table, OrderedDict(
+            (chain, { "policy": x["policy"], "rules": list(x["rules"]) })
+            for (chain, x) in chains.items()))
+                           for (table, chains) in self._tables.items())
+
+    def available_tables(self, table=None):
+        if table:
+            return [ table ] if table in self._built_in_chains else [ ]
+        return self.tables()
+
+    def used_tables(self):
+        return self.tables()
+
+    def flush(self):
+        self._tables = OrderedDict()
+        for table in self._built_in_chains:
+            self._tables[table] = OrderedDict()
+            for chain in self._built_in_chains[table]:
+                self._tables[table][chain] = { "policy": "ACCEPT",
+                                               "rules": [ ] }
+
+    def set_policy(self, policy, which="used"):
+        for table in self._tables:
+            if self.ipv != "eb" and table == "nat":
+                continue # nat can not set policies in nat table
+            for chain in self._built_in_chains[table]:
+                self._tables[table][chain]["policy"] = policy
+
+    def restore_document(self):
+        """Return the ruleset in the format of ip*tables-save and
+        ebtables-save, which can be used with the restore commands.
+        """
+        lines = [ ]
+        for (table, chains) in self._tables.items():
+            lines.append("*%s" % table)
+            # built-in chains first, user defined chains sorted by name
+            names = list(self._built_in_chains[table]) + \
+                    sorted(x for x in chains
+                           if x not in self._built_in_chains[table])
+            for chain in names:
+                if self.ipv == "eb":
+                    lines.append(":%s %s" % (chain, chains[chain]["policy"]))
+                else:
+                    lines.append(":%s %s [0:0]" % (chain,
+                                                   chains[chain]["policy"]))
+            for chain in names:
+                for rule in chains[chain]["rules"]:
+                    lines.append(" ".join([ "-A", chain ] +
+                                          [ _restore_quote(x) for x in rule ]))
+            if self.ipv != "eb":
+                lines.append("COMMIT")
+        return "\n".join(lines) + "\n"
+
+############################################################################
+#
+# class compiled_modules
+#
+############################################################################
+
+class compiled_modules(object):
+    """Modules backend for Firewall_compile: records the kernel modules that
+    would be loaded.
+    """
+    def __init__(self):
+        self.modules = [ ]
+
+    def load_module(self, module):
+        if module not in self.modules:
+            self.modules.append(module)
+        return (0, "")
+
+    def unload_module(self, module):
+        if module in self.modules:
+            self.modules.remove(module)
+        return (0, "")
+
+    def unload_firewall_modules(self):
+        del self.modules[:]
+
+############################################################################
+#
+# class Firewall_compile
+#
+############################################################################
+
+class Firewall_compile(Firewall):
+    """Firewall that runs the same zone, service, rich rule and direct code
+    as the firewalld daemon, but compiles the rules into restore documents
+    for iptables-restore, ip6tables-restore and ebtables-restore instead of
+    applying them. The kernel is not changed and all tables are assumed to
+    be available, independent of the tables of the host.
+    """
+    def __init__(self):
+        super(Firewall_compile, self).__init__()
+        self.ip_forwarding = [ ]
+
+    def _create_backends(self):
+        self._ip4tables = compiled_ruleset("ipv4", ipXtables.BUILT_IN_CHAINS)
+        self._ip6tables = compiled_ruleset("ipv6", ipXtables.BUILT_IN_CHAINS)
+        self._ebtables = compiled_ruleset("eb", ebtables.BUILT_IN_CHAINS)
+        self._modules = compiled_modules()
+        fw_zone.update_zone_chains(self._ip4tables.tables(),
+                                   self._ip6tables.tables())
+
+    def _backend(self, ipv):
+        return { "ipv4": self._ip4tables, "ipv6": self._ip6tables,
+                 "eb": self._ebtables }[ipv]
+
+    def _check_tables(self):
+        return
+
+    def is_table_available(self, ipv, table):
+        return table in self._backend(ipv).tables()
+
+    def enable_ip_forwarding(self, ipv):
+        if ipv not in self.ip_forwarding:
+            self.ip_forwarding.append(ipv)
+        return True
+
+    def compile(self):
+        self.start()
+
+    def get_restore_document(self, ipv):
+        return self._backend(ipv).restore_document()
+
+    def get_modules(self):
+        return list(self._modules.modules)
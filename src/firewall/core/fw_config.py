@@ -20,7 +20,13 @@
 #
 
 import copy
+import io
 import os, os.path
+import shutil
+import difflib
+import filecmp
+import tempfile
+from collections import OrderedDict
 from firewall.config import *
 from firewall.core.base import *
 from firewall.core.logger import log
@@ -48,9 +54,16 @@ class FirewallConfig(object):
         self._default_icmptypes = { }
         self._default_services = { }
         self._default_zones = { }
+        # reverse indexes: service/icmptype name -> set of zone names
+        self._service_zones = { }
+        self._icmptype_zones = { }
+        self._zone_refs = { }
         self._firewalld_conf = None
         self._policies = None
         self._direct = None
+        self._deferred = None
+        self._lazy_names = None
+        self._lazy_load = None
 
     def cleanup(self):
         for x in list(self._default_icmptypes.keys()):
@@ -74,6 +87,10 @@ class FirewallConfig(object):
             self._zones[x].cleanup()
             del self._zones[x]
 
+        self._service_zones.clear()
+        self._icmptype_zones.clear()
+        self._zone_refs.clear()
+
         if self._firewalld_conf:
             self._firewalld_conf.cleanup()
             del self._firewalld_conf
@@ -91,6 +108,10 @@ class FirewallConfig(object):
 
         self.__init_vars()
 
+    def set_firewall(self, fw):
+        # the firewall has been replaced by a working copy
+        self._fw = fw
+
     # access check
 
     def lockdown_enabled(self):
@@ -141,11 +162,110 @@ class FirewallConfig(object):
         else:
             self._direct.read()
 
+    # lazy loading
+
+    def set_lazy_loader(self, names, load):
+        """Use objects that are only indexed, but not loaded, yet.
+        names(type) returns the names of the objects of the type that are
+        not loaded, load(type, name) loads an object or all objects of the
+        type if name is None.
+        """
+        self._lazy_names = names
+        self._lazy_load = load
+
+    def _lazy(self, reader_type, name=None):
+        if self._lazy_load is not None:
+            self._lazy_load(reader_type, name)
+
+    def _lazy_list(self, reader_type):
+        if self._lazy_names is None:
+            return [ ]
+        return self._lazy_names(reader_type)
+
+    # deferred writes
+
+    def defer_writes(self):
+        """Collect the files to write or remove instead of changing them
+        directly, commit_writes writes every collected file once.
+        """
+        if self._deferred is None:
+            self._deferred = OrderedDict()
+
+    def _write(self, writer, obj):
+        if self._deferred is None:
+            writer(obj)
+            return
+        if obj.filename:
+            name = "%s/%s" % (obj.path, obj.filename)
+        else:
+            name = "%s/%s.xml" % (obj.path, obj.name)
+        self._deferred[name] = (writer, obj)
+
+    def _remove(self, name):
+        if self._deferred is None:
+            os.remove(name)
+            return
+        self._deferred[name] = None
+
+    def write_file(self, obj):
+        # obj is a firewalld_conf, lockdown_whitelist or direct object
+        if self._deferred is None:
+            obj.write()
+            return
+        self._deferred[obj.filename] = (_file_writer, obj)
+
+    def commit_writes(self, dry_run=False):
+        """Write the collected files. All files are written to a staging
+        directory first, then every changed file replaces the old file with
+        a rename, the old file is kept as backup. Nothing is changed with
+        dry_run.
+
+        :return: unified diff of the changes as list of lines
+        """
+        deferred = self._deferred
+        self._deferred = None
+        if not deferred:
+            return [ ]
+
+        diff = [ ]
+        changes = [ ]
+        staging = tempfile.mkdtemp(prefix="firewalld.")
+        try:
+            for (i, name) in enumerate(deferred):
+                staged = None
+                if deferred[name] is not None:
+                    (writer, obj) = deferred[name]
+                    path = os.path.join(staging, str(i))
+                    os.mkdir(path)
+                    writer(obj, path)
+                    staged = os.path.join(path, os.path.basename(name))
+                    if not os.path.exists(staged):
+                        # nothing to write
+                        continue
+                    if os.path.exists(name) and \
+                       filecmp.cmp(name, staged, shallow=False):
+                        continue
+                elif not os.path.exists(name):
+                    continue
+                diff.extend(_file_diff(name, staged))
+                changes.append((name, staged))
+
+            if not dry_run:
+                for (name, staged) in changes:
+                    if staged is None:
+                        os.remove(name)
+                    else:
+                        _replace_file(name, staged)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return diff
+
     # icmptypes
 
     def get_icmptypes(self):
         return sorted(set(list(self._icmptypes.keys()) + \
-                          list(self._default_icmptypes.keys())))
+                          list(self._default_icmptypes.keys()) + \
+                          self._lazy_list("icmptype")))
 
     def add_icmptype(self, obj):
         if obj.default:
@@ -154,6 +274,7 @@ class FirewallConfig(object):
             self._icmptypes[obj.name] = obj
 
     def get_icmptype(self, name):
+        self._lazy("icmptype", name)
         if name in self._icmptypes:
             return self._icmptypes[name]
         elif name in self._default_icmptypes:
@@ -189,11 +310,11 @@ class FirewallConfig(object):
             x.path = ETC_FIREWALLD_ICMPTYPES
             x.default = False
             self.add_icmptype(x)
-            icmptype_writer(x)
+            self._write(icmptype_writer, x)
             return x
         else:
             obj.import_config(config)
-            icmptype_writer(obj)
+            self._write(icmptype_writer, obj)
             return obj
 
     def new_icmptype(self, name, config):
@@ -212,7 +333,7 @@ class FirewallConfig(object):
         x.path = ETC_FIREWALLD_ICMPTYPES
         x.default = False
 
-        icmptype_writer(x)
+        self._write(icmptype_writer, x)
         self.add_icmptype(x)
         return x
 
@@ -286,7 +407,7 @@ class FirewallConfig(object):
         if obj.path != ETC_FIREWALLD_ICMPTYPES:
             raise FirewallError(INVALID_DIRECTORY,
                         "'%s' != '%s'" % (obj.path, ETC_FIREWALLD_ICMPTYPES))
-        os.remove("%s/%s.xml" % (obj.path, obj.name))
+        self._remove("%s/%s.xml" % (obj.path, obj.name))
         del self._icmptypes[obj.name]
 
     def is_builtin_icmptype(self, obj):
@@ -316,7 +437,8 @@ class FirewallConfig(object):
 
     def get_services(self):
         return sorted(set(list(self._services.keys()) + \
-                          list(self._default_services.keys())))
+                          list(self._default_services.keys()) + \
+                          self._lazy_list("service")))
 
     def add_service(self, obj):
         if obj.default:
@@ -325,6 +447,7 @@ class FirewallConfig(object):
             self._services[obj.name] = obj
 
     def get_service(self, name):
+        self._lazy("service", name)
         if name in self._services:
             return self._services[name]
         elif name in self._default_services:
@@ -360,11 +483,11 @@ class FirewallConfig(object):
             x.path = ETC_FIREWALLD_SERVICES
             x.default = False
             self.add_service(x)
-            service_writer(x)
+            self._write(service_writer, x)
             return x
         else:
             obj.import_config(config)
-            service_writer(obj)
+            self._write(service_writer, obj)
             return obj
 
     def new_service(self, name, config):
@@ -383,7 +506,7 @@ class FirewallConfig(object):
         x.path = ETC_FIREWALLD_SERVICES
         x.default = False
 
-        service_writer(x)
+        self._write(service_writer, x)
         self.add_service(x)
         return x
 
@@ -457,7 +580,7 @@ class FirewallConfig(object):
         if obj.path != ETC_FIREWALLD_SERVICES:
             raise FirewallError(INVALID_DIRECTORY,
                         "'%s' != '%s'" % (obj.path, ETC_FIREWALLD_SERVICES))
-        os.remove("%s/%s.xml" % (obj.path, obj.name))
+        self._remove("%s/%s.xml" % (obj.path, obj.name))
         del self._services[obj.name]
 
     def is_builtin_service(self, obj):
@@ -487,21 +610,62 @@ class FirewallConfig(object):
 
     def get_zones(self):
         return sorted(set(list(self._zones.keys()) + \
-                          list(self._default_zones.keys())))
+                          list(self._default_zones.keys()) + \
+                          self._lazy_list("zone")))
 
     def add_zone(self, obj):
         if obj.default:
             self._default_zones[obj.name] = obj
         else:
             self._zones[obj.name] = obj
+        self._update_zone_index(obj.name)
 
     def forget_zone(self, name):
         if name in self._default_zones:
             del self._default_zones[name]
         if name in self._zones:
             del self._zones[name]
+        self._update_zone_index(name)
+
+    def _update_zone_index(self, name):
+        # re-index services and icmp blocks of the zone that is in effect
+        # for name, a custom zone hides the builtin zone with the same name
+        if name in self._zones:
+            obj = self._zones[name]
+        elif name in self._default_zones:
+            obj = self._default_zones[name]
+        else:
+            obj = None
+        (old_services, old_icmptypes) = self._zone_refs.pop(name,
+                                                            (set(), set()))
+        if obj is not None:
+            services = set(obj.services)
+            icmptypes = set(obj.icmp_blocks)
+            self._zone_refs[name] = (services, icmptypes)
+        else:
+            services = set()
+            icmptypes = set()
+        for (index, old, new) in [ (self._service_zones, old_services,
+                                    services),
+                                   (self._icmptype_zones, old_icmptypes,
+                                    icmptypes) ]:
+            for x in old - new:
+                index[x].discard(name)
+                if len(index[x]) == 0:
+                    del index[x]
+            for x in new - old:
+                index.setdefault(x, set()).add(name)
+
+    def get_zones_of_service(self, name):
+        self._lazy("zone")
+        return sorted(self._service_zones.get(name, ()))
+
+    def get_zones_of_icmptype(self, name):
+        self._lazy("zone")
+        return sorted(self._icmptype_zones.get(name, ()))
 
     def get_zone(self, name):
+        self._lazy("zone", name)
         if name in self._zones:
             return self._zones[name]
         elif name in self._default_zones:
@@ -530,6 +694,18 @@ class FirewallConfig(object):
     def get_zone_config(self, obj):
         return obj.export_config()
 
+    def get_zone_config_range(self, obj, key, offset, count):
+        if key == "rules":
+            key = "rules_str"
+        if key not in [ x for (x, y) in Zone.IMPORT_EXPORT_STRUCTURE \
+                        if isinstance(y, list) ]:
+            raise FirewallError(INVALID_SETTING, key)
+        if offset < 0 or count < 0:
+            raise FirewallError(INVALID_VALUE,
+                                "invalid range %d, %d" % (offset, count))
+        entries = getattr(obj, key)
+        return (len(entries), copy.deepcopy(entries[offset:offset+count]))
+
     def set_zone_config(self, obj, config):
         if obj.default:
             x = copy.copy(obj)
@@ -538,12 +714,13 @@ class FirewallConfig(object):
             x.path = ETC_FIREWALLD_ZONES
             x.default = False
             self.add_zone(x)
-            zone_writer(x)
+            self._write(zone_writer, x)
             return x
         else:
             obj.fw_config = self
             obj.import_config(config)
-            zone_writer(obj)
+            self._update_zone_index(obj.name)
+            self._write(zone_writer, obj)
             return obj
 
     def new_zone(self, name, config):
@@ -563,7 +740,7 @@ class FirewallConfig(object):
         x.path = ETC_FIREWALLD_ZONES
         x.default = False
 
-        zone_writer(x)
+        self._write(zone_writer, x)
         self.add_zone(x)
         return x
 
@@ -580,6 +757,7 @@ class FirewallConfig(object):
                     obj = self._zones[x]
                     if obj.filename == filename:
                         del self._zones[x]
+                        self._update_zone_index(obj.name)
                         if obj.name in self._default_zones:
                             return ("update", self._default_zones[obj.name])
                         return ("remove", obj)
@@ -589,6 +767,7 @@ class FirewallConfig(object):
                     obj = self._default_zones[x]
                     if obj.filename == filename:
                         del self._default_zones[x]
+                        self._update_zone_index(obj.name)
                         if obj.name not in self._zones:
                             # update dbus zone
                             return ("remove", obj)
@@ -614,12 +793,14 @@ class FirewallConfig(object):
             # custom zone update
             if obj.name in self._zones:
                 self._zones[obj.name] = obj
+                self._update_zone_index(obj.name)
             return ("update", obj)
         else:
             if obj.name in self._default_zones:
                 # builtin zone update
                 del self._default_zones[obj.name]
                 self._default_zones[obj.name] = obj
+                self._update_zone_index(obj.name)
 
                 if obj.name not in self._zones:
                     # update dbus zone
@@ -638,8 +819,9 @@ class FirewallConfig(object):
         if not obj.path.startswith(ETC_FIREWALLD_ZONES):
             raise FirewallError(INVALID_DIRECTORY,
                 "'%s' doesn't start with '%s'" % (obj.path, ETC_FIREWALLD_ZONES))
-        os.remove("%s/%s.xml" % (ETC_FIREWALLD_ZONES, obj.name))
+        self._remove("%s/%s.xml" % (ETC_FIREWALLD_ZONES, obj.name))
         del self._zones[obj.name]
+        self._update_zone_index(obj.name)
 
     def is_builtin_zone(self, obj):
         if obj.default or obj.name in self._default_zones:
@@ -662,3 +844,55 @@ class FirewallConfig(object):
 
     def _copy_zone(self, obj, name):
         return self.new_zone(name, obj.export_config())
+
+def _file_writer(obj, path):
+    # write firewalld_conf, lockdown_whitelist or direct object to path,
+    # the current file is copied first as firewalld_conf merges into it
+    filename = obj.filename
+    staged = os.path.join(path, os.path.basename(filename))
+    if os.path.exists(filename):
+        shutil.copy2(filename, staged)
+    obj.filename = staged
+    try:
+        obj.write()
+    finally:
+        obj.filename = filename
+
+def _file_lines(name):
+    if name is None or not os.path.exists(name):
+        return [ ]
+    with io.open(name, mode='rt', encoding='UTF-8') as f:
+        return f.readlines()
+
+def _file_diff(name, staged):
+    fromfile = name if os.path.exists(name) else "/dev/null"
+    tofile = name if staged is not None else "/dev/null"
+    return list(difflib.unified_diff(_file_lines(name), _file_lines(staged),
+                                     fromfile, tofile))
+
+def _replace_file(name, staged):
+    dirpath = os.path.dirname(name)
+    if dirpath.startswith(ETC_FIREWALLD) and not os.path.exists(dirpath):
+        if not os.path.exists(ETC_FIREWALLD):
+            os.mkdir(ETC_FIREWALLD, 0o750)
+        os.mkdir(dirpath, 0o750)
+
+    mode = 0o644
+    if os.path.exists(name):
+        mode = os.stat(name).st_mode & 0o7777
+        try:
+            shutil.copy2(name, "%s.old" % name)
+        except Exception as msg:
+            raise IOError("Backup of '%s' failed: %s" % (name, msg))
+
+    (fd, tmpname) = tempfile.mkstemp(prefix="%s." % os.path.basename(name),
+                                     dir=dirpath)
+    try:
+        with io.open(fd, mode='wb') as f:
+            with io.open(staged, mode='rb') as g:
+                shutil.copyfileobj(g, f)
+        os.chmod(tmpname, mode)
+        os.rename(tmpname, name)
+    except:
+        os.remove(tmpname)
+        raise
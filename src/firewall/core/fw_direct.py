@@ -36,6 +36,65 @@ from firewall.core.io.icmptype import icmptype_reader
 from firewall.core.io.zone import zone_reader
 from firewall.errors import *
 
+class _DirectConfigBatch(object):
+    """Collects direct chains, rules and passthroughs for set_config
+
+    Chains and rules for ipv4 and ipv6 are collected per table and applied
+    with one restore call per table. If a batch fails, it is applied again
+    chain by chain and rule by rule to find and skip the failing entries.
+    Entries that are already in the runtime configuration are skipped.
+    """
+
+    def __init__(self, direct):
+        self._direct = direct
+        self._batches = LastUpdatedOrderedDict()
+        self._chains = [ ]
+        self._rules = [ ]
+        self._passthroughs = [ ]
+
+    def add_chain(self, ipv, table, chain):
+        if self._direct.query_chain(ipv, table, chain):
+            return
+        if ipv in [ "ipv4", "ipv6" ]:
+            batch = self._batches.setdefault((ipv, table), ([ ], [ ]))
+            batch[0].append(chain)
+        else:
+            self._chains.append((ipv, table, chain))
+
+    def add_rule(self, ipv, table, chain, priority, args):
+        if self._direct.query_rule(ipv, table, chain, priority, args):
+            return
+        if ipv in [ "ipv4", "ipv6" ]:
+            batch = self._batches.setdefault((ipv, table), ([ ], [ ]))
+            batch[1].append((chain, priority, args))
+        else:
+            self._rules.append((ipv, table, chain, priority, args))
+
+    def add_passthrough(self, ipv, args):
+        if not self._direct.query_passthrough(ipv, args):
+            self._passthroughs.append((ipv, args))
+
+    def apply(self):
+        for (ipv, table, chain) in self._chains:
+            try:
+                self._direct.add_chain(ipv, table, chain)
+            except FirewallError as error:
+                log.warning(str(error))
+        for (ipv, table, chain, priority, args) in self._rules:
+            try:
+                self._direct.add_rule(ipv, table, chain, priority, args)
+            except FirewallError as error:
+                log.warning(str(error))
+        for table_id in self._batches:
+            (chains, rules) = self._batches[table_id]
+            self._direct._set_batch(table_id, chains, rules)
+        for (ipv, args) in self._passthroughs:
+            if not self._direct.query_passthrough(ipv, args):
+                try:
+                    self._direct.add_passthrough(ipv, args)
+                except FirewallError as error:
+                    log.warning(str(error))
+
 ############################################################################
 #
 # class Firewall
@@ -57,6 +116,10 @@ class FirewallDirect(object):
         self._rule_priority_positions = { }
         self._passthroughs = LastUpdatedOrderedDict()
         self._obj = None
+        # generation of the runtime config and of the last sync with the
+        # permanent config
+        self._generation = 0
+        self._synced_generation = 0
 
     def cleanup(self):
         self.__init_vars()
@@ -69,35 +132,57 @@ class FirewallDirect(object):
         self.set_config((obj.get_all_chains(),
                          obj.get_all_rules(),
                          obj.get_all_passthroughs()))
+        self.set_synced()
+
+    def get_generation(self):
+        return self._generation
+
+    def is_dirty(self):
+        # runtime config changed since the last sync with permanent config
+        return self._generation != self._synced_generation
+
+    def set_synced(self, generation=None):
+        if generation is None:
+            generation = self._generation
+        self._synced_generation = generation
 
     def get_runtime_config(self):
         # Return only runtime changes
         # Remove all chains, rules and passthroughs that are in self._obj
         # (permanent config applied in firewalld _start.
+        # The entries are hashed, the permanent entries are removed with
+        # set operations, the order of the runtime entries is kept.
         chains = LastUpdatedOrderedDict()
         rules = LastUpdatedOrderedDict()
         passthroughs = LastUpdatedOrderedDict()
 
+        _chains = self._obj.get_all_chains()
         for table_id in self._chains:
-            (ipv, table) = table_id
-            for chain in self._chains[table_id]:
-                if not self._obj.query_chain(ipv, table, chain):
-                    chains.setdefault(table_id, [ ]).append(chain)
-
+            permanent = set(_chains[table_id]) if table_id in _chains \
+                        else set()
+            runtime = [ chain for chain in self._chains[table_id]
+                        if chain not in permanent ]
+            if len(runtime) > 0:
+                chains[table_id] = runtime
+
+        _rules = self._obj.get_all_rules()
         for chain_id in self._rules:
-            (ipv, table, chain) = chain_id
-            for (priority, args) in self._rules[chain_id]:
-                if not self._obj.query_rule(ipv, table, chain, priority, args):
+            permanent = set(_rules[chain_id].keys()) if chain_id in _rules \
+                        else set()
+            for rule_id in self._rules[chain_id]:
+                if rule_id not in permanent:
                     if chain_id not in rules:
                         rules[chain_id] = LastUpdatedOrderedDict()
-                    rules[chain_id][(priority, args)] = priority
+                    rules[chain_id][rule_id] = rule_id[0]
 
+        _passthroughs = self._obj.get_all_passthroughs()
         for ipv in self._passthroughs:
-            for args in self._passthroughs[ipv]:
-                if not self._obj.query_passthrough(ipv, args):
-                    if ipv not in passthroughs:
-                        passthroughs[ipv] = [ ]
-                    passthroughs[ipv].append(args)
+            permanent = set(_passthroughs[ipv].keys()) \
+                        if ipv in _passthroughs else set()
+            runtime = [ list(args) for args in self._passthroughs[ipv]
+                        if args not in permanent ]
+            if len(runtime) > 0:
+                passthroughs[ipv] = runtime
 
         return (chains, rules, passthroughs)
 
@@ -106,31 +191,133 @@ class FirewallDirect(object):
 
     def set_config(self, config):
         (_chains, _rules, _passthroughs) = config
+        batch = _DirectConfigBatch(self)
         for table_id in _chains:
             (ipv, table) = table_id
             for chain in _chains[table_id]:
-                if not self.query_chain(ipv, table, chain):
-                    try:
-                        self.add_chain(ipv, table, chain)
-                    except FirewallError as error:
-                        log.warning(str(error))
-
+                batch.add_chain(ipv, table, chain)
         for chain_id in _rules:
             (ipv, table, chain) = chain_id
             for (priority, args) in _rules[chain_id]:
-                if not self.query_rule(ipv, table, chain, priority, args):
-                    try:
-                        self.add_rule(ipv, table, chain, priority, args)
-                    except FirewallError as error:
-                        log.warning(str(error))
-
+                batch.add_rule(ipv, table, chain, priority, args)
         for ipv in _passthroughs:
             for args in _passthroughs[ipv]:
-                if not self.query_passthrough(ipv, args):
-                    try:
-                        self.add_passthrough(ipv, args)
-                    except FirewallError as error:
-                        log.warning(str(error))
+                batch.add_passthrough(ipv, args)
+        batch.apply()
+
+    # runtime state for export_ruleset and import_ruleset
+
+    def export_runtime_state(self):
+        return { "chains": [ list(x) for x in self.get_all_chains() ],
+                 "rules": [ list(x) for x in self.get_all_rules() ],
+                 "passthroughs": [ list(x) for x in \
+                                   self.get_all_passthroughs() ] }
+
+    def check_runtime_state(self, state):
+        # convert a state returned by export_runtime_state back to chains,
+        # rules, priority positions and passthroughs
+        chains = LastUpdatedOrderedDict()
+        rules = LastUpdatedOrderedDict()
+        positions = { }
+        passthroughs = LastUpdatedOrderedDict()
+        try:
+            for (ipv, table, chain) in state["chains"]:
+                self._check_ipv_table(ipv, table)
+                self._check_builtin_chain(ipv, table, chain)
+                chains.setdefault((ipv, table), [ ]).append(chain)
+            for (ipv, table, chain, priority, args) in state["rules"]:
+                self._check_ipv_table(ipv, table)
+                chain_id = (ipv, table, chain)
+                priority = int(priority)
+                if chain_id not in rules:
+                    rules[chain_id] = LastUpdatedOrderedDict()
+                    positions[chain_id] = PriorityPositions()
+                rules[chain_id][(priority, tuple(args))] = priority
+                positions[chain_id].add(priority)
+            for (ipv, args) in state["passthroughs"]:
+                self._check_ipv(ipv)
+                if ipv not in passthroughs:
+                    passthroughs[ipv] = LastUpdatedOrderedDict()
+                passthroughs[ipv][tuple(args)] = True
+        except (KeyError, TypeError, ValueError) as msg:
+            raise FirewallError(INVALID_VALUE,
+                                "invalid direct state: %s" % msg)
+        return (chains, rules, positions, passthroughs)
+
+    def set_runtime_state(self, state):
+        # set the direct configuration from a state returned by
+        # check_runtime_state, the rules need to be in place already
+        (self._chains, self._rules, self._rule_priority_positions,
+         self._passthroughs) = state
+        self._generation += 1
+
+    def read_permanent_config(self, obj):
+        # Read the permanent configuration file of obj and apply it like
+        # set_permanent_config. The entries are collected for the batches
+        # while the file is parsed.
+        batch = _DirectConfigBatch(self)
+        obj.read(listener=batch)
+        self._obj = obj
+        batch.apply()
+        self.set_synced()
+
+    def _set_batch(self, table_id, chains, rules):
+        try:
+            self.__set_batch(table_id, chains, rules)
+        except FirewallError as error:
+            log.debug1("Failed to apply direct chains and rules for "
+                       "'%s:%s' at once: %s", table_id[0], table_id[1],
+                       error)
+            for chain in chains:
+                try:
+                    self.add_chain(table_id[0], table_id[1], chain)
+                except FirewallError as error:
+                    log.warning(str(error))
+            for (chain, priority, args) in rules:
+                try:
+                    self.add_rule(table_id[0], table_id[1], chain,
+                                  priority, args)
+                except FirewallError as error:
+                    log.warning(str(error))
+
+    def __set_batch(self, table_id, chains, rules):
+        # Add chains and rules of table_id with a single restore call. The
+        # rules are inserted at the same positions as with add_rule, the
+        # internal state is only updated if the call succeeds.
+        (ipv, table) = table_id
+        _rules = [ ]
+        for chain in chains:
+            _rules.append([ "-N", chain ])
+
+        positions = { }
+        for (chain, priority, args) in rules:
+            chain_id = (ipv, table, chain)
+            if chain_id not in positions:
+                if chain_id in self._rule_priority_positions:
+                    positions[chain_id] = \
+                        self._rule_priority_positions[chain_id].copy()
+                else:
+                    positions[chain_id] = PriorityPositions()
+            index = positions[chain_id].count_le(priority) + 1
+            positions[chain_id].add(priority)
+            _rules.append([ "-I", self.__direct_chain(ipv, table, chain),
+                            str(index) ] + list(args))
+
+        try:
+            self._fw.restore_rules(ipv, table, _rules)
+        except Exception as msg:
+            log.debug2(msg)
+            raise FirewallError(COMMAND_FAILED, msg)
+
+        for chain in chains:
+            self._chains.setdefault(table_id, [ ]).append(chain)
+        for (chain, priority, args) in rules:
+            chain_id = (ipv, table, chain)
+            if chain_id not in self._rules:
+                self._rules[chain_id] = LastUpdatedOrderedDict()
+            self._rules[chain_id][(priority, args)] = priority
+        self._rule_priority_positions.update(positions)
+        self._generation += 1
 
     def _check_ipv(self, ipv):
         ipvs = ['ipv4', 'ipv6', 'eb']
@@ -201,6 +388,7 @@ class FirewallDirect(object):
             self._chains[table_id].remove(chain)
             if len(self._chains[table_id]) == 0:
                 del self._chains[table_id]
+        self._generation += 1
 
     def add_chain(self, ipv, table, chain):
         #TODO: policy="ACCEPT"
@@ -233,18 +421,20 @@ class FirewallDirect(object):
 
     # DIRECT RULE
 
-    def __rule(self, enable, ipv, table, chain, priority, args):
-        self._check_ipv_table(ipv, table)
-        _chain = chain
-        # use "%s_chain" for built-in chains
-
+    def __direct_chain(self, ipv, table, chain):
+        # use "%s_direct" for built-in chains
         if ipv in [ "ipv4", "ipv6" ]:
             _CHAINS = ipXtables.BUILT_IN_CHAINS
         else:
             _CHAINS = ebtables.BUILT_IN_CHAINS
 
         if table in _CHAINS and chain in _CHAINS[table]:
-            _chain = "%s_direct" % (chain)
+            return "%s_direct" % (chain)
+        return chain
+
+    def __rule(self, enable, ipv, table, chain, priority, args):
+        self._check_ipv_table(ipv, table)
+        _chain = self.__direct_chain(ipv, table, chain)
 
         chain_id = (ipv, table, chain)
         rule_id = (priority, args)
@@ -265,13 +455,13 @@ class FirewallDirect(object):
             # get priority of rule
             priority = self._rules[chain_id][rule_id]
 
-        # If a rule gets added, the initial rule index position within the 
+        # If a rule gets added, the initial rule index position within the
         # ipv, table and chain combination (chain_id) is 1.
-        # Tf the chain_id exists in _rule_priority_positions, there are already
-        # other rules for this chain_id. The number of rules for a priority
-        # less or equal to the priority of the new rule will increase the 
-        # index of the new rule. The index is the ip*tables -I insert rule
-        # number.
+        # If the chain_id exists in _rule_priority_positions, there are
+        # already other rules for this chain_id. The number of rules with a
+        # priority less or equal to the priority of the new rule will
+        # increase the index of the new rule. The index is the ip*tables -I
+        # insert rule number.
         #
         # Example: We have the following rules for chain_id (ipv4, filter,
         # INPUT) already:
@@ -279,37 +469,25 @@ class FirewallDirect(object):
         #   ipv4, filter, INPUT, 2, -i, foo2, -j, ACCEPT
         #   ipv4, filter, INPUT, 2, -i, foo2_1, -j, ACCEPT
         #   ipv4, filter, INPUT, 3, -i, foo3, -j, ACCEPT
-        # This results in the following _rule_priority_positions structure:
-        #   _rule_priority_positions[(ipv4,filter,INPUT)][1] = 1
-        #   _rule_priority_positions[(ipv4,filter,INPUT)][2] = 2
-        #   _rule_priority_positions[(ipv4,filter,INPUT)][3] = 1
+        # This results in the following counts in
+        # _rule_priority_positions[(ipv4,filter,INPUT)]:
+        #   priority 1: 1, priority 2: 2, priority 3: 1
         # The new rule
         #   ipv4, filter, INPUT, 2, -i, foo2_2, -j, ACCEPT
         # has the same pritority as the second rule before and will be added
-        # right after it. 
-        # The initial index is 1 and the chain_id is already in
-        # _rule_priority_positions. Therefore the index will increase for
-        # the number of rules in every rule position in 
-        # _rule_priority_positions[(ipv4,filter,INPUT)].keys()
-        # where position is smaller or equal to the entry in keys.
-        # With the example from above:
-        # The priority of the new rule is 2. Therefore for all keys in 
-        # _rule_priority_positions[chain_id] where priority is 1 or 2, the 
-        # number of the rules will increase the index of the rule.
-        # For _rule_priority_positions[chain_id][1]: index += 1
-        # _rule_priority_positions[chain_id][2]: index += 2
-        # index will be 4 in the end and the rule in the table chain 
-        # combination will be added at index 4.
-        # If there are no rules in the table chain combination, a new rule 
+        # right after it. There are 3 rules with a priority less or equal
+        # to 2, therefore the index will be 4 and the rule in the table
+        # chain combination will be added at index 4.
+        # If there are no rules in the table chain combination, a new rule
         # has index 1.
+        #
+        # PriorityPositions keeps the counts in a Fenwick tree, the number
+        # of rules up to a priority is computed in O(log n) for n distinct
+        # priorities.
 
         index = 1
         if chain_id in self._rule_priority_positions:
-            positions = sorted(self._rule_priority_positions[chain_id].keys())
-            j = 0
-            while j < len(positions) and priority >= positions[j]:
-                index += self._rule_priority_positions[chain_id][positions[j]]
-                j += 1
+            index += self._rule_priority_positions[chain_id].count_le(priority)
 
         rule = [ "-t", table ]
         if enable:
@@ -329,17 +507,14 @@ class FirewallDirect(object):
                 self._rules[chain_id] = LastUpdatedOrderedDict()
             self._rules[chain_id][rule_id] = priority
             if chain_id not in self._rule_priority_positions:
-                self._rule_priority_positions[chain_id] = { }
-
-            if priority in self._rule_priority_positions[chain_id]:
-                self._rule_priority_positions[chain_id][priority] += 1
-            else:
-                self._rule_priority_positions[chain_id][priority] = 1
+                self._rule_priority_positions[chain_id] = PriorityPositions()
+            self._rule_priority_positions[chain_id].add(priority)
         else:
             del self._rules[chain_id][rule_id]
             if len(self._rules[chain_id]) == 0:
                 del self._rules[chain_id]
-            self._rule_priority_positions[chain_id][priority] -= 1
+            self._rule_priority_positions[chain_id].remove(priority)
+        self._generation += 1
 
     def add_rule(self, ipv, table, chain, priority, args):
         self.__rule(True, ipv, table, chain, priority, args)
@@ -382,14 +557,15 @@ class FirewallDirect(object):
     def __passthrough(self, enable, ipv, args):
         self._check_ipv(ipv)
 
-        passthrough_id = (ipv, args)
+        passthrough_id = tuple(args)
         if enable:
-            if ipv in self._passthroughs and args in self._passthroughs[ipv]:
+            if ipv in self._passthroughs and \
+               passthrough_id in self._passthroughs[ipv]:
                 raise FirewallError(ALREADY_ENABLED,
                                     "passthrough '%s', '%s'" % (ipv, args))
         else:
             if ipv not in self._passthroughs or \
-               args not in self._passthroughs[ipv]:
+               passthrough_id not in self._passthroughs[ipv]:
                 raise FirewallError(NOT_ENABLED,
                                     "passthrough '%s', '%s'" % (ipv, args))
 
@@ -407,12 +583,13 @@ class FirewallDirect(object):
 
         if enable:
             if ipv not in self._passthroughs:
-                self._passthroughs[ipv] = [ ]
-            self._passthroughs[ipv].append(args)
+                self._passthroughs[ipv] = LastUpdatedOrderedDict()
+            self._passthroughs[ipv][passthrough_id] = True
         else:
-            self._passthroughs[ipv].remove(args)
+            del self._passthroughs[ipv][passthrough_id]
             if len(self._passthroughs[ipv]) == 0:
                 del self._passthroughs[ipv]
+        self._generation += 1
 
     def add_passthrough(self, ipv, args):
         self.__passthrough(True, ipv, list(args))
@@ -422,7 +599,7 @@ class FirewallDirect(object):
 
     def query_passthrough(self, ipv, args):
         return (ipv in self._passthroughs and \
-                list(args) in self._passthroughs[ipv])
+                tuple(args) in self._passthroughs[ipv])
 
     def get_all_passthroughs(self):
         r = [ ]
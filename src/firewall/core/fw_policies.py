@@ -30,6 +30,7 @@ class FirewallPolicies(object):
     def __init__(self):
         self._lockdown = False
         self.lockdown_whitelist = LockdownWhitelist(LOCKDOWN_WHITELIST)
+        self._synced_generation = self.lockdown_whitelist.generation
 
     def __repr__(self):
         return '%s(%r, %r)' % (self.__class__, self._lockdown,
@@ -39,6 +40,13 @@ class FirewallPolicies(object):
         self._lockdown = False
         self.lockdown_whitelist.cleanup()
 
+    def is_dirty(self):
+        # lockdown whitelist changed since the last sync with permanent config
+        return self.lockdown_whitelist.generation != self._synced_generation
+
+    def set_synced(self):
+        self._synced_generation = self.lockdown_whitelist.generation
+
     # lockdown
 
     def access_check(self, key, value):
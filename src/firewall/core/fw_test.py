@@ -76,8 +76,10 @@ class Firewall_test(object):
         self._min_mark = FALLBACK_MINIMAL_MARK # will be overloaded by firewalld.conf
         self.cleanup_on_exit = True
         self.ipv6_rpfilter_enabled = True
+        self.individual_signals = True
+        self._lazy = None
 
-    def start(self):
+    def start(self, lazy=False):
         # initialize firewall
         default_zone = FALLBACK_ZONE
 
@@ -126,6 +128,16 @@ class Firewall_test(object):
             else:
                 log.debug1("IPV6 rpfilter is disabled")
 
+            if self._firewalld_conf.get("IndividualSignals"):
+                value = self._firewalld_conf.get("IndividualSignals")
+                if value is not None:
+                    if value.lower() in [ "no", "false" ]:
+                        self.individual_signals = False
+                    if value.lower() in [ "yes", "true" ]:
+                        self.individual_signals = True
+            if not self.individual_signals:
+                log.debug1("Individual zone item signals are disabled")
+
         self.config.set_firewalld_conf(copy.deepcopy(self._firewalld_conf))
 
         # load lockdown whitelist
@@ -139,32 +151,44 @@ class Firewall_test(object):
         # copy policies to config interface
         self.config.set_policies(copy.deepcopy(self.policies))
 
+        # lazy mode: only index the icmptype, service and zone files, they
+        # are parsed on first use
+        if lazy:
+            self._lazy = { "icmptype": { }, "service": { } }
+            if not self._has_combined_zones():
+                # combined zones need all zone files, load them at once
+                self._lazy["zone"] = { }
+            self.config.set_lazy_loader(self._lazy_names, self._lazy_load)
+
         # load icmptype files
         self._loader(FIREWALLD_ICMPTYPES, "icmptype")
         self._loader(ETC_FIREWALLD_ICMPTYPES, "icmptype")
 
-        if len(self.icmptype.get_icmptypes()) == 0:
+        if len(self.icmptype.get_icmptypes() +
+               self._lazy_names("icmptype")) == 0:
             log.error("No icmptypes found.")
 
         # load service files
         self._loader(FIREWALLD_SERVICES, "service")
         self._loader(ETC_FIREWALLD_SERVICES, "service")
 
-        if len(self.service.get_services()) == 0:
+        if len(self.service.get_services() +
+               self._lazy_names("service")) == 0:
             log.error("No services found.")
 
         # load zone files
         self._loader(FIREWALLD_ZONES, "zone")
         self._loader(ETC_FIREWALLD_ZONES, "zone")
 
-        if len(self.zone.get_zones()) == 0:
+        zones = self.zone.get_zones() + self._lazy_names("zone")
+        if len(zones) == 0:
             log.fatal("No zones found.")
             sys.exit(1)
 
         # check minimum required zones
         error = False
         for z in [ "block", "drop", "trusted" ]:
-            if z not in self.zone.get_zones():
+            if z not in zones:
                 log.fatal("Zone '%s' is not available.", z)
                 error = True
         if error:
@@ -182,10 +206,10 @@ class Firewall_test(object):
         self.config.set_direct(copy.deepcopy(obj))
 
         # check if default_zone is a valid zone
-        if default_zone not in self.zone.get_zones():
-            if "public" in self.zone.get_zones():
+        if default_zone not in zones:
+            if "public" in zones:
                 zone = "public"
-            elif "external" in self.zone.get_zones():
+            elif "external" in zones:
                 zone = "external"
             else:
                 zone = "block" # block is a base zone, therefore it has to exist
@@ -205,6 +229,15 @@ class Firewall_test(object):
         if not os.path.isdir(path):
             return
 
+        if self._lazy is not None and reader_type in self._lazy:
+            for filename in sorted(os.listdir(path)):
+                if filename.endswith(".xml"):
+                    log.debug1("Indexing %s file '%s/%s'", reader_type,
+                               path, filename)
+                    self._lazy[reader_type].setdefault(
+                        filename[:-4], [ ]).append((path, filename))
+            return
+
         if combine:
             if path.startswith(ETC_FIREWALLD) and reader_type == "zone":
                 combined_zone = Zone()
@@ -224,70 +257,8 @@ class Firewall_test(object):
                                  combine=True)
                 continue
 
-            name = "%s/%s" % (path, filename)
-            log.debug1("Loading %s file '%s'", reader_type, name)
-            try:
-                if reader_type == "icmptype":
-                    obj = icmptype_reader(filename, path)
-                    if obj.name in self.icmptype.get_icmptypes():
-                        orig_obj = self.icmptype.get_icmptype(obj.name)
-                        log.debug1("  Overloads %s '%s' ('%s/%s')", reader_type,
-                                   orig_obj.name, orig_obj.path,
-                                   orig_obj.filename)
-                        self.icmptype.remove_icmptype(orig_obj.name)
-                    self.icmptype.add_icmptype(obj)
-                    # add a deep copy to the configuration interface
-                    self.config.add_icmptype(copy.deepcopy(obj))
-                elif reader_type == "service":
-                    obj = service_reader(filename, path)
-                    if obj.name in self.service.get_services():
-                        orig_obj = self.service.get_service(obj.name)
-                        log.debug1("  Overloads %s '%s' ('%s/%s')", reader_type,
-                                   orig_obj.name, orig_obj.path,
-                                   orig_obj.filename)
-                        self.service.remove_service(orig_obj.name)
-                    self.service.add_service(obj)
-                    # add a deep copy to the configuration interface
-                    self.config.add_service(copy.deepcopy(obj))
-                elif reader_type == "zone":
-                    obj = zone_reader(filename, path)
-                    if combine:
-                        # Change name for permanent configuration
-                        obj.name = "%s/%s" % (
-                            os.path.basename(path),
-                            os.path.basename(filename)[0:-4])
-                        obj.check_name(obj.name)
-                    # Copy object before combine
-                    config_obj = copy.deepcopy(obj)
-                    if obj.name in self.zone.get_zones():
-                        orig_obj = self.zone.get_zone(obj.name)
-                        self.zone.remove_zone(orig_obj.name)
-                        if orig_obj.combined:
-                            log.debug1("  Combining %s '%s' ('%s/%s')",
-                                        reader_type, obj.name,
-                                        path, filename)
-                            obj.combine(orig_obj)
-                        else:
-                            log.debug1("  Overloads %s '%s' ('%s/%s')",
-                                       reader_type,
-                                       orig_obj.name, orig_obj.path,
-                                       orig_obj.filename)
-                    self.config.add_zone(config_obj)
-                    if combine:
-                        log.debug1("  Combining %s '%s' ('%s/%s')",
-                                   reader_type, combined_zone.name,
-                                   path, filename)
-                        combined_zone.combine(obj)
-                    else:
-                        self.zone.add_zone(obj)
-                else:
-                    log.fatal("Unknown reader type %s", reader_type)
-            except FirewallError as msg:
-                log.error("Failed to load %s file '%s': %s", reader_type,
-                          name, msg)
-            except Exception as msg:
-                log.error("Failed to load %s file '%s':", reader_type, name)
-                log.exception()
+            self._load_file(path, filename, reader_type,
+                            combined_zone if combine else None)
 
         if combine and combined_zone.combined:
             if combined_zone.name in self.zone.get_zones():
@@ -302,6 +273,102 @@ class Firewall_test(object):
                 self.config.forget_zone(combined_zone.name)
             self.zone.add_zone(combined_zone)
 
+    def _load_file(self, path, filename, reader_type, combined_zone=None):
+        combine = combined_zone is not None
+        name = "%s/%s" % (path, filename)
+        log.debug1("Loading %s file '%s'", reader_type, name)
+        try:
+            if reader_type == "icmptype":
+                obj = icmptype_reader(filename, path)
+                if obj.name in self.icmptype.get_icmptypes():
+                    orig_obj = self.icmptype.get_icmptype(obj.name)
+                    log.debug1("  Overloads %s '%s' ('%s/%s')", reader_type,
+                               orig_obj.name, orig_obj.path,
+                               orig_obj.filename)
+                    self.icmptype.remove_icmptype(orig_obj.name)
+                self.icmptype.add_icmptype(obj)
+                # add a deep copy to the configuration interface
+                self.config.add_icmptype(copy.deepcopy(obj))
+            elif reader_type == "service":
+                obj = service_reader(filename, path)
+                if obj.name in self.service.get_services():
+                    orig_obj = self.service.get_service(obj.name)
+                    log.debug1("  Overloads %s '%s' ('%s/%s')", reader_type,
+                               orig_obj.name, orig_obj.path,
+                               orig_obj.filename)
+                    self.service.remove_service(orig_obj.name)
+                self.service.add_service(obj)
+                # add a deep copy to the configuration interface
+                self.config.add_service(copy.deepcopy(obj))
+            elif reader_type == "zone":
+                obj = zone_reader(filename, path)
+                if combine:
+                    # Change name for permanent configuration
+                    obj.name = "%s/%s" % (
+                        os.path.basename(path),
+                        os.path.basename(filename)[0:-4])
+                    obj.check_name(obj.name)
+                # Copy object before combine
+                config_obj = copy.deepcopy(obj)
+                if obj.name in self.zone.get_zones():
+                    orig_obj = self.zone.get_zone(obj.name)
+                    self.zone.remove_zone(orig_obj.name)
+                    if orig_obj.combined:
+                        log.debug1("  Combining %s '%s' ('%s/%s')",
+                                    reader_type, obj.name,
+                                    path, filename)
+                        obj.combine(orig_obj)
+                    else:
+                        log.debug1("  Overloads %s '%s' ('%s/%s')",
+                                   reader_type,
+                                   orig_obj.name, orig_obj.path,
+                                   orig_obj.filename)
+                self.config.add_zone(config_obj)
+                if combine:
+                    log.debug1("  Combining %s '%s' ('%s/%s')",
+                               reader_type, combined_zone.name,
+                               path, filename)
+                    combined_zone.combine(obj)
+                else:
+                    self.zone.add_zone(obj)
+            else:
+                log.fatal("Unknown reader type %s", reader_type)
+        except FirewallError as msg:
+            log.error("Failed to load %s file '%s': %s", reader_type,
+                      name, msg)
+        except Exception as msg:
+            log.error("Failed to load %s file '%s':", reader_type, name)
+            log.exception()
+
+    def _has_combined_zones(self):
+        if not os.path.isdir(ETC_FIREWALLD_ZONES):
+            return False
+        for filename in os.listdir(ETC_FIREWALLD_ZONES):
+            if os.path.isdir("%s/%s" % (ETC_FIREWALLD_ZONES, filename)):
+                return True
+        return False
+
+    def _lazy_names(self, reader_type):
+        # names of indexed objects, that have not been loaded, yet
+        if self._lazy is None or reader_type not in self._lazy:
+            return [ ]
+        return sorted(self._lazy[reader_type].keys())
+
+    def _lazy_load(self, reader_type, name=None):
+        # parse the files of an indexed object or of all indexed objects if
+        # name is None, the files are loaded in index order to keep overloads
+        if self._lazy is None or reader_type not in self._lazy:
+            return
+        index = self._lazy[reader_type]
+        for x in (sorted(index.keys()) if name is None else [ name ]):
+            for (path, filename) in index.pop(x, [ ]):
+                self._load_file(path, filename, reader_type)
+
+    def load_all(self):
+        # load all indexed objects, needed to list or search all of them
+        for reader_type in [ "icmptype", "service", "zone" ]:
+            self._lazy_load(reader_type)
+
     def cleanup(self):
         self.icmptype.cleanup()
         self.service.cleanup()
@@ -324,7 +391,8 @@ class Firewall_test(object):
         _zone = zone
         if not _zone or _zone == "":
             _zone = self.get_default_zone()
-        if _zone not in self.zone.get_zones():
+        if _zone not in self.zone.get_zones() and \
+           _zone not in self._lazy_names("zone"):
             raise FirewallError(INVALID_ZONE, _zone)
         return _zone
 
@@ -333,6 +401,7 @@ class Firewall_test(object):
             raise FirewallError(INVALID_INTERFACE, interface)
 
     def check_service(self, service):
+        self._lazy_load("service", service)
         self.service.check_service(service)
 
     def check_port(self, port):
@@ -371,6 +440,7 @@ class Firewall_test(object):
             raise FirewallError(INVALID_IPV)
 
     def check_icmptype(self, icmp):
+        self._lazy_load("icmptype", icmp)
         self.icmptype.check_icmptype(icmp)
 
     # RELOAD
@@ -405,7 +475,7 @@ class Firewall_test(object):
             _old_dz = self._default_zone
             self._default_zone = _zone
             self._firewalld_conf.set("DefaultZone", _zone)
-            self._firewalld_conf.write()
+            self.config.write_file(self._firewalld_conf)
         else:
             raise FirewallError(ZONE_ALREADY_SET, _zone)
 
@@ -413,8 +483,8 @@ class Firewall_test(object):
 
     def enable_lockdown(self):
         self._firewalld_conf.set("Lockdown", "yes")
-        self._firewalld_conf.write()
+        self.config.write_file(self._firewalld_conf)
         
     def disable_lockdown(self):
         self._firewalld_conf.set("Lockdown", "no")
-        self._firewalld_conf.write()
+        self.config.write_file(self._firewalld_conf)
@@ -19,33 +19,43 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import sys
 import time
+import copy
+import itertools
+from collections import deque
 from firewall.core.base import *
 from firewall.core.logger import log
 from firewall.functions import portStr, checkIPnMask, checkIP6nMask, \
-    checkProtocol, enable_ip_forwarding, check_single_address
+    checkProtocol, check_single_address
 from firewall.core.rich import *
 from firewall.errors import *
-from firewall.core.ipXtables import ip4tables_available_tables,\
-    ip6tables_available_tables, OUR_CHAINS
+from firewall.core.ipXtables import OUR_CHAINS
 
 mangle = []
-if "mangle" in ip4tables_available_tables:
-    mangle.append("ipv4")
-if "mangle" in ip6tables_available_tables:
-    mangle.append("ipv6")
-
 nat = []
-if "nat" in ip4tables_available_tables:
-    nat.append("ipv4")
-else:
-    if "ipv4" in mangle:
-        mangle.remove("ipv4")
-if "nat" in ip6tables_available_tables:
-    nat.append("ipv6")
-else:
-    if "ipv6" in mangle:
-        mangle.remove("ipv6")
+
+def update_zone_chains(ip4tables_tables, ip6tables_tables):
+    # the nat and mangle zone chains are only used for available tables, the
+    # lists are changed in place as they are referenced in ZONE_CHAINS.
+    # Called by Firewall after the available tables have been detected.
+    del mangle[:]
+    del nat[:]
+    if "mangle" in ip4tables_tables:
+        mangle.append("ipv4")
+    if "mangle" in ip6tables_tables:
+        mangle.append("ipv6")
+
+    if "nat" in ip4tables_tables:
+        nat.append("ipv4")
+    else:
+        if "ipv4" in mangle:
+            mangle.remove("ipv4")
+    if "nat" in ip6tables_tables:
+        nat.append("ipv6")
+    else:
+        if "ipv6" in mangle:
+            mangle.remove("ipv6")
 
 ZONE_CHAINS = {
     "filter": {
@@ -71,6 +81,14 @@ INTERFACE_ZONE_OPTS = {
     "OUTPUT": "-o",
 }
 
+if sys.version_info[0] >= 3:
+    _intern = sys.intern
+else:
+    _intern = intern
+
+# number of settings changes remembered per zone for get_changes
+ZONE_CHANGES_LOG_SIZE = 1000
+
 SOURCE_ZONE_OPTS = { }
 # transform INTERFACE_ZONE_OPTS for source address
 for x in INTERFACE_ZONE_OPTS:
@@ -79,11 +97,81 @@ for x in INTERFACE_ZONE_OPTS:
     if INTERFACE_ZONE_OPTS[x] == "-o":
         SOURCE_ZONE_OPTS[x] = "-d"
 
+class ZoneSettingsRecord(object):
+    """ Runtime settings record of a zone entry (interface, service, port..)
+
+        Uses slots instead of a dict per entry to keep the memory footprint
+        low with a large number of entries. The record can still be used
+        like the former dict with the keys "date", "sender", "timeout",
+        "mark" and "__default__".
+    """
+
+    __slots__ = ( "date", "sender", "timeout", "mark", "default" )
+
+    KEYS = {
+        "date": "date",
+        "sender": "sender",
+        "timeout": "timeout",
+        "mark": "mark",
+        "__default__": "default",
+    }
+
+    def __init__(self, timeout, sender, mark=None):
+        self.date = time.time()
+        if sender is not None:
+            # senders are shared by a lot of entries
+            sender = _intern(str(sender))
+        self.sender = sender
+        self.timeout = timeout
+        self.mark = mark
+        self.default = None
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__, dict(self.items()))
+
+    def __slot(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return self.KEYS[key]
+
+    def __getitem__(self, key):
+        value = getattr(self, self.__slot(key))
+        if value is None and key in [ "mark", "__default__" ]:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        setattr(self, self.__slot(key), value)
+
+    def __contains__(self, key):
+        if key in [ "mark", "__default__" ]:
+            return getattr(self, self.KEYS[key]) is not None
+        return key in self.KEYS
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [ key for key in self.KEYS if key in self ]
+
+    def items(self):
+        return [ (key, self[key]) for key in self.keys() ]
+
+
 class FirewallZone(object):
     def __init__(self, fw):
         self._fw = fw
         self._chains = { }
         self._zones = { }
+        # reverse indexes: service/icmptype name -> set of zone names
+        self._service_zones = { }
+        self._icmptype_zones = { }
+        # change sequence number, not reset on cleanup to stay monotonic
+        # over reloads
+        self._sequence = 0
 
     def __repr__(self):
         return '%s(%r, %r)' % (self.__class__, self._chains, self._zones)
@@ -91,6 +179,8 @@ class FirewallZone(object):
     def cleanup(self):
         self._chains.clear()
         self._zones.clear()
+        self._service_zones.clear()
+        self._icmptype_zones.clear()
 
     # zones
 
@@ -117,6 +207,21 @@ class FirewallZone(object):
         z = self._fw.check_zone(zone)
         return self._zones[z]
 
+    def get_zones_of_service(self, service):
+        return sorted(self._service_zones.get(service, ()))
+
+    def get_zones_of_icmptype(self, icmptype):
+        return sorted(self._icmptype_zones.get(icmptype, ()))
+
+    def __index_add(self, index, key, zone):
+        index.setdefault(key, set()).add(zone)
+
+    def __index_remove(self, index, key, zone):
+        if key in index:
+            index[key].discard(zone)
+            if len(index[key]) == 0:
+                del index[key]
+
     def _error2warning(self, f, name, *args):
         # transform errors into warnings
         try:
@@ -131,6 +236,12 @@ class FirewallZone(object):
                                            "masquerade", "forward_ports",
                                            "icmp_blocks", "rules",
                                            "protocols" ] }
+        # log of the last settings changes: (sequence, key, entry, added)
+        obj.changes = deque(maxlen=ZONE_CHANGES_LOG_SIZE)
+        obj.changes_base = self._sequence
+        obj.sequence = self._sequence
+        # sequence of the last sync with the permanent config
+        obj.synced_sequence = self._sequence
 
         self._zones[obj.name] = obj
 
@@ -138,6 +249,10 @@ class FirewallZone(object):
         obj = self._zones[zone]
         if obj.applied:
             self.unapply_zone_settings(zone)
+        for service in obj.settings["services"]:
+            self.__index_remove(self._service_zones, service, zone)
+        for icmp in obj.settings["icmp_blocks"]:
+            self.__index_remove(self._icmptype_zones, icmp, zone)
         obj.settings.clear()
         del self._zones[zone]
 
@@ -169,6 +284,8 @@ class FirewallZone(object):
                 applied = True
 
             obj.applied = applied
+            # the permanent settings are in sync with the runtime now
+            obj.synced_sequence = obj.sequence
 
     # dynamic chain handling
 
@@ -198,10 +315,7 @@ class FirewallZone(object):
                 ipvs.append("ipv6")
 
             for ipv in ipvs:
-                OUR_CHAINS[table].update(set([_zone,
-                                              "%s_log" % _zone,
-                                              "%s_deny" % _zone,
-                                              "%s_allow" % _zone]))
+                self.__our_chains(table, _zone)
                 chains.append((ipv, [ _zone, "-t", table ]))
                 chains.append((ipv, [ "%s_log" % (_zone), "-t", table ]))
                 chains.append((ipv, [ "%s_deny" % (_zone), "-t", table ]))
@@ -273,6 +387,12 @@ class FirewallZone(object):
             if len(self._chains[zone]) == 0:
                 del self._chains[zone]
 
+    def __our_chains(self, table, _zone):
+        OUR_CHAINS[table].update(set([_zone,
+                                      "%s_log" % _zone,
+                                      "%s_deny" % _zone,
+                                      "%s_allow" % _zone]))
+
     def add_chain(self, zone, table, chain):
         self.__chain(zone, True, table, chain)
 
@@ -286,18 +406,201 @@ class FirewallZone(object):
 
     # generate settings record with sender, timeout, mark
     def __gen_settings(self, timeout, sender, mark=None):
-        ret = {
-            "date": time.time(),
-            "sender": sender,
-            "timeout": timeout,
-        }
-        if mark:
-            ret["mark"] = mark
-        return ret
+        return ZoneSettingsRecord(timeout, sender, mark=mark)
 
     def get_settings(self, zone):
         return self.get_zone(zone).settings
 
+    def get_memory_usage(self, zone):
+        """
+        :return: dict with number of entries and approximate memory usage
+                 in bytes of the runtime settings per setting key
+        """
+        settings = self.get_settings(zone)
+        ret = { }
+        for key in settings:
+            size = sys.getsizeof(settings[key])
+            for (entry_id, record) in settings[key].items():
+                size += sys.getsizeof(entry_id) + sys.getsizeof(record)
+                if isinstance(entry_id, tuple):
+                    size += sum([sys.getsizeof(x) for x in entry_id])
+            ret[key] = (len(settings[key]), size)
+        return ret
+
+    def __entry(self, key, entry_id):
+        # entry as returned by the list_ methods
+        if key == "sources":
+            return entry_id[1]
+        return entry_id
+
+    def __changed(self, obj, key, entry_id, added):
+        self._sequence += 1
+        if len(obj.changes) == obj.changes.maxlen:
+            # oldest change gets dropped from the log
+            obj.changes_base = obj.changes[0][0]
+        obj.changes.append((self._sequence, key, self.__entry(key, entry_id),
+                            added))
+        obj.sequence = self._sequence
+
+    def __add_setting(self, obj, key, entry_id, record):
+        obj.settings[key][entry_id] = record
+        if key == "services":
+            self.__index_add(self._service_zones, entry_id, obj.name)
+        elif key == "icmp_blocks":
+            self.__index_add(self._icmptype_zones, entry_id, obj.name)
+        self.__changed(obj, key, entry_id, True)
+
+    def __remove_setting(self, obj, key, entry_id):
+        if entry_id not in obj.settings[key]:
+            return
+        del obj.settings[key][entry_id]
+        if key == "services":
+            self.__index_remove(self._service_zones, entry_id, obj.name)
+        elif key == "icmp_blocks":
+            self.__index_remove(self._icmptype_zones, entry_id, obj.name)
+        self.__changed(obj, key, entry_id, False)
+
+    def get_sequence(self, zone):
+        return self.get_zone(zone).sequence
+
+    def is_dirty(self, zone):
+        # runtime settings changed since the last sync with permanent config
+        obj = self.get_zone(zone)
+        return obj.sequence != obj.synced_sequence
+
+    def set_synced(self, zone, sequence=None):
+        obj = self.get_zone(zone)
+        if sequence is None:
+            sequence = obj.sequence
+        obj.synced_sequence = sequence
+
+    def get_settings_range(self, zone, key, offset, count):
+        """
+        :return: tuple of sequence number, number of entries and up to count
+                 entries of the settings key starting at offset
+        """
+        settings = self.get_settings(zone)
+        if key not in settings:
+            raise FirewallError(INVALID_SETTING, key)
+        if offset < 0 or count < 0:
+            raise FirewallError(INVALID_VALUE,
+                                "invalid range %d, %d" % (offset, count))
+        entries = [ self.__entry(key, x) for x in \
+                    itertools.islice(settings[key], offset, offset + count) ]
+        return (self.get_sequence(zone), len(settings[key]), entries)
+
+    def get_changes(self, zone, sequence):
+        """
+        :return: tuple of current sequence number, flag if the changes are
+                 complete and list of (key, entry, added) changes after
+                 sequence. If the changes are not complete, the requested
+                 sequence is older than the change log and the settings
+                 need to be fetched again.
+        """
+        obj = self.get_zone(zone)
+        if sequence < obj.changes_base:
+            return (obj.sequence, False, [ ])
+        changes = [ (key, entry, added) for (seq, key, entry, added) in \
+                    obj.changes if seq > sequence ]
+        return (obj.sequence, True, changes)
+
+    # runtime state for export_ruleset and import_ruleset
+
+    def export_runtime_state(self):
+        """
+        :return: dict with the chains, applied flag and settings of the zones
+                 that can be converted to JSON. The settings are lists of
+                 entry ids and records, entry ids are lists instead of tuples.
+        """
+        state = { }
+        for zone in self.get_zones():
+            obj = self._zones[zone]
+            settings = { }
+            for key in obj.settings:
+                settings[key] = [ ]
+                for (entry_id, record) in obj.settings[key].items():
+                    if isinstance(entry_id, tuple):
+                        entry_id = list(entry_id)
+                    settings[key].append([ entry_id, dict(record.items()) ])
+            chains = self._chains.get(zone, { })
+            state[zone] = { "applied": obj.applied,
+                            "chains": dict((table, list(chains[table]))
+                                           for table in chains),
+                            "settings": settings }
+        return state
+
+    def check_runtime_state(self, state):
+        """
+        Convert a state returned by export_runtime_state back to chains,
+        applied flags and settings records.
+
+        :return: dict with (applied, chains, settings) per zone
+        """
+        ret = { }
+        try:
+            for zone in state:
+                if zone not in self._zones:
+                    raise FirewallError(INVALID_ZONE, zone)
+                chains = { }
+                for table in state[zone]["chains"]:
+                    if table not in OUR_CHAINS:
+                        raise FirewallError(INVALID_VALUE,
+                                            "invalid table '%s'" % table)
+                    for chain in state[zone]["chains"][table]:
+                        if chain not in SHORTCUTS:
+                            raise FirewallError(INVALID_VALUE,
+                                                "invalid chain '%s'" % chain)
+                    chains[table] = list(state[zone]["chains"][table])
+                settings = { }
+                for key in state[zone]["settings"]:
+                    if key not in self._zones[zone].settings:
+                        raise FirewallError(INVALID_SETTING, key)
+                    settings[key] = { }
+                    for (entry_id, _record) in state[zone]["settings"][key]:
+                        if isinstance(entry_id, list):
+                            entry_id = tuple(entry_id)
+                        record = self.__gen_settings(_record["timeout"],
+                                                     _record["sender"],
+                                                     _record.get("mark"))
+                        record["date"] = _record["date"]
+                        if "__default__" in _record:
+                            record["__default__"] = _record["__default__"]
+                        settings[key][entry_id] = record
+                ret[zone] = (bool(state[zone]["applied"]), chains, settings)
+        except (KeyError, TypeError, ValueError, AttributeError) as msg:
+            raise FirewallError(INVALID_VALUE,
+                                "invalid zone state: %s" % msg)
+        return ret
+
+    def set_runtime_state(self, state):
+        """
+        Set the chains, applied flags and settings of all zones from a state
+        returned by check_runtime_state. No rules are changed, the rules
+        need to be in place already. Zones missing in state are emptied.
+        Changed entries are recorded in the change logs of the zones.
+        """
+        self._chains.clear()
+        for zone in self.get_zones():
+            obj = self._zones[zone]
+            (applied, chains, settings) = state.get(zone, (False, { }, { }))
+            for key in obj.settings:
+                _settings = settings.get(key, { })
+                for entry_id in [ x for x in obj.settings[key]
+                                  if x not in _settings ]:
+                    self.__remove_setting(obj, key, entry_id)
+                for (entry_id, record) in _settings.items():
+                    if entry_id in obj.settings[key]:
+                        obj.settings[key][entry_id] = record
+                    else:
+                        self.__add_setting(obj, key, entry_id, record)
+            obj.applied = applied
+            for table in chains:
+                for chain in chains[table]:
+                    self.__our_chains(table, DEFAULT_ZONE_TARGET.format(
+                        chain=SHORTCUTS[chain], zone=zone))
+                    self._chains.setdefault(zone, { }).setdefault(
+                        table, [ ]).append(chain)
+
     def set_settings(self, zone, settings):
         _obj = self.get_zone(zone)
 
@@ -518,8 +821,8 @@ class FirewallZone(object):
         log.debug1("Setting zone of interface '%s' to '%s'" % (interface, _zone))
         self.__interface(True, _zone, interface)
 
-        _obj.settings["interfaces"][interface_id] = \
-            self.__gen_settings(0, sender)
+        self.__add_setting(_obj, "interfaces", interface_id,
+                           self.__gen_settings(0, sender))
         # add information whether we add to default or specific zone
         _obj.settings["interfaces"][interface_id]["__default__"] = (not zone or zone == "")
 
@@ -563,8 +866,7 @@ class FirewallZone(object):
         if _obj.applied:
             self.__interface(False, _zone, interface)
 
-        if interface_id in _obj.settings["interfaces"]:
-            del _obj.settings["interfaces"][interface_id]
+        self.__remove_setting(_obj, "interfaces", interface_id)
 
 #        self.unapply_zone_settings_if_unused(_zone)
         return _zone
@@ -642,8 +944,8 @@ class FirewallZone(object):
 
         self.__source(True, _zone, source_id[0], source_id[1])
 
-        _obj.settings["sources"][source_id] = \
-            self.__gen_settings(0, sender)
+        self.__add_setting(_obj, "sources", source_id,
+                           self.__gen_settings(0, sender))
         # add information whether we add to default or specific zone
         _obj.settings["sources"][source_id]["__default__"] = (not zone or zone == "")
 
@@ -679,8 +981,7 @@ class FirewallZone(object):
         if _obj.applied:
             self.__source(False, _zone, source_id[0], source_id[1])
 
-        if source_id in _obj.settings["sources"]:
-            del _obj.settings["sources"][source_id]
+        self.__remove_setting(_obj, "sources", source_id)
 
 #        self.unapply_zone_settings_if_unused(_zone)
         return _zone
@@ -866,7 +1167,7 @@ class FirewallZone(object):
             # MASQUERADE
             elif type(rule.element) == Rich_Masquerade:
                 if enable:
-                    enable_ip_forwarding(ipv)
+                    self._fw.enable_ip_forwarding(ipv)
 
                 chains.append([ "nat", "POSTROUTING" ])
                 chains.append([ "filter", "FORWARD_OUT" ])
@@ -894,7 +1195,7 @@ class FirewallZone(object):
             # FORWARD PORT
             elif type(rule.element) == Rich_ForwardPort:
                 if enable:
-                    enable_ip_forwarding(ipv)
+                    self._fw.enable_ip_forwarding(ipv)
 
                 port = rule.element.port
                 protocol = rule.element.protocol
@@ -1041,8 +1342,8 @@ class FirewallZone(object):
         else:
             mark = None
 
-        _obj.settings["rules"][rule_id] = \
-            self.__gen_settings(timeout, sender, mark=mark)
+        self.__add_setting(_obj, "rules", rule_id,
+                           self.__gen_settings(timeout, sender, mark=mark))
 
         return _zone
 
@@ -1063,8 +1364,7 @@ class FirewallZone(object):
         if _obj.applied:
             self.__rule(False, _zone, rule, mark)
 
-        if rule_id in _obj.settings["rules"]:
-            del _obj.settings["rules"][rule_id]
+        self.__remove_setting(_obj, "rules", rule_id)
 
         return _zone
 
@@ -1154,8 +1454,8 @@ class FirewallZone(object):
         if _obj.applied:
             self.__service(True, _zone, service)
 
-        _obj.settings["services"][service_id] = \
-            self.__gen_settings(timeout, sender)
+        self.__add_setting(_obj, "services", service_id,
+                           self.__gen_settings(timeout, sender))
 
         return _zone
 
@@ -1172,8 +1472,7 @@ class FirewallZone(object):
         if _obj.applied:
             self.__service(False, _zone, service)
 
-        if service_id in _obj.settings["services"]:
-            del _obj.settings["services"][service_id]
+        self.__remove_setting(_obj, "services", service_id)
 
         return _zone
 
@@ -1232,8 +1531,8 @@ class FirewallZone(object):
         if _obj.applied:
             self.__port(True, _zone, port, protocol)
 
-        _obj.settings["ports"][port_id] = \
-            self.__gen_settings(timeout, sender)
+        self.__add_setting(_obj, "ports", port_id,
+                           self.__gen_settings(timeout, sender))
 
         return _zone
 
@@ -1250,8 +1549,7 @@ class FirewallZone(object):
         if _obj.applied:
             self.__port(False, _zone, port, protocol)
 
-        if port_id in _obj.settings["ports"]:
-            del _obj.settings["ports"][port_id]
+        self.__remove_setting(_obj, "ports", port_id)
 
         return _zone
 
@@ -1308,8 +1606,8 @@ class FirewallZone(object):
         if _obj.applied:
             self.__protocol(True, _zone, protocol)
 
-        _obj.settings["protocols"][protocol_id] = \
-            self.__gen_settings(timeout, sender)
+        self.__add_setting(_obj, "protocols", protocol_id,
+                           self.__gen_settings(timeout, sender))
 
         return _zone
 
@@ -1326,8 +1624,7 @@ class FirewallZone(object):
         if _obj.applied:
             self.__protocol(False, _zone, protocol)
 
-        if protocol_id in _obj.settings["protocols"]:
-            del _obj.settings["protocols"][protocol_id]
+        self.__remove_setting(_obj, "protocols", protocol_id)
 
         return _zone
 
@@ -1346,7 +1643,7 @@ class FirewallZone(object):
         if enable:
             self.add_chain(zone, "nat", "POSTROUTING")
             self.add_chain(zone, "filter", "FORWARD_OUT")
-            enable_ip_forwarding("ipv4")
+            self._fw.enable_ip_forwarding("ipv4")
 
         rules = [ ]
         for ipv in [ "ipv4" ]: # IPv4 only!
@@ -1385,8 +1682,8 @@ class FirewallZone(object):
         if _obj.applied:
             self.__masquerade(True, _zone)
 
-        _obj.settings["masquerade"][masquerade_id] = \
-            self.__gen_settings(timeout, sender)
+        self.__add_setting(_obj, "masquerade", masquerade_id,
+                           self.__gen_settings(timeout, sender))
 
         return _zone
 
@@ -1403,8 +1700,7 @@ class FirewallZone(object):
         if _obj.applied:
             self.__masquerade(False, _zone)
 
-        if masquerade_id in _obj.settings["masquerade"]:
-            del _obj.settings["masquerade"][masquerade_id]
+        self.__remove_setting(_obj, "masquerade", masquerade_id)
 
         return _zone
 
@@ -1450,7 +1746,7 @@ class FirewallZone(object):
             self.add_chain(zone, "mangle", "PREROUTING")
             self.add_chain(zone, "nat", "PREROUTING")
             self.add_chain(zone, "filter", filter_chain)
-            enable_ip_forwarding("ipv4")
+            self._fw.enable_ip_forwarding("ipv4")
 
         rules = [ ]
         for ipv in [ "ipv4" ]: # IPv4 only!
@@ -1505,8 +1801,8 @@ class FirewallZone(object):
             self.__forward_port(True, _zone, port, protocol, toport, toaddr,
                                 mark_id=mark)
 
-        _obj.settings["forward_ports"][forward_id] = \
-            self.__gen_settings(timeout, sender, mark=mark)
+        self.__add_setting(_obj, "forward_ports", forward_id,
+                           self.__gen_settings(timeout, sender, mark=mark))
 
         return _zone
 
@@ -1528,8 +1824,7 @@ class FirewallZone(object):
             self.__forward_port(False, _zone, port, protocol, toport, toaddr,
                                 mark_id=mark)
 
-        if forward_id in _obj.settings["forward_ports"]:
-            del _obj.settings["forward_ports"][forward_id]
+        self.__remove_setting(_obj, "forward_ports", forward_id)
         self._fw.del_mark(mark)
 
         return _zone
@@ -1606,8 +1901,8 @@ class FirewallZone(object):
         if _obj.applied:
             self.__icmp_block(True, _zone, icmp)
 
-        _obj.settings["icmp_blocks"][icmp_id] = \
-            self.__gen_settings(timeout, sender)
+        self.__add_setting(_obj, "icmp_blocks", icmp_id,
+                           self.__gen_settings(timeout, sender))
 
         return _zone
 
@@ -1624,8 +1919,7 @@ class FirewallZone(object):
         if _obj.applied:
             self.__icmp_block(False, _zone, icmp)
 
-        if icmp_id in _obj.settings["icmp_blocks"]:
-            del _obj.settings["icmp_blocks"][icmp_id]
+        self.__remove_setting(_obj, "icmp_blocks", icmp_id)
 
         return _zone
 
@@ -1634,3 +1928,262 @@ class FirewallZone(object):
 
     def list_icmp_blocks(self, zone):
         return sorted(self.get_settings(zone)["icmp_blocks"].keys())
+
+    # BULK CHANGES
+
+    # settings key of the items supported in bulk changes
+    BULK_ITEMS = { "service": "services", "port": "ports",
+                   "protocol": "protocols", "rule": "rules",
+                   "interface": "interfaces", "source": "sources" }
+
+    def check_operation(self, action, zone, item, value, timeout=0):
+        """Check a bulk operation and return it in the form
+        (action, zone, item, args, entry_id, timeout), where args are the
+        item arguments for the add_ and remove_ functions.
+        Ports are given as port/protocol, rules as rich rule strings.
+        """
+        if action not in [ "add", "remove" ]:
+            raise FirewallError(INVALID_VALUE,
+                                "'%s' not in {'add'|'remove'}" % action)
+        if item not in self.BULK_ITEMS:
+            raise FirewallError(INVALID_VALUE,
+                                "'%s' not in {%s}" % \
+                                (item, "|".join(sorted(self.BULK_ITEMS))))
+        self._fw.check_zone(zone)
+        self._fw.check_timeout(timeout)
+        if timeout > 0 and (action == "remove" or item in [ "interface",
+                                                            "source" ]):
+            raise FirewallError(INVALID_VALUE,
+                                "timeout not supported for %s %s" % \
+                                (action, item))
+
+        if item == "service":
+            args = (value, )
+            entry_id = self.__service_id(value)
+        elif item == "port":
+            (port, _, protocol) = value.partition("/")
+            args = (port, protocol)
+            entry_id = self.__port_id(port, protocol)
+        elif item == "protocol":
+            args = (value, )
+            entry_id = self.__protocol_id(value)
+        elif item == "rule":
+            rule = Rich_Rule(rule_str=value)
+            args = (rule, )
+            entry_id = self.__rule_id(rule)
+        elif item == "interface":
+            args = (value, )
+            entry_id = self.__interface_id(value)
+        elif item == "source":
+            args = (value, )
+            entry_id = self.__source_id(value)
+
+        return (action, zone, item, args, entry_id, timeout)
+
+    def __simulate_operation(self, operation, state):
+        # Check operation against the runtime settings and the effect of the
+        # already checked operations in state.
+        (action, zone, item, args, entry_id, timeout) = operation
+        _zone = self._fw.check_zone(zone)
+
+        if item in [ "interface", "source" ]:
+            # state maps entry to the zone it is bound to
+            key = (item, entry_id)
+            if key in state:
+                bound = state[key]
+            elif item == "interface":
+                bound = self.get_zone_of_interface(args[0])
+            else:
+                bound = self.get_zone_of_source(args[0])
+            if action == "add":
+                if bound == _zone:
+                    raise FirewallError(ZONE_ALREADY_SET,
+                                        "'%s' already bound to '%s'" % \
+                                        (args[0], _zone))
+                if bound is not None:
+                    raise FirewallError(ZONE_CONFLICT,
+                                        "'%s' already bound to a zone" % \
+                                        args[0])
+                state[key] = _zone
+            else:
+                if bound is None:
+                    error = UNKNOWN_INTERFACE if item == "interface" \
+                            else UNKNOWN_SOURCE
+                    raise FirewallError(error,
+                                        "'%s' is not in any zone" % args[0])
+                if zone != "" and bound != _zone:
+                    raise FirewallError(ZONE_CONFLICT,
+                                        "'%s' bound to '%s'" % \
+                                        (args[0], bound))
+                state[key] = None
+            return
+
+        key = (_zone, item, entry_id)
+        if key in state:
+            enabled = state[key]
+        else:
+            enabled = entry_id in self._zones[_zone].settings[
+                self.BULK_ITEMS[item]]
+        if action == "add" and enabled:
+            raise FirewallError(ALREADY_ENABLED,
+                                "'%s' already in '%s'" % (entry_id, _zone))
+        if action == "remove" and not enabled:
+            raise FirewallError(NOT_ENABLED,
+                                "'%s' not in '%s'" % (entry_id, _zone))
+        state[key] = (action == "add")
+
+    def __apply_operation(self, action, zone, item, args, timeout=0,
+                          sender=None):
+        # returns the zone the operation has been applied to
+        if item in [ "interface", "source" ]:
+            if action == "add":
+                return getattr(self, "add_%s" % item)(zone, args[0], sender)
+            return getattr(self, "remove_%s" % item)(zone, args[0])
+        if action == "add":
+            return getattr(self, "add_%s" % item)(zone, *args,
+                                                  timeout=timeout,
+                                                  sender=sender)
+        return getattr(self, "remove_%s" % item)(zone, *args)
+
+    def apply_operations(self, operations, sender=None, senders=None,
+                         independent=False):
+        """Apply list of operations (action, zone, item, value, timeout)
+        as one transaction. All operations are checked first, nothing is
+        applied if one of them is not valid. The ipv4 and ipv6 rules of all
+        operations are applied with one restore call per table. If this
+        fails, the operations are applied one by one and the already applied
+        operations are reverted if one of them fails.
+        senders is an optional list with the sender of each operation.
+        With independent, every operation succeeds or fails on its own,
+        invalid or failing operations are skipped.
+
+        :return: tuple (success, results) with results being a list of
+                 (True, zone) or (False, error message) per operation
+        """
+        self._fw.check_panic()
+
+        checked = [ ]
+        results = [ ]
+        state = { }
+        for (i, operation) in enumerate(operations):
+            try:
+                _operation = self.check_operation(*operation)
+                self.__simulate_operation(_operation, state)
+            except FirewallError as error:
+                results.append((False, str(error)))
+            else:
+                checked.append((i, _operation))
+                results.append((True, ""))
+        if len(checked) != len(operations) and not independent:
+            return (False, [ (False, "NOT_APPLIED") if success else
+                             (success, msg) for (success, msg) in results ])
+        if senders is None:
+            senders = [ sender ] * len(operations)
+
+        # apply the operations with one batch of rules
+        chains = copy.deepcopy(self._chains)
+        done = [ ]
+        failed = None
+        self._fw.begin_rules_batch()
+        try:
+            for (i, operation) in checked:
+                (_zone, record) = self.__apply_checked_operation(operation,
+                                                                 senders[i])
+                (action, zone, item, args, entry_id, timeout) = operation
+                done.append((action, _zone, item, args, entry_id, record))
+                results[i] = (True, _zone)
+        except FirewallError as error:
+            failed = error
+        finally:
+            batch = self._fw.end_rules_batch()
+        if failed is None:
+            try:
+                self._fw.apply_rules_batch(batch)
+            except FirewallError as error:
+                failed = error
+            else:
+                return (len(checked) == len(operations), results)
+
+        log.debug1("Applying %d operations at once failed: %s" % \
+                   (len(checked), failed))
+        # revert the state of the applied operations, the rules of the batch
+        # have not been applied
+        self._fw.begin_rules_batch()
+        try:
+            self.__revert_operations(done)
+        finally:
+            self._fw.end_rules_batch()
+        self._chains.clear()
+        self._chains.update(chains)
+
+        # apply the operations one by one
+        done = [ ]
+        for (i, operation) in checked:
+            try:
+                (_zone, record) = self.__apply_checked_operation(operation,
+                                                                 senders[i])
+            except FirewallError as error:
+                if independent:
+                    results[i] = (False, str(error))
+                    continue
+                log.debug1("Bulk change failed, reverting %d operations" % \
+                           len(done))
+                self.__revert_operations(done)
+                results = [ (False, "NOT_APPLIED") ] * len(operations)
+                results[i] = (False, str(error))
+                return (False, results)
+            (action, zone, item, args, entry_id, timeout) = operation
+            done.append((action, _zone, item, args, entry_id, record))
+            results[i] = (True, _zone)
+
+        success = all([ x[0] for x in results ])
+        return (success, results)
+
+    def __apply_checked_operation(self, operation, sender):
+        # returns the zone the operation has been applied to and the record
+        # of the removed entry for a rollback
+        (action, zone, item, args, entry_id, timeout) = operation
+        record = None
+        if action == "remove":
+            if zone == "" and item == "interface":
+                _zone = self.get_zone_of_interface(args[0])
+            elif zone == "" and item == "source":
+                _zone = self.get_zone_of_source(args[0])
+            else:
+                _zone = self._fw.check_zone(zone)
+            record = self._zones[_zone].settings[
+                self.BULK_ITEMS[item]].get(entry_id)
+        _zone = self.__apply_operation(action, zone, item, args, timeout,
+                                       sender)
+        return (_zone, record)
+
+    def __revert_operations(self, done):
+        for (action, zone, item, args, entry_id, record) in reversed(done):
+            if action == "add":
+                _action = "remove"
+                timeout = 0
+                sender = None
+            else:
+                _action = "add"
+                timeout = record.timeout if record is not None else 0
+                sender = record.sender if record is not None else None
+                if item in [ "interface", "source" ] and \
+                   record is not None and record.default:
+                    # entry has been bound to the default zone
+                    zone = ""
+                    timeout = 0
+            try:
+                _zone = self.__apply_operation(_action, zone, item, args,
+                                               timeout, sender)
+            except FirewallError as error:
+                log.error("Failed to revert %s of %s %s in zone '%s': %s" % \
+                          (action, item, args[0], zone, error))
+                continue
+            if record is not None:
+                # Put back the record of the removed entry with its date,
+                # timeout and sender, the timer of the entry in the server
+                # is still running. The mark is the one of the new rules.
+                settings = self._zones[_zone].settings[self.BULK_ITEMS[item]]
+                if entry_id in settings:
+                    record.mark = settings[entry_id].mark
+                    settings[entry_id] = record
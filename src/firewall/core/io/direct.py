@@ -23,6 +23,7 @@ import xml.sax as sax
 import os
 import io
 import shutil
+import tempfile
 
 from firewall.fw_types import *
 from firewall.functions import splitArgs, joinArgs, u2b_if_py2
@@ -135,6 +136,7 @@ class Direct(IO_Object):
         self.chains = LastUpdatedOrderedDict()
         self.rules = LastUpdatedOrderedDict()
         self.passthroughs = LastUpdatedOrderedDict()
+        self._listener = None
 
     def _check_config(self, config, item):
         pass
@@ -217,6 +219,8 @@ class Direct(IO_Object):
             self.chains[key] = [ ]
         if chain not in self.chains[key]:
             self.chains[key].append(chain)
+            if self._listener is not None:
+                self._listener.add_chain(ipv, table, chain)
         else:
             log.warning("Chain '%s' for table '%s' with ipv '%s' " % \
                             (chain, table, ipv)
@@ -261,6 +265,8 @@ class Direct(IO_Object):
         value = (priority, tuple(args))
         if value not in self.rules[key]:
             self.rules[key][value] = priority
+            if self._listener is not None:
+                self._listener.add_rule(ipv, table, chain, priority, value[1])
         else:
             log.warning("Rule '%s' for table '%s' and chain '%s' " % \
                             ("',".join(args), table, chain)
@@ -312,9 +318,12 @@ class Direct(IO_Object):
     def add_passthrough(self, ipv, args):
         self._check_ipv(ipv)
         if ipv not in self.passthroughs:
-            self.passthroughs[ipv] = [ ]
-        if args not in self.passthroughs[ipv]:
-            self.passthroughs[ipv].append(args)
+            self.passthroughs[ipv] = LastUpdatedOrderedDict()
+        value = tuple(args)
+        if value not in self.passthroughs[ipv]:
+            self.passthroughs[ipv][value] = True
+            if self._listener is not None:
+                self._listener.add_passthrough(ipv, list(value))
         else:
             log.warning("Passthrough '%s' for ipv '%s'" % \
                             ("',".join(args), ipv)
@@ -322,8 +331,9 @@ class Direct(IO_Object):
 
     def remove_passthrough(self, ipv, args):
         self._check_ipv(ipv)
-        if ipv in self.passthroughs and args in self.passthroughs[ipv]:
-            self.passthroughs[ipv].remove(args)
+        value = tuple(args)
+        if ipv in self.passthroughs and value in self.passthroughs[ipv]:
+            del self.passthroughs[ipv][value]
             if len(self.passthroughs[ipv]) == 0:
                 del self.passthroughs[ipv]
         else:
@@ -332,12 +342,13 @@ class Direct(IO_Object):
 
     def query_passthrough(self, ipv, args):
         self._check_ipv(ipv)
-        return (ipv in self.passthroughs and args in self.passthroughs[ipv])
+        return (ipv in self.passthroughs and \
+                tuple(args) in self.passthroughs[ipv])
 
     def get_passthroughs(self, ipv):
         self._check_ipv(ipv)
         if ipv in self.passthroughs:
-            return self.passthroughs[ipv]
+            return [ list(args) for args in self.passthroughs[ipv] ]
         else:
             raise ValueError("No passthroughs for ipv '%s'" % (ipv))
 
@@ -346,7 +357,14 @@ class Direct(IO_Object):
 
     # read
 
-    def read(self):
+    def read(self, listener=None):
+        """Read the direct configuration file
+
+        If listener is given, every chain, rule and passthrough that is
+        added to this object while parsing is also passed to the add_chain,
+        add_rule and add_passthrough methods of listener, so that it can be
+        processed without walking the complete configuration again.
+        """
         self.cleanup()
         if not self.filename.endswith(".xml"):
             raise FirewallError(INVALID_NAME,
@@ -354,65 +372,162 @@ class Direct(IO_Object):
         handler = direct_ContentHandler(self)
         parser = sax.make_parser()
         parser.setContentHandler(handler)
-        with open(self.filename, "r") as f:
-            parser.parse(f)
+        self._listener = listener
+        try:
+            with open(self.filename, "r") as f:
+                parser.parse(f)
+        finally:
+            self._listener = None
+
+    # write
+
+    def _write_chain(self, handler, ipv, table, chain):
+        handler.ignorableWhitespace("  ")
+        handler.simpleElement("chain", { "ipv": ipv, "table": table,
+                                         "chain": chain })
+        handler.ignorableWhitespace("\n")
 
+    def _write_rule(self, handler, ipv, table, chain, priority, args):
+        if len(args) < 1:
+            return
+        handler.ignorableWhitespace("  ")
+        handler.startElement("rule", { "ipv": ipv, "table": table,
+                                       "chain": chain,
+                                       "priority": "%d" % priority })
+        handler.ignorableWhitespace(sax.saxutils.escape(joinArgs(args)))
+        handler.endElement("rule")
+        handler.ignorableWhitespace("\n")
 
-    def write(self):
-        if os.path.exists(self.filename):
-            try:
-                shutil.copy2(self.filename, "%s.old" % self.filename)
-            except Exception as msg:
-                raise IOError("Backup of '%s' failed: %s" % (self.filename, msg))
+    def _write_passthrough(self, handler, ipv, args):
+        if len(args) < 1:
+            return
+        handler.ignorableWhitespace("  ")
+        handler.startElement("passthrough", { "ipv": ipv })
+        handler.ignorableWhitespace(sax.saxutils.escape(joinArgs(args)))
+        handler.endElement("passthrough")
+        handler.ignorableWhitespace("\n")
 
+    def write(self):
+        # The file is written chain by chain to a temporary file in the
+        # same directory, which replaces the old file when it is complete.
+        # The old file is kept as backup.
         if not os.path.exists(ETC_FIREWALLD):
             os.mkdir(ETC_FIREWALLD, 0o750)
 
-        f = io.open(self.filename, mode='wt', encoding='UTF-8')
-        handler = IO_Object_XMLGenerator(f)
-        handler.startDocument()
-
-        # start whitelist element
-        handler.startElement("direct", { })
-        handler.ignorableWhitespace("\n")
-
-        # chains
-        for key in self.chains:
-            (ipv, table) = key
-            for chain in self.chains[key]:
-                handler.ignorableWhitespace("  ")
-                handler.simpleElement("chain", { "ipv": ipv, "table": table,
-                                                 "chain": chain })
-                handler.ignorableWhitespace("\n")
+        (fd, tmpname) = tempfile.mkstemp(
+            prefix="%s." % os.path.basename(self.filename),
+            dir=os.path.dirname(self.filename))
+        try:
+            if os.path.exists(self.filename):
+                os.chmod(tmpname, os.stat(self.filename).st_mode & 0o7777)
+            else:
+                os.chmod(tmpname, 0o644)
+            with io.open(fd, mode='wt', encoding='UTF-8') as f:
+                handler = IO_Object_XMLGenerator(f)
+                handler.startDocument()
 
-        # rules
-        for key in self.rules:
-            (ipv, table, chain) = key
-            for (priority, args) in self.rules[key]:
-                if len(args) < 1:
-                    continue
-                handler.ignorableWhitespace("  ")
-                handler.startElement("rule", { "ipv": ipv, "table": table,
-                                                 "chain": chain,
-                                                 "priority": "%d" % priority })
-                handler.ignorableWhitespace(sax.saxutils.escape(joinArgs(args)))
-                handler.endElement("rule")
+                # start whitelist element
+                handler.startElement("direct", { })
                 handler.ignorableWhitespace("\n")
 
-        # passthroughs
-        for ipv in self.passthroughs:
-            for args in self.passthroughs[ipv]:
-                if len(args) < 1:
-                    continue
-                handler.ignorableWhitespace("  ")
-                handler.startElement("passthrough", { "ipv": ipv })
-                handler.ignorableWhitespace(sax.saxutils.escape(joinArgs(args)))
-                handler.endElement("passthrough")
+                # chains
+                for key in self.chains:
+                    (ipv, table) = key
+                    for chain in self.chains[key]:
+                        self._write_chain(handler, ipv, table, chain)
+
+                # rules
+                for key in self.rules:
+                    (ipv, table, chain) = key
+                    for (priority, args) in self.rules[key]:
+                        self._write_rule(handler, ipv, table, chain, priority,
+                                         args)
+
+                # passthroughs
+                for ipv in self.passthroughs:
+                    for args in self.passthroughs[ipv]:
+                        self._write_passthrough(handler, ipv, args)
+
+                # end zone element
+                handler.endElement("direct")
                 handler.ignorableWhitespace("\n")
+                handler.endDocument()
+                del handler
+        except Exception:
+            os.unlink(tmpname)
+            raise
 
-        # end zone element
-        handler.endElement("direct")
-        handler.ignorableWhitespace("\n")
-        handler.endDocument()
-        f.close()
+        if os.path.exists(self.filename):
+            backup = "%s.old" % self.filename
+            try:
+                if os.path.exists(backup):
+                    os.unlink(backup)
+                os.link(self.filename, backup)
+            except Exception:
+                try:
+                    shutil.copy2(self.filename, backup)
+                except Exception as msg:
+                    os.unlink(tmpname)
+                    raise IOError("Backup of '%s' failed: %s" % \
+                                  (self.filename, msg))
+        os.rename(tmpname, self.filename)
+
+    def append(self, chains=(), rules=(), passthroughs=()):
+        """Append new entries to the end of the direct configuration file
+
+        The entries need to be added to this object already. chains, rules
+        and passthroughs are lists in the format of export_config. Only
+        the new entries are written, the file is not rewritten and no
+        backup is created. If the file does not exist or does not end with
+        the closing direct tag, the complete file is written with write.
+        If appending fails, the closing direct tag is put back and the
+        complete file is written with write.
+        """
+        tail = b"</direct>\n"
+
+        # create the new entries first, the file is only changed with a
+        # single write call
+        out = io.StringIO()
+        handler = IO_Object_XMLGenerator(out)
+        for (ipv, table, chain) in chains:
+            self._write_chain(handler, ipv, table, chain)
+        for (ipv, table, chain, priority, args) in rules:
+            self._write_rule(handler, ipv, table, chain, priority, args)
+        for (ipv, args) in passthroughs:
+            self._write_passthrough(handler, ipv, args)
         del handler
+        data = out.getvalue().encode('UTF-8') + tail
+
+        try:
+            f = io.open(self.filename, mode='rb+')
+        except IOError:
+            self.write()
+            return
+        appended = False
+        try:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size >= len(tail):
+                f.seek(-len(tail), os.SEEK_END)
+                if f.read() == tail:
+                    f.seek(-len(tail), os.SEEK_END)
+                    try:
+                        f.write(data)
+                        f.flush()
+                        appended = True
+                    except Exception:
+                        # put back the closing direct tag
+                        f.seek(size - len(tail))
+                        f.write(tail)
+                        f.truncate(size)
+                        f.flush()
+                        raise
+        except Exception as msg:
+            log.error("Failed to append to '%s': %s", self.filename, msg)
+        finally:
+            try:
+                f.close()
+            except Exception:
+                appended = False
+        if not appended:
+            self.write()
@@ -31,7 +31,7 @@ from firewall.core.logger import log
 from firewall.functions import b2u, u2b, PY2
 
 valid_keys = [ "DefaultZone", "MinimalMark", "CleanupOnExit", "Lockdown", 
-               "IPv6_rpfilter" ]
+               "IPv6_rpfilter", "IndividualSignals" ]
 
 class firewalld_conf(object):
     def __init__(self, filename):
@@ -77,6 +77,7 @@ class firewalld_conf(object):
             self.set("CleanupOnExit", "yes" if FALLBACK_CLEANUP_ON_EXIT else "no")
             self.set("Lockdown", "yes" if FALLBACK_LOCKDOWN else "no")
             self.set("IPv6_rpfilter","yes" if FALLBACK_IPV6_RPFILTER else "no")
+            self.set("IndividualSignals", "yes")
             raise
 
         for line in f:
@@ -141,6 +142,12 @@ class firewalld_conf(object):
                       FALLBACK_IPV6_RPFILTER)
             self.set("IPv6_rpfilter","yes" if FALLBACK_IPV6_RPFILTER else "no")
 
+        # check individual signals
+        value = self.get("IndividualSignals")
+        if not value or value.lower() not in [ "yes", "true", "no", "false" ]:
+            log.error("IndividualSignals '%s' is not valid, using default "
+                      "value yes", value if value else '')
+            self.set("IndividualSignals", "yes")
 
     # save to self.filename if there are key/value changes
     def write(self):
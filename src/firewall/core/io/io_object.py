@@ -51,7 +51,9 @@ class IO_Object(object):
         return tuple(ret)
 
     def import_config(self, config):
-        self.check_config(config)
+        # only validate what differs from the current settings
+        current = [ getattr(self, x[0]) for x in self.IMPORT_EXPORT_STRUCTURE ]
+        self.check_config(config, current)
         for i,(element,value) in enumerate(self.IMPORT_EXPORT_STRUCTURE):
             if isinstance(config[i], list):
                 # remove duplicates
@@ -71,49 +73,37 @@ class IO_Object(object):
                 raise FirewallError(INVALID_NAME,
                                  "'%s' is not allowed in '%s'" % ((char, name)))
 
-    def check_config(self, config):
+    @classmethod
+    def _get_validators(cls):
+        # compile the structure checks once per class
+        if "_validators" not in cls.__dict__:
+            cls._validators = tuple([ _compile_structure(value) for \
+                                      (element, value) in \
+                                      cls.IMPORT_EXPORT_STRUCTURE ])
+        return cls._validators
+
+    def check_config(self, config, current=None):
         if len(config) != len(self.IMPORT_EXPORT_STRUCTURE):
             raise FirewallError(INVALID_TYPE,
                                 "structure size mismatch %d != %d" % (\
                     len(config), len(self.IMPORT_EXPORT_STRUCTURE)))
+        validators = self._get_validators()
         for i,(element,value) in enumerate(self.IMPORT_EXPORT_STRUCTURE):
-            self._check_config_structure(config[i], value)
-            self._check_config(config[i], element)
+            if current is None:
+                _config = config[i]
+            else:
+                _config = _config_changes(config[i], current[i])
+                if _config is None:
+                    continue
+            validators[i](_config)
+            self._check_config(_config, element)
 
     def _check_config(self, config, item):
         # to be overloaded by sub classes
         return
 
     def _check_config_structure(self, config, structure):
-        if not type(config) == type(structure):
-            raise FirewallError(INVALID_TYPE,
-                                "'%s' not of type %s, but %s" % (\
-                    config, type(structure), type(config)))
-        if type(structure) == list:
-            # same type elements, else struct
-            if len(structure) != 1:
-                raise FirewallError(INVALID_TYPE, "len('%s') != 1" % structure)
-            for x in config:
-                self._check_config_structure(x, structure[0])
-        elif type(structure) == tuple:
-            if len(structure) != len(config):
-                raise FirewallError(INVALID_TYPE,
-                                    "len('%s') != %d" % (config,
-                                                         len(structure)))
-            for i,value in enumerate(structure):
-                self._check_config_structure(config[i], value)
-        elif type(structure) == dict:
-            # only one key value pair in structure
-            (skey, svalue) = list(structure.items())[0]
-            for (key, value) in config.items():
-                if type(key) != type(skey):
-                    raise FirewallError(INVALID_TYPE,
-                                        "'%s' not of type %s, but %s" % (\
-                            key, type(skey), type(key)))
-                if type(value) != type(svalue):
-                    raise FirewallError(INVALID_TYPE,
-                                        "'%s' not of type %s, but %s" % (\
-                            value, type(svalue), type(value)))
+        _compile_structure(structure)(config)
 
     # check required elements and attributes and also optional attributes
     def parser_check_element_attrs(self, name, attrs):
@@ -142,6 +132,89 @@ class IO_Object(object):
             raise FirewallError(PARSE_ERROR, "%s: Unexpected attribute %s" % 
                                 (name, x))
  
+def _type_error(config, structure):
+    return FirewallError(INVALID_TYPE, "'%s' not of type %s, but %s" % \
+                         (config, type(structure), type(config)))
+
+def _compile_structure(structure):
+    """ Create a function checking that a config value matches the given
+        IMPORT_EXPORT_STRUCTURE element """
+    _type = type(structure)
+    if _type == list:
+        if len(structure) != 1:
+            def check(config):
+                if type(config) != _type:
+                    raise _type_error(config, structure)
+                raise FirewallError(INVALID_TYPE, "len('%s') != 1" % structure)
+            return check
+        if type(structure[0]) not in [ list, tuple, dict ]:
+            # same type elements, check type only
+            _element_type = type(structure[0])
+            def check(config):
+                if type(config) != _type:
+                    raise _type_error(config, structure)
+                for x in config:
+                    if type(x) != _element_type:
+                        raise _type_error(x, structure[0])
+            return check
+        _check_element = _compile_structure(structure[0])
+        def check(config):
+            if type(config) != _type:
+                raise _type_error(config, structure)
+            for x in config:
+                _check_element(x)
+        return check
+    elif _type == tuple:
+        _checks = [ _compile_structure(x) for x in structure ]
+        def check(config):
+            if type(config) != _type:
+                raise _type_error(config, structure)
+            if len(structure) != len(config):
+                raise FirewallError(INVALID_TYPE,
+                                    "len('%s') != %d" % (config,
+                                                         len(structure)))
+            for i,_check in enumerate(_checks):
+                _check(config[i])
+        return check
+    elif _type == dict:
+        # only one key value pair in structure
+        (skey, svalue) = list(structure.items())[0]
+        _key_type = type(skey)
+        _value_type = type(svalue)
+        def check(config):
+            if type(config) != _type:
+                raise _type_error(config, structure)
+            for (key, value) in config.items():
+                if type(key) != _key_type:
+                    raise _type_error(key, skey)
+                if type(value) != _value_type:
+                    raise _type_error(value, svalue)
+        return check
+    def check(config):
+        if type(config) != _type:
+            raise _type_error(config, structure)
+    return check
+
+def _config_changes(config, current):
+    """ Return the part of config that needs to be validated against the
+        current (already valid) settings: None if nothing changed, the new
+        elements for lists or else the complete config value """
+    if type(config) != type(current):
+        return config
+    if type(config) == list:
+        try:
+            _current = set([ (type(x), x) for x in current ])
+            changes = [ x for x in config if (type(x), x) not in _current ]
+        except TypeError:
+            # unhashable elements
+            return config
+        if len(changes) < 1:
+            return None
+        return changes
+    if config == current:
+        return None
+    return config
+
 # PARSER
 
 class UnexpectedElementError(Exception):
@@ -80,6 +80,45 @@ class lockdown_whitelist_ContentHandler(IO_Object_ContentHandler):
             log.error('Unknown XML element %s' % name)
             return
 
+class lockdown_whitelist_Matcher(object):
+    """ Compiled form of a lockdown whitelist
+
+        Exact entries are kept in sets, commands ending with "*" are kept
+        in a character trie, so that matching does not depend on the size
+        of the whitelist.
+    """
+
+    # key of a trie node marking the end of a wildcard command prefix
+    END = None
+
+    def __init__(self, whitelist):
+        self.generation = whitelist.generation
+        self.commands = set()
+        self.command_prefixes = { }
+        for command in whitelist.commands:
+            if command.endswith("*"):
+                node = self.command_prefixes
+                for c in command[:-1]:
+                    node = node.setdefault(c, { })
+                node[self.END] = True
+            else:
+                self.commands.add(command)
+        self.contexts = set(whitelist.contexts)
+        self.users = set(whitelist.users)
+        self.uids = set(whitelist.uids)
+
+    def match_command(self, command):
+        if command in self.commands:
+            return True
+        node = self.command_prefixes
+        for c in command:
+            if self.END in node:
+                return True
+            node = node.get(c)
+            if node is None:
+                return False
+        return self.END in node
+
 class LockdownWhitelist(IO_Object):
     """ LockdownWhitelist class """
 
@@ -113,6 +152,9 @@ class LockdownWhitelist(IO_Object):
         self.uids = [ ]
 #        self.gids = [ ]
 #        self.groups = [ ]
+        # incremented with every change
+        self.generation = 0
+        self._matcher = None
 
     def _check_config(self, config, item):
         if item in [ "commands", "contexts", "users", "uids" ]:
@@ -138,6 +180,11 @@ class LockdownWhitelist(IO_Object):
         del self.uids[:]
 #        del self.gids[:]
 #        del self.groups[:]
+        self.generation += 1
+
+    def import_config(self, config):
+        super(LockdownWhitelist, self).import_config(config)
+        self.generation += 1
 
     def encode_strings(self):
         """ HACK. I haven't been able to make sax parser return
@@ -146,6 +193,14 @@ class LockdownWhitelist(IO_Object):
         self.commands = [ u2b_if_py2(x) for x in self.commands ]
         self.contexts = [ u2b_if_py2(x) for x in self.contexts ]
         self.users = [ u2b_if_py2(x) for x in self.users ]
+        self.generation += 1
+
+    def _get_matcher(self):
+        # rebuild compiled matcher if the whitelist has been changed
+        if self._matcher is None or \
+           self._matcher.generation != self.generation:
+            self._matcher = lockdown_whitelist_Matcher(self)
+        return self._matcher
 
     # commands
 
@@ -154,6 +209,7 @@ class LockdownWhitelist(IO_Object):
             raise FirewallError(INVALID_COMMAND, command)
         if command not in self.commands:
             self.commands.append(command)
+            self.generation += 1
         else:
             raise FirewallError(ALREADY_ENABLED,
                                 'Command "%s" already in whitelist' % command)
@@ -161,6 +217,7 @@ class LockdownWhitelist(IO_Object):
     def remove_command(self, command):
         if command in self.commands:
             self.commands.remove(command)
+            self.generation += 1
         else:
             raise FirewallError(NOT_ENABLED,
                                 'Command "%s" not in whitelist.' % command)
@@ -169,14 +226,7 @@ class LockdownWhitelist(IO_Object):
         return (command in self.commands)
 
     def match_command(self, command):
-        for _command in self.commands:
-            if _command.endswith("*"):
-                if command.startswith(_command[:-1]):
-                    return True
-            else:
-                if _command == command:
-                    return True
-        return False
+        return self._get_matcher().match_command(command)
 
     def get_commands(self):
         return sorted(self.commands)
@@ -188,6 +238,7 @@ class LockdownWhitelist(IO_Object):
             raise FirewallError(INVALID_UID, str(uid))
         if uid not in self.uids:
             self.uids.append(uid)
+            self.generation += 1
         else:
             raise FirewallError(ALREADY_ENABLED,
                                 'Uid "%s" already in whitelist' % uid)
@@ -196,6 +247,7 @@ class LockdownWhitelist(IO_Object):
     def remove_uid(self, uid):
         if uid in self.uids:
             self.uids.remove(uid)
+            self.generation += 1
         else:
             raise FirewallError(NOT_ENABLED,
                                 'Uid "%s" not in whitelist.' % uid)
@@ -204,7 +256,7 @@ class LockdownWhitelist(IO_Object):
         return (uid in self.uids)
 
     def match_uid(self, uid):
-        return (uid in self.uids)
+        return (uid in self._get_matcher().uids)
 
     def get_uids(self):
         return sorted(self.uids)
@@ -216,6 +268,7 @@ class LockdownWhitelist(IO_Object):
             raise FirewallError(INVALID_USER, user)
         if user not in self.users:
             self.users.append(user)
+            self.generation += 1
         else:
             raise FirewallError(ALREADY_ENABLED,
                                 'User "%s" already in whitelist' % user)
@@ -224,6 +277,7 @@ class LockdownWhitelist(IO_Object):
     def remove_user(self, user):
         if user in self.users:
             self.users.remove(user)
+            self.generation += 1
         else:
             raise FirewallError(NOT_ENABLED,
                                 'User "%s" not in whitelist.' % user)
@@ -232,7 +286,7 @@ class LockdownWhitelist(IO_Object):
         return (user in self.users)
 
     def match_user(self, user):
-        return (user in self.users)
+        return (user in self._get_matcher().users)
 
     def get_users(self):
         return sorted(self.users)
@@ -288,6 +342,7 @@ class LockdownWhitelist(IO_Object):
             raise FirewallError(INVALID_CONTEXT, context)
         if context not in self.contexts:
             self.contexts.append(context)
+            self.generation += 1
         else:
             raise FirewallError(ALREADY_ENABLED,
                                 'Context "%s" already in whitelist' % context)
@@ -296,6 +351,7 @@ class LockdownWhitelist(IO_Object):
     def remove_context(self, context):
         if context in self.contexts:
             self.contexts.remove(context)
+            self.generation += 1
         else:
             raise FirewallError(NOT_ENABLED,
                                 'Context "%s" not in whitelist.' % context)
@@ -304,7 +360,7 @@ class LockdownWhitelist(IO_Object):
         return (context in self.contexts)
 
     def match_context(self, context):
-        return (context in self.contexts)
+        return (context in self._get_matcher().contexts)
 
     def get_contexts(self):
         return sorted(self.contexts)
@@ -19,7 +19,9 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import os
 import os.path
+import tempfile
 
 from firewall.core.prog import runProg
 from firewall.core.logger import log
@@ -29,6 +31,16 @@ COMMAND = {
     "ipv6": "/sbin/ip6tables",
 }
 
+RESTORE_COMMAND = {
+    "ipv4": "/sbin/iptables-restore",
+    "ipv6": "/sbin/ip6tables-restore",
+}
+
+SAVE_COMMAND = {
+    "ipv4": "/sbin/iptables-save",
+    "ipv6": "/sbin/ip6tables-save",
+}
+
 PROC_IPxTABLE_NAMES = {
     "ipv4": "/proc/net/ip_tables_names",
     "ipv6": "/proc/net/ip6_tables_names",
@@ -138,11 +150,77 @@ OUR_CHAINS["filter"] = set(["INPUT_direct", "INPUT_ZONES_SOURCE", "INPUT_ZONES",
                           "FORWARD_OUT_ZONES", "OUTPUT_direct"])
 
 
+def parse_ruleset(document):
+    # Return the sections of a document in the format of ip*tables-save or
+    # ebtables-save as list of (table, chains, rules). chains is a list of
+    # (chain, declaration line), rules are the other lines of the table.
+    sections = [ ]
+    for line in document.splitlines():
+        if not line or line.startswith("#") or line == "COMMIT":
+            continue
+        if line.startswith("*"):
+            sections.append((line[1:].strip(), [ ], [ ]))
+        elif len(sections) < 1:
+            raise ValueError("line outside of a table: '%s'" % line)
+        elif line.startswith(":"):
+            sections[-1][1].append((line[1:].split()[0], line))
+        else:
+            sections[-1][2].append(line)
+    return sections
+
+def filter_ruleset(document, chains, commit=True):
+    # Return the part of document with the chains of firewalld, chains is a
+    # dict of table and chain names. Built-in chains and chains of other
+    # tools are dropped, also tables missing in chains.
+    lines = [ ]
+    for (table, _chains, rules) in parse_ruleset(document):
+        if table not in chains:
+            continue
+        lines.append("*%s" % table)
+        lines += [ line for (chain, line) in _chains
+                   if chain in chains[table] ]
+        lines += [ line for line in rules
+                   if len(line.split()) > 1 and line.split()[0] == "-A"
+                   and line.split()[1] in chains[table] ]
+        if commit:
+            lines.append("COMMIT")
+    return "\n".join(lines) + "\n"
+
+def noflush_ruleset(document, installed, commit=True):
+    # Return the input for a restore call with --noflush, that replaces the
+    # chains in installed with the chains in document. The installed chains
+    # are flushed explicitly and deleted if they are not in document, new
+    # chains are declared. Other chains are not touched.
+    installed_chains = dict((table, [ chain for (chain, line) in _chains ])
+                            for (table, _chains, rules)
+                            in parse_ruleset(installed))
+    lines = [ ]
+    for (table, _chains, rules) in parse_ruleset(document):
+        current = installed_chains.get(table, [ ])
+        names = [ chain for (chain, line) in _chains ]
+        lines.append("*%s" % table)
+        lines += [ line for (chain, line) in _chains if chain not in current ]
+        lines += [ "-F %s" % chain for chain in current ]
+        lines += [ "-X %s" % chain for chain in current if chain not in names ]
+        lines += rules
+        if commit:
+            lines.append("COMMIT")
+    return "\n".join(lines) + "\n"
+
+def _restore_quote(item):
+    # ip*tables-restore splits lines at whitespace, quote items containing
+    # whitespace or quotes
+    if item == "" or any(c in item for c in " \t\"'"):
+        return '"%s"' % item.replace("\\", "\\\\").replace('"', '\\"')
+    return item
+
 class ip4tables(object):
     ipv = "ipv4"
 
     def __init__(self):
         self._command = COMMAND[self.ipv]
+        self._restore_command = RESTORE_COMMAND[self.ipv]
+        self._save_command = SAVE_COMMAND[self.ipv]
         self.wait_option = self._detect_wait_option()
 
     def __run(self, args):
@@ -161,6 +239,72 @@ class ip4tables(object):
     def set_rule(self, rule):
         return self.__run(rule)
 
+    def restore_rules(self, table, rules, test=False):
+        # Apply rules to table with a single ip*tables-restore call without
+        # flushing the table. The rules are committed at once, if one rule
+        # fails, none of the rules is applied. With test, the rules are
+        # checked, but not committed.
+        lines = [ "*%s" % table ]
+        for rule in rules:
+            lines.append(" ".join([ _restore_quote("%s" % item)
+                                    for item in rule ]))
+        lines.append("COMMIT")
+        options = [ "-n" ]
+        if test:
+            options.append("--test")
+        log.debug2("%s: %s %s: %d rules for table '%s'", self.__class__,
+                   self._restore_command, " ".join(options), len(rules),
+                   table)
+        (fd, filename) = tempfile.mkstemp(prefix="%s-" % table)
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write("\n".join(lines) + "\n")
+            (status, ret) = runProg(self._restore_command, options,
+                                    stdin=filename)
+        finally:
+            os.unlink(filename)
+        if status != 0:
+            raise ValueError("'%s %s' failed: %s" % (self._restore_command,
+                                                     " ".join(options), ret))
+        return ret
+
+    def save_rules(self, tables, chains):
+        # Return the chains of firewalld in the tables in the format of
+        # ip*tables-save without counters, chains is a dict of table and
+        # chain names. The built-in chains and the chains of other tools are
+        # not part of it.
+        document = ""
+        for table in tables:
+            log.debug2("%s: %s -t %s", self.__class__, self._save_command,
+                       table)
+            (status, ret) = runProg(self._save_command, [ "-t", table ])
+            if status != 0:
+                raise ValueError("'%s -t %s' failed: %s" % \
+                                 (self._save_command, table, ret))
+            document += filter_ruleset(ret, { table: chains.get(table, [ ]) })
+        return document
+
+    def restore_ruleset(self, document, installed):
+        # Replace the chains of firewalld in installed, a document returned
+        # by save_rules, with the chains of document with a single
+        # ip*tables-restore --noflush call. Each table is committed at once,
+        # the built-in chains and the chains of other tools are not changed.
+        document = noflush_ruleset(document, installed)
+        log.debug2("%s: %s -n: %d lines", self.__class__,
+                   self._restore_command, document.count("\n"))
+        (fd, filename) = tempfile.mkstemp(prefix="ruleset-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(document)
+            (status, ret) = runProg(self._restore_command, [ "-n" ],
+                                    stdin=filename)
+        finally:
+            os.unlink(filename)
+        if status != 0:
+            raise ValueError("'%s -n' failed: %s" % (self._restore_command,
+                                                     ret))
+        return ret
+
     def append_rule(self, rule):
         self.__run([ "-A" ] + rule)
 
@@ -229,8 +373,14 @@ class ip4tables(object):
 class ip6tables(ip4tables):
     ipv = "ipv6"
 
-ip4tables_available_tables = ip4tables().available_tables()
-ip6tables_available_tables = ip6tables().available_tables()
+# tables usable on the host, set by detect_available_tables
+ip4tables_available_tables = [ ]
+ip6tables_available_tables = [ ]
+
+def detect_available_tables(ip4, ip6):
+    # the lists are changed in place, they are imported by other modules
+    ip4tables_available_tables[:] = ip4.available_tables()
+    ip6tables_available_tables[:] = ip6.available_tables()
 
 #class ipXtables:
 #    def __init__(self, ipv4=True, ipv6=True):
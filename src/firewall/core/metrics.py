@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Control plane metrics of firewalld
+
+Collecting a value is a dictionary update only, histograms use power of
+two buckets of microseconds, so that no sorting or percentile
+calculation is needed while collecting. All aggregation is done when the
+metrics are read.
+
+There is no lock. The main loop and the worker thread of the operations
+do not record the same names at the same time: the firewall is not
+changed in the main loop while an operation is running, and the D-Bus
+method latencies are only recorded in the main loop. The readers copy a
+dictionary in one call, which does not interleave with an update.
+"""
+
+import time
+
+class Histogram(object):
+    """Latency histogram with power of two buckets in microseconds
+
+    Bucket i contains the values v with 2**(i-1) <= v < 2**i, bucket 0
+    contains values below one microsecond.
+    """
+
+    BUCKETS = 32
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+        self.buckets = [ 0 ] * self.BUCKETS
+
+    def observe(self, seconds):
+        usec = int(seconds * 1000000)
+        if usec < 0:
+            usec = 0
+        self.count += 1
+        self.sum += usec
+        if usec > self.max:
+            self.max = usec
+        self.buckets[min(usec.bit_length(), self.BUCKETS - 1)] += 1
+
+    def export(self):
+        # (count, sum, max, buckets), durations in microseconds; trailing
+        # empty buckets are dropped
+        buckets = list(self.buckets)
+        while len(buckets) > 0 and buckets[-1] == 0:
+            buckets.pop()
+        return (self.count, self.sum, self.max, buckets)
+
+class _Timer(object):
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe(self.name, time.time() - self.start)
+        return False
+
+class Metrics(object):
+    """Counters, gauges and latency histograms
+
+    Names are strings, parts of a name are separated by colons, for example
+    "backend_commands:ipv4" or "rules:ipv4:filter:INPUT".
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._counters = { }
+        self._gauges = { }
+        self._histograms = { }
+
+    def count(self, name, value=1):
+        self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        self._gauges[name] = self._gauges.get(name, 0) + value
+
+    def clear_gauges(self, prefix):
+        for name in [ x for x in list(self._gauges)
+                      if x.startswith(prefix) ]:
+            self._gauges.pop(name, None)
+
+    def observe(self, name, seconds):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms.setdefault(name, Histogram())
+        histogram.observe(seconds)
+
+    def timer(self, name):
+        # context manager adding the duration of the block to histogram name
+        return _Timer(self, name)
+
+    def get_counters(self):
+        return dict(self._counters)
+
+    def get_gauges(self):
+        return dict(self._gauges)
+
+    def get_histograms(self):
+        return dict((name, histogram.export())
+                    for (name, histogram) in list(self._histograms.items()))
+
+metrics = Metrics()
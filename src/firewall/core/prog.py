@@ -21,14 +21,15 @@
 
 import os
 
-def runProg(prog, argv=[ ]):
+def runProg(prog, argv=[ ], stdin=None):
+    # stdin is the name of a file used as standard input, /dev/null if None
     args = [ prog ] + argv
 
     (rfd, wfd) = os.pipe()
     pid = os.fork()
     if pid == 0:
         try:
-            fd = os.open("/dev/null", os.O_RDONLY)
+            fd = os.open(stdin if stdin else "/dev/null", os.O_RDONLY)
             if fd != 0:
                 os.dup2(fd, 0)
                 os.close(fd)
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Tracing of the rule handling functions
+
+Every traced call is recorded as a span with name, start time, elapsed time
+in microseconds, the id of the enclosing span, caller and failure. The spans
+are kept in a ring buffer, older spans are dropped. A span is recorded when
+it is finished, so enclosing spans follow their children in the buffer.
+"""
+
+import sys
+import json
+import time
+import itertools
+import threading
+import functools
+from collections import deque
+
+TRACE_SIZE = 4096
+
+class _Span(object):
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.error = None
+
+    def __enter__(self):
+        self.id = next(self.tracer._ids)
+        stack = self.tracer._stack()
+        self.parent = stack[-1].id if len(stack) > 0 else 0
+        stack.append(self)
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.time() - self.start
+        self.tracer._stack().pop()
+        if exc_value is not None and self.error is None:
+            self.error = str(exc_value)
+        record = { "id": self.id, "parent": self.parent, "name": self.name,
+                   "start": self.start, "elapsed": int(elapsed * 1000000),
+                   "thread": threading.current_thread().name }
+        record.update(self.attrs)
+        if self.error is not None:
+            record["error"] = self.error
+        self.tracer._spans.append(record)
+        return False
+
+class Tracer(object):
+    def __init__(self, size=TRACE_SIZE):
+        self._spans = deque(maxlen=size)
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = [ ]
+            return self._local.stack
+
+    def span(self, name, **attrs):
+        # context manager recording a span, attrs are added to the record
+        return _Span(self, name, attrs)
+
+    def clear(self):
+        self._spans.clear()
+
+    def get_spans(self):
+        return list(self._spans)
+
+    def dump(self):
+        # spans as JSON lines
+        return [ json.dumps(span, sort_keys=True)
+                 for span in self.get_spans() ]
+
+    def write(self, filename):
+        with open(filename, "a") as f:
+            for line in self.dump():
+                f.write(line + "\n")
+
+def caller(depth=2):
+    """Return name and zone of the calling function
+
+    The zone is taken from the zone argument of the caller, leading
+    underscores of private functions are removed from the name.
+    """
+    frame = sys._getframe(depth)
+    return (frame.f_code.co_name.lstrip("_"), frame.f_locals.get("zone"))
+
+def traced(func):
+    """Decorator for the handle_ functions of Firewall
+
+    These get a list as first argument and return None on success or the
+    tuple (cleanup list, error message).
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    def _traced(self, items, enable, *args, **kwargs):
+        (operation, zone) = caller()
+        with trace.span(name, caller=operation, zone=zone, count=len(items),
+                        enable=enable) as span:
+            ret = func(self, items, enable, *args, **kwargs)
+            if ret is not None:
+                span.error = str(ret[1])
+                span.attrs["failed_at"] = len(ret[0])
+        return ret
+    return _traced
+
+trace = Tracer()
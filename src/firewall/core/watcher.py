@@ -19,6 +19,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import os
 from gi.repository import Gio, GLib
 
 class Watcher(object):
@@ -28,6 +29,7 @@ class Watcher(object):
         self._monitors = { }
         self._timeouts = { }
         self._blocked = [ ]
+        self._unblocked = { }
 
     def add_watch_dir(self, directory):
         gfile = Gio.File.new_for_path(directory)
@@ -48,6 +50,17 @@ class Watcher(object):
     def unblock_source(self, filename):
         if filename in self._blocked:
             self._blocked.remove(filename)
+            # The change events for writes done while the source was
+            # blocked arrive later, they are ignored if the file has not
+            # been changed again since.
+            self._unblocked[filename] = self._file_state(filename)
+
+    def _file_state(self, filename):
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime)
 
     def clear_timeouts(self):
         for filename in self._timeouts.keys():
@@ -56,7 +69,9 @@ class Watcher(object):
 
     def _call_callback(self, filename):
         if filename not in self._blocked:
-            self._callback(filename)
+            if filename not in self._unblocked or \
+               self._unblocked.pop(filename) != self._file_state(filename):
+                self._callback(filename)
         del self._timeouts[filename]
 
     def _file_changed_cb(self, monitor, gio_file, gio_other_file, event):
@@ -91,6 +91,58 @@ def command_of_sender(bus, sender):
 def user_of_sender(bus, sender):
     return user_of_uid(uid_of_sender(bus, sender))
 
+class SenderAccessCache(object):
+    """ Cache for lockdown access decisions per unique D-Bus sender name
+
+        Decisions are stored together with the name and generation of the
+        lockdown whitelist they have been made for. An entry gets invalid
+        if the whitelist changes or if the sender leaves the bus.
+    """
+
+    def __init__(self):
+        self._cache = { }
+        self.hits = 0
+        self.misses = 0
+
+    def connect(self, bus):
+        bus.add_signal_receiver(self._name_owner_changed,
+                                signal_name="NameOwnerChanged",
+                                dbus_interface="org.freedesktop.DBus",
+                                path="/org/freedesktop/DBus")
+
+    def _name_owner_changed(self, name, old_owner, new_owner):
+        if new_owner:
+            return
+        self.invalidate(str(name))
+        if old_owner:
+            self.invalidate(str(old_owner))
+
+    def lookup(self, sender, whitelist, generation):
+        """ Return cached decision or None """
+        try:
+            (_generation, allowed) = self._cache[sender][whitelist]
+        except KeyError:
+            self.misses += 1
+            return None
+        if _generation != generation:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return allowed
+
+    def store(self, sender, whitelist, generation, allowed):
+        self._cache.setdefault(sender, { })[whitelist] = (generation, allowed)
+
+    def invalidate(self, sender=None):
+        if sender is None:
+            self._cache.clear()
+        elif sender in self._cache:
+            del self._cache[sender]
+
+    def get_stats(self):
+        return { "hits": self.hits, "misses": self.misses,
+                 "senders": len(self._cache) }
+
 def dbus_to_python(obj, expected_type=None):
     if obj is None:
         python_obj = obj
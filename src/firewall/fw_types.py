@@ -19,15 +19,18 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+from collections import OrderedDict
+
 class LastUpdatedOrderedDict(object):
+    # Membership tests and deletions are hash lookups, the insertion order
+    # is kept by the underlying OrderedDict.
+
     def __init__(self, x=None):
-        self._dict = { }
-        self._list = [ ]
+        self._dict = OrderedDict()
         if x:
             self.update(x)
 
     def clear(self):
-        del self._list[:]
         self._dict.clear()
 
     def update(self, x):
@@ -35,39 +38,43 @@ class LastUpdatedOrderedDict(object):
             self[key] = value
 
     def items(self):
-        return [(key, self[key]) for key in self._list]
+        return list(self._dict.items())
 
     def __delitem__(self, key):
         if key in self._dict:
-            self._list.remove(key)
             del self._dict[key]
 
     def __repr__(self):
         return '%s([%s])' % (self.__class__.__name__, ', '.join(
-                ['(%r, %r)' % (key, self[key]) for key in self._list]))
+                ['(%r, %r)' % (key, self[key]) for key in self._dict]))
 
     def __setitem__(self, key, value):
-        if key not in self._dict:
-            self._list.append(key)
         self._dict[key] = value
 
     def __getitem__(self, key):
         if key in self._dict:
             return self._dict[key]
         else:
-            return self._list[key]
+            return list(self._dict.keys())[key]
+
+    def __contains__(self, key):
+        return key in self._dict
+
+    def __iter__(self):
+        # iterate over a copy of the keys, entries might get removed
+        return iter(list(self._dict.keys()))
 
     def __len__(self):
-        return len(self._list)
+        return len(self._dict)
 
     def copy(self):
         return LastUpdatedOrderedDict(self)
 
     def keys(self):
-        return self._list[:]
+        return list(self._dict.keys())
 
     def values(self):
-        return [ self[key] for key in self._list ]
+        return list(self._dict.values())
 
     def setdefault(self, key, value=None):
         if key in self:
@@ -75,3 +82,96 @@ class LastUpdatedOrderedDict(object):
         else:
             self[key] = value
             return value
+
+class PriorityPositions(object):
+    """Number of entries per priority with prefix counts in O(log n)
+
+    The counts are kept in a Fenwick tree (binary indexed tree) over the
+    priority range, stored sparsely in a dict. The range grows on demand,
+    the tree is rebuilt from the plain counts if a priority is outside of
+    the covered range.
+    """
+
+    INITIAL_SIZE = 1024
+
+    def __init__(self):
+        self._counts = { }
+        self._tree = { }
+        self._base = 0
+        self._size = 0
+        self._total = 0
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self._counts)
+
+    def __len__(self):
+        return self._total
+
+    def __contains__(self, priority):
+        return self._counts.get(priority, 0) > 0
+
+    def __getitem__(self, priority):
+        return self._counts.get(priority, 0)
+
+    def keys(self):
+        return [ x for x in sorted(self._counts) if self._counts[x] > 0 ]
+
+    def copy(self):
+        positions = PriorityPositions()
+        positions._counts = self._counts.copy()
+        positions._tree = self._tree.copy()
+        positions._base = self._base
+        positions._size = self._size
+        positions._total = self._total
+        return positions
+
+    def _resize(self, priority):
+        low = min([ priority ] + list(self._counts.keys()))
+        high = max([ priority ] + list(self._counts.keys()))
+        size = max(self._size, self.INITIAL_SIZE)
+        while size <= high - low:
+            size *= 2
+        # leave room on both sides of the used range
+        self._base = low - (size - (high - low)) // 2
+        self._size = size
+        self._tree.clear()
+        for (_priority, count) in self._counts.items():
+            self._update(_priority, count)
+
+    def _update(self, priority, count):
+        i = priority - self._base + 1
+        while i <= self._size:
+            self._tree[i] = self._tree.get(i, 0) + count
+            i += i & -i
+
+    def add(self, priority, count=1):
+        if self._size == 0 or priority < self._base or \
+           priority >= self._base + self._size:
+            self._resize(priority)
+        self._counts[priority] = self._counts.get(priority, 0) + count
+        self._total += count
+        self._update(priority, count)
+
+    def remove(self, priority, count=1):
+        if self._counts.get(priority, 0) < count:
+            raise ValueError("priority %d has less than %d entries" % \
+                             (priority, count))
+        self._counts[priority] -= count
+        if self._counts[priority] == 0:
+            del self._counts[priority]
+        self._total -= count
+        self._update(priority, -count)
+
+    def count_le(self, priority):
+        """Return the number of entries with a priority less or equal to
+        priority"""
+        if self._size == 0 or priority < self._base:
+            return 0
+        if priority >= self._base + self._size:
+            return self._total
+        i = priority - self._base + 1
+        count = 0
+        while i > 0:
+            count += self._tree.get(i, 0)
+            i -= i & -i
+        return count
@@ -42,7 +42,8 @@ from firewall.core.io.icmptype import IcmpType
 from firewall.core.io.lockdown_whitelist import LockdownWhitelist
 from firewall.core.io.direct import Direct
 from firewall.dbus_utils import dbus_to_python, \
-    command_of_sender, context_of_sender, uid_of_sender, user_of_uid
+    command_of_sender, context_of_sender, uid_of_sender, user_of_uid, \
+    SenderAccessCache
 from firewall.errors import *
 
 ############################################################################
@@ -61,8 +62,13 @@ class FirewallDConfig(slip.dbus.service.Object):
 
     @handle_exceptions
     def __init__(self, config, *args, **kwargs):
+        access_cache = kwargs.pop("access_cache", None)
         super(FirewallDConfig, self).__init__(*args, **kwargs)
         self.config = config
+        if access_cache is None:
+            access_cache = SenderAccessCache()
+            access_cache.connect(dbus.SystemBus())
+        self.access_cache = access_cache
         self.path = args[0]
         self._init_vars()
         self.watcher = Watcher(self.watch_updater, 5)
@@ -112,6 +118,7 @@ class FirewallDConfig(slip.dbus.service.Object):
             del x
         self._init_vars()
 
+    @after_operations
     @handle_exceptions
     def watch_updater(self, name):
         if name == FIREWALLD_CONF:
@@ -192,14 +199,9 @@ class FirewallDConfig(slip.dbus.service.Object):
 
     @handle_exceptions
     def removeIcmpType(self, obj):
-        index = 7 # see IMPORT_EXPORT_STRUCTURE in class Zone(IO_Object)
-        for zone in self.zones:
-            settings = zone.getSettings()
-            # if this IcmpType is used in a zone remove it from that zone first
-            if obj.name in settings[index]:
-                settings[index].remove(obj.name)
-                zone.obj = self.config.set_zone_config(zone.obj, settings)
-                zone.Updated(zone.obj.name)
+        # if this IcmpType is used in a zone remove it from that zone first
+        self._replaceInZones(self.config.get_zones_of_icmptype(obj.name),
+                             Zone.index_of("icmp_blocks"), obj.name)
 
         for icmptype in self.icmptypes:
             if icmptype.obj == obj:
@@ -230,14 +232,9 @@ class FirewallDConfig(slip.dbus.service.Object):
 
     @handle_exceptions
     def removeService(self, obj):
-        index = 5 # see IMPORT_EXPORT_STRUCTURE in class Zone(IO_Object)
-        for zone in self.zones:
-            settings = zone.getSettings()
-            # if this Service is used in a zone remove it from that zone first
-            if obj.name in settings[index]:
-                settings[index].remove(obj.name)
-                zone.obj = self.config.set_zone_config(zone.obj, settings)
-                zone.Updated(zone.obj.name)
+        # if this Service is used in a zone remove it from that zone first
+        self._replaceInZones(self.config.get_zones_of_service(obj.name),
+                             Zone.index_of("services"), obj.name)
 
         for service in self.services:
             if service.obj == obj:
@@ -246,6 +243,31 @@ class FirewallDConfig(slip.dbus.service.Object):
                 self.services.remove(service)
                 del service
 
+    @handle_exceptions
+    def renameIcmpType(self, old_name, obj):
+        self._replaceInZones(self.config.get_zones_of_icmptype(old_name),
+                             Zone.index_of("icmp_blocks"), old_name, obj.name)
+
+    @handle_exceptions
+    def renameService(self, old_name, obj):
+        self._replaceInZones(self.config.get_zones_of_service(old_name),
+                             Zone.index_of("services"), old_name, obj.name)
+
+    def _replaceInZones(self, zone_names, index, name, new_name=None):
+        # replace (or remove if new_name is None) name in the list at
+        # index of the settings of the given zones
+        for zone in self.zones:
+            if zone.obj.name not in zone_names:
+                continue
+            settings = list(zone.getSettings())
+            if name not in settings[index]:
+                continue
+            settings[index].remove(name)
+            if new_name is not None and new_name not in settings[index]:
+                settings[index].append(new_name)
+            zone.obj = self.config.set_zone_config(zone.obj, settings)
+            zone.Updated(zone.obj.name)
+
     @handle_exceptions
     def _addZone(self, obj):
         # TODO: check for idx overflow
@@ -278,24 +300,40 @@ class FirewallDConfig(slip.dbus.service.Object):
 
     @dbus_handle_exceptions
     def accessCheck(self, sender):
+        # Changes must not overtake the running operations, a reload
+        # replaces the permanent configuration.
+        wait_for_operations()
         if self.config.lockdown_enabled():
             if sender is None:
                 log.error("Lockdown not possible, sender not set.")
                 return
-            bus = dbus.SystemBus()
-            context = context_of_sender(bus, sender)
-            if self.config.access_check("context", context):
-                return
-            uid = uid_of_sender(bus, sender)
-            if self.config.access_check("uid", uid):
-                return
-            user = user_of_uid(uid)
-            if self.config.access_check("user", user):
-                return
-            command = command_of_sender(bus, sender)
-            if self.config.access_check("command", command):
-                return
-            raise FirewallError(ACCESS_DENIED, "lockdown is enabled")
+            sender = str(sender)
+            policies = self.config.get_policies()
+            generation = policies.lockdown_whitelist.generation
+            allowed = self.access_cache.lookup(sender, "permanent",
+                                               generation)
+            if allowed is None:
+                allowed = self._accessAllowed(sender)
+                self.access_cache.store(sender, "permanent", generation,
+                                        allowed)
+            if not allowed:
+                raise FirewallError(ACCESS_DENIED, "lockdown is enabled")
+
+    def _accessAllowed(self, sender):
+        bus = dbus.SystemBus()
+        context = context_of_sender(bus, sender)
+        if self.config.access_check("context", context):
+            return True
+        uid = uid_of_sender(bus, sender)
+        if self.config.access_check("uid", uid):
+            return True
+        user = user_of_uid(uid)
+        if self.config.access_check("user", user):
+            return True
+        command = command_of_sender(bus, sender)
+        if self.config.access_check("command", command):
+            return True
+        return False
 
     # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
@@ -304,7 +342,7 @@ class FirewallDConfig(slip.dbus.service.Object):
     @dbus_handle_exceptions
     def _get_property(self, prop):
         if prop in [ "DefaultZone", "MinimalMark", "CleanupOnExit",
-                     "Lockdown", "IPv6_rpfilter" ]:
+                     "Lockdown", "IPv6_rpfilter", "IndividualSignals" ]:
             value = self.config.get_firewalld_conf().get(prop)
             if value is not None:
                 if prop == "MinimalMark":
@@ -321,6 +359,8 @@ class FirewallDConfig(slip.dbus.service.Object):
                     return "yes" if FALLBACK_LOCKDOWN else "no"
                 elif prop == "IPv6_rpfilter":
                     return "yes" if FALLBACK_IPV6_RPFILTER else "no"
+                elif prop == "IndividualSignals":
+                    return "yes"
         else:
             raise dbus.exceptions.DBusException(
                 "org.freedesktop.DBus.Error.AccessDenied: "
@@ -360,6 +400,7 @@ class FirewallDConfig(slip.dbus.service.Object):
             'CleanupOnExit': self._get_property("CleanupOnExit"),
             'Lockdown': self._get_property("Lockdown"),
             'IPv6_rpfilter': self._get_property("IPv6_rpfilter"),
+            'IndividualSignals': self._get_property("IndividualSignals"),
         }
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
@@ -379,7 +420,7 @@ class FirewallDConfig(slip.dbus.service.Object):
                 "FirewallD does not implement %s" % interface_name)
 
         if property_name in [ "MinimalMark", "CleanupOnExit", "Lockdown",
-                              "IPv6_rpfilter" ]:
+                              "IPv6_rpfilter", "IndividualSignals" ]:
             if property_name == "MinimalMark":
                 try:
                     int(new_value)
@@ -391,7 +432,7 @@ class FirewallDConfig(slip.dbus.service.Object):
                 raise FirewallError(INVALID_VALUE, "'%s' for %s" % \
                                             (new_value, property_name))
             if property_name in [ "CleanupOnExit", "Lockdown",
-                                  "IPv6_rpfilter" ]:
+                                  "IPv6_rpfilter", "IndividualSignals" ]:
                 if new_value.lower() not in [ "yes", "no", "true", "false" ]:
                     raise FirewallError(INVALID_VALUE, "'%s' for %s" % \
                                             (new_value, property_name))
@@ -602,6 +643,30 @@ class FirewallDConfig(slip.dbus.service.Object):
 
     # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
+    # A L L   S E T T I N G S
+
+    @dbus_service_method(DBUS_INTERFACE_CONFIG,
+                         out_signature='a{s%s}a{s%s}a{s%s}' % \
+                         (Zone.DBUS_SIGNATURE, Service.DBUS_SIGNATURE,
+                          IcmpType.DBUS_SIGNATURE))
+    @dbus_handle_exceptions
+    def getAllSettings(self, sender=None):
+        """settings of all zones, services and icmptypes by name
+        """
+        log.debug1("config.getAllSettings()")
+        zones = { }
+        for obj in self.zones:
+            zones[obj.obj.name] = obj.getSettings()
+        services = { }
+        for obj in self.services:
+            services[obj.obj.name] = obj.getSettings()
+        icmptypes = { }
+        for obj in self.icmptypes:
+            icmptypes[obj.obj.name] = obj.getSettings()
+        return (zones, services, icmptypes)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
     # I C M P T Y P E S
 
     @dbus_service_method(DBUS_INTERFACE_CONFIG, out_signature='ao')
@@ -747,6 +812,26 @@ class FirewallDConfig(slip.dbus.service.Object):
             return " ".join(ret) + "  (ERROR: source '%s' is in %s zone XML files, can be only in one)" % (iface, len(ret))
         return ret[0] if ret else ""
 
+    @dbus_service_method(DBUS_INTERFACE_CONFIG, in_signature='s',
+                         out_signature='as')
+    @dbus_handle_exceptions
+    def getZonesOfService(self, service, sender=None):
+        """names of zones the given service is used in
+        """
+        service = dbus_to_python(service, str)
+        log.debug1("config.getZonesOfService('%s')", service)
+        return self.config.get_zones_of_service(service)
+
+    @dbus_service_method(DBUS_INTERFACE_CONFIG, in_signature='s',
+                         out_signature='as')
+    @dbus_handle_exceptions
+    def getZonesOfIcmpType(self, icmptype, sender=None):
+        """names of zones the given icmptype is blocked in
+        """
+        icmptype = dbus_to_python(icmptype, str)
+        log.debug1("config.getZonesOfIcmpType('%s')", icmptype)
+        return self.config.get_zones_of_icmptype(icmptype)
+
     @dbus_service_method(DBUS_INTERFACE_CONFIG,
                          in_signature='s'+Zone.DBUS_SIGNATURE,
                          out_signature='o')
@@ -775,6 +860,15 @@ class FirewallDConfig(slip.dbus.service.Object):
     # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
     # DIRECT
 
+    def _writeDirect(self, func, *args, **kwargs):
+        # The file watcher must not parse the whole file again for the own
+        # writes.
+        self.watcher.block_source(FIREWALLD_DIRECT)
+        try:
+            func(*args, **kwargs)
+        finally:
+            self.watcher.unblock_source(FIREWALLD_DIRECT)
+
     @dbus_service_method(DBUS_INTERFACE_CONFIG_DIRECT,
                          out_signature=Direct.DBUS_SIGNATURE)
     @dbus_handle_exceptions
@@ -791,7 +885,7 @@ class FirewallDConfig(slip.dbus.service.Object):
         log.debug1("config.direct.update()")
         settings = dbus_to_python(settings)
         self.config.get_direct().import_config(settings)
-        self.config.get_direct().write()
+        self._writeDirect(self.config.get_direct().write)
         self.Updated()
 
     @dbus.service.signal(DBUS_INTERFACE_CONFIG_DIRECT)
@@ -810,13 +904,14 @@ class FirewallDConfig(slip.dbus.service.Object):
         log.debug1("config.direct.addChain('%s', '%s', '%s')" % \
                    (ipv, table, chain))
         self.accessCheck(sender)
-        idx = tuple((ipv, table, chain))
-        settings = list(self.getSettings())
-        if idx in settings[0]:
+        direct = self.config.get_direct()
+        if direct.query_chain(ipv, table, chain):
             raise FirewallError(ALREADY_ENABLED,
                                 "chain '%s' already is in '%s:%s'" % (chain, ipv, table))
-        settings[0].append(idx)
-        self.update(settings)
+        # only the new chain is appended to the file
+        direct.add_chain(ipv, table, chain)
+        self._writeDirect(direct.append, chains=[ (ipv, table, chain) ])
+        self.Updated()
 
     @dbus_service_method(DBUS_INTERFACE_CONFIG_DIRECT, in_signature='sss')
     @dbus_handle_exceptions
@@ -827,13 +922,13 @@ class FirewallDConfig(slip.dbus.service.Object):
         log.debug1("config.direct.removeChain('%s', '%s', '%s')" % \
                    (ipv, table, chain))
         self.accessCheck(sender)
-        idx = tuple((ipv, table, chain))
-        settings = list(self.getSettings())
-        if idx not in settings[0]:
+        direct = self.config.get_direct()
+        if not direct.query_chain(ipv, table, chain):
             raise FirewallError(NOT_ENABLED,
                                 "chain '%s' is not in '%s:%s'" % (chain, ipv, table))
-        settings[0].remove(idx)
-        self.update(settings)
+        direct.remove_chain(ipv, table, chain)
+        self._writeDirect(direct.write)
+        self.Updated()
 
     @dbus_service_method(DBUS_INTERFACE_CONFIG_DIRECT, in_signature='sss',
                          out_signature='b')
@@ -880,14 +975,16 @@ class FirewallDConfig(slip.dbus.service.Object):
         log.debug1("config.direct.addRule('%s', '%s', '%s', %d, '%s')" % \
                    (ipv, table, chain, priority, "','".join(args)))
         self.accessCheck(sender)
-        idx = (ipv, table, chain, priority, args)
-        settings = list(self.getSettings())
-        if idx in settings[1]:
+        direct = self.config.get_direct()
+        if direct.query_rule(ipv, table, chain, priority, args):
             raise FirewallError(ALREADY_ENABLED,
                                 "rule '%s' already is in '%s:%s:%s'" % \
                                 (args, ipv, table, chain))
-        settings[1].append(idx)
-        self.update(tuple(settings))
+        # only the new rule is appended to the file
+        direct.add_rule(ipv, table, chain, priority, args)
+        self._writeDirect(direct.append,
+                          rules=[ (ipv, table, chain, priority, args) ])
+        self.Updated()
 
     @dbus_service_method(DBUS_INTERFACE_CONFIG_DIRECT, in_signature='sssias')
     @dbus_handle_exceptions
@@ -900,14 +997,14 @@ class FirewallDConfig(slip.dbus.service.Object):
         log.debug1("config.direct.removeRule('%s', '%s', '%s', %d, '%s')" % \
                    (ipv, table, chain, priority, "','".join(args)))
         self.accessCheck(sender)
-        idx = (ipv, table, chain, priority, args)
-        settings = list(self.getSettings())
-        if idx not in settings[1]:
+        direct = self.config.get_direct()
+        if not direct.query_rule(ipv, table, chain, priority, args):
             raise FirewallError(NOT_ENABLED,
                                 "rule '%s' is not in '%s:%s:%s'" % \
                                 (args, ipv, table, chain))
-        settings[1].remove(idx)
-        self.update(tuple(settings))
+        direct.remove_rule(ipv, table, chain, priority, args)
+        self._writeDirect(direct.write)
+        self.Updated()
 
     @dbus_service_method(DBUS_INTERFACE_CONFIG_DIRECT, in_signature='sssias',
                          out_signature='b')
@@ -968,13 +1065,14 @@ class FirewallDConfig(slip.dbus.service.Object):
         log.debug1("config.direct.addPassthrough('%s', '%s')" % \
                    (ipv, "','".join(args)))
         self.accessCheck(sender)
-        idx = (ipv, args)
-        settings = list(self.getSettings())
-        if idx in settings[2]:
+        direct = self.config.get_direct()
+        if direct.query_passthrough(ipv, args):
             raise FirewallError(ALREADY_ENABLED,
                                 "passthrough '%s', '%s'" % (ipv, args))
-        settings[2].append(idx)
-        self.update(settings)
+        # only the new passthrough is appended to the file
+        direct.add_passthrough(ipv, args)
+        self._writeDirect(direct.append, passthroughs=[ (ipv, args) ])
+        self.Updated()
 
 
     @dbus_service_method(DBUS_INTERFACE_CONFIG_DIRECT, in_signature='sas')
@@ -985,13 +1083,13 @@ class FirewallDConfig(slip.dbus.service.Object):
         log.debug1("config.direct.removePassthrough('%s', '%s')" % \
                    (ipv, "','".join(args)))
         self.accessCheck(sender)
-        idx = (ipv, args)
-        settings = list(self.getSettings())
-        if idx not in settings[2]:
+        direct = self.config.get_direct()
+        if not direct.query_passthrough(ipv, args):
             raise FirewallError(NOT_ENABLED,
                                 "passthrough '%s', '%s'" % (ipv, args))
-        settings[2].remove(idx)
-        self.update(settings)
+        direct.remove_passthrough(ipv, args)
+        self._writeDirect(direct.write)
+        self.Updated()
 
     @dbus_service_method(DBUS_INTERFACE_CONFIG_DIRECT, in_signature='sas',
                          out_signature='b')
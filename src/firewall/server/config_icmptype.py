@@ -210,7 +210,9 @@ class FirewallDConfigIcmpType(slip.dbus.service.Object):
         name = dbus_to_python(name, str)
         log.debug1("config.icmptype.%d.rename('%s')", self.id, name)
         self.parent.accessCheck(sender)
+        old_name = self.obj.name
         self.obj = self.config.rename_icmptype(self.obj, name)
+        self.parent.renameIcmpType(old_name, self.obj)
         self.Renamed(name)
 
     @dbus.service.signal(DBUS_INTERFACE_CONFIG_ICMPTYPE, signature='s')
@@ -210,7 +210,9 @@ class FirewallDConfigService(slip.dbus.service.Object):
         name = dbus_to_python(name, str)
         log.debug1("config.service.%d.rename('%s')", self.id, name)
         self.parent.accessCheck(sender)
+        old_name = self.obj.name
         self.obj = self.config.rename_service(self.obj, name)
+        self.parent.renameService(old_name, self.obj)
         self.Renamed(name)
 
     @dbus.service.signal(DBUS_INTERFACE_CONFIG_SERVICE, signature='s')
@@ -166,6 +166,20 @@ class FirewallDConfigZone(slip.dbus.service.Object):
             settings = tuple(_settings)
         return settings
 
+    @dbus_service_method(DBUS_INTERFACE_CONFIG_ZONE, in_signature='sii',
+                         out_signature='iav')
+    @dbus_handle_exceptions
+    def getSettingsRange(self, key, offset, count, sender=None):
+        """get number of entries and up to count entries of the setting
+        key starting at offset
+        """
+        key = dbus_to_python(key, str)
+        offset = dbus_to_python(offset, int)
+        count = dbus_to_python(count, int)
+        log.debug1("config.zone.%d.getSettingsRange('%s', %d, %d)", self.id,
+                   key, offset, count)
+        return self.config.get_zone_config_range(self.obj, key, offset, count)
+
     def _checkDuplicateInterfacesSources(self, settings):
         """Assignment of interfaces/sources to zones is different from other
            zone settings in the sense that particular interface/zone can be
@@ -18,14 +18,22 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import time
 import dbus.service
 from dbus.exceptions import DBusException
 from decorator import decorator
 
 from firewall.core.logger import log
+from firewall.core.metrics import metrics
 from firewall.config.dbus import DBUS_INTERFACE
+from firewall.functions import PY2
 from firewall.errors import *
 
+if PY2:
+    from inspect import getargspec
+else:
+    from inspect import getfullargspec as getargspec
+
 ############################################################################
 #
 # Exception handler decorators
@@ -65,6 +73,123 @@ def dbus_handle_exceptions(func, *args, **kwargs):
         log.exception()
         raise FirewallDBusException(str(e))
 
+############################################################################
+#
+# Operations
+#
+############################################################################
+
+_operations = None
+
+def set_operations(operations):
+    """Set the OperationQueue of firewalld, None to unset it."""
+    global _operations
+    _operations = operations
+
+def wait_for_operations():
+    """Wait for the running and queued operations. The operations work on a
+    copy of the firewall that replaces the firewall state when they are
+    done, changes in the main loop have to call this before, else they
+    would be lost. Reading the state does not need to wait.
+    """
+    if _operations is not None:
+        _operations.wait()
+
+@decorator
+def after_operations(func, *args, **kwargs):
+    """Decorator for main loop callbacks like timeouts and file watches
+    that change the firewall state. If operations are running, the call is
+    deferred until they are done instead of blocking the main loop, False
+    is returned then to remove a timeout source.
+    """
+    if _operations is not None and _operations.is_busy():
+        _operations.call_when_idle(func, *args, **kwargs)
+        return False
+    return func(*args, **kwargs)
+
+def _waited():
+    # seconds the main loop has waited for operations in total
+    if _operations is None:
+        return 0.0
+    return _operations.waited
+
+class _Latency(object):
+    # Latency of a call of a D-Bus method. The time waiting for operations
+    # in the call is not included, it is in the histogram operations:wait.
+    def __init__(self, name):
+        self.name = name
+        self.start = time.time()
+        self.start_waited = _waited()
+        self.waited = None
+        self.recorded = False
+
+    def returned(self):
+        # the method returned, later waits belong to other calls
+        self.waited = _waited() - self.start_waited
+
+    def record(self):
+        if self.recorded:
+            return
+        self.recorded = True
+        waited = self.waited
+        if waited is None:
+            waited = _waited() - self.start_waited
+        metrics.observe(self.name, time.time() - self.start - waited)
+
+    def handler(self, handler):
+        # reply or error handler that records the latency first
+        def _handler(*args, **kwargs):
+            self.record()
+            return handler(*args, **kwargs)
+        return _handler
+
 def dbus_service_method(*args, **kwargs):
+    """dbus.service.method with sender keyword, also adds the duration of
+    every call to the latency histogram of the method.
+
+    For methods with async_callbacks, the duration ends when the reply or
+    error handler is called.
+    """
     kwargs.setdefault("sender_keyword", "sender")
-    return dbus.service.method(*args, **kwargs)
+    async_callbacks = kwargs.get("async_callbacks")
+    interface = args[0] if len(args) > 0 else kwargs["dbus_interface"]
+    if interface.startswith(DBUS_INTERFACE + "."):
+        interface = interface[len(DBUS_INTERFACE)+1:]
+    elif interface == DBUS_INTERFACE:
+        interface = ""
+    method = dbus.service.method(*args, **kwargs)
+
+    def _dbus_service_method(func):
+        if interface:
+            name = "dbus:%s.%s" % (interface, func.__name__)
+        else:
+            name = "dbus:%s" % func.__name__
+
+        # positions of the reply and error handler, decorator passes them
+        # as positional arguments
+        callbacks = [ ]
+        if async_callbacks:
+            spec = getargspec(func)[0]
+            callbacks = [ (spec.index(x), x) for x in async_callbacks ]
+
+        def _timed(func, *args, **kwargs):
+            latency = _Latency(name)
+            if len(callbacks) > 0:
+                args = list(args)
+                for (i, key) in callbacks:
+                    if i < len(args):
+                        args[i] = latency.handler(args[i])
+                    elif key in kwargs:
+                        kwargs[key] = latency.handler(kwargs[key])
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                latency.returned()
+                latency.record()
+                raise
+            latency.returned()
+            if len(callbacks) < 1:
+                latency.record()
+            return result
+        return method(decorator(_timed, func))
+    return _dbus_service_method
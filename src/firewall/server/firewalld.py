@@ -24,6 +24,11 @@ from gi.repository import GLib, GObject
 import sys
 sys.modules['gobject'] = GObject
 
+import threading
+import json
+import time
+from collections import deque
+
 import dbus
 import dbus.service
 import slip.dbus
@@ -34,15 +39,309 @@ from firewall.config.dbus import *
 from firewall.core.fw import Firewall
 from firewall.core.rich import Rich_Rule
 from firewall.core.logger import log
+from firewall.core.metrics import metrics
+from firewall.core.trace import trace
 from firewall.server.decorators import *
 from firewall.server.config import FirewallDConfig
 from firewall.dbus_utils import dbus_to_python, \
-    command_of_sender, context_of_sender, uid_of_sender, user_of_uid
+    command_of_sender, context_of_sender, uid_of_sender, user_of_uid, \
+    SenderAccessCache
 from firewall.core.io.zone import Zone
 from firewall.core.io.service import Service
 from firewall.core.io.icmptype import IcmpType
 from firewall.errors import *
 
+############################################################################
+#
+# class GroupCommitQueue
+#
+############################################################################
+
+class GroupCommitQueue(object):
+    """Queue for zone changes of concurrent requests
+
+    Changes are collected until the main loop gets idle or the commit window
+    in milliseconds expires and are then applied together, so that the
+    iptables and ip6tables rules of all changes are applied with one restore
+    call per table. Every change succeeds or fails on its own, like it
+    would in the order they have been received without grouping, and every
+    caller gets its own reply after the shared commit.
+    """
+
+    def __init__(self, fw, applied_callback, window=0):
+        self.fw = fw
+        self.applied_callback = applied_callback
+        self.window = window
+        self._pending = [ ]
+        self._source = None
+        self._held = False
+        self.commits = 0
+        self.requests = 0
+
+    def add(self, operation, sender, reply_handler, error_handler):
+        self._pending.append((operation, sender, reply_handler,
+                              error_handler))
+        self._schedule()
+
+    def _schedule(self):
+        if self._source is None and not self._held:
+            if self.window > 0:
+                self._source = GLib.timeout_add(self.window, self.commit)
+            else:
+                self._source = GLib.idle_add(self.commit)
+
+    def pending(self):
+        return len(self._pending)
+
+    def hold(self):
+        # Queued changes are not committed until release is called.
+        if self._source is not None:
+            GLib.source_remove(self._source)
+            self._source = None
+        self._held = True
+
+    def release(self):
+        self._held = False
+        if len(self._pending) > 0:
+            self._schedule()
+
+    def flush(self):
+        if self._source is not None:
+            GLib.source_remove(self._source)
+            self.commit()
+
+    def commit(self):
+        self._source = None
+        if self._held:
+            return False
+        pending = self._pending
+        self._pending = [ ]
+        if len(pending) < 1:
+            return False
+
+        self.commits += 1
+        self.requests += len(pending)
+        log.debug1("Committing %d queued zone changes" % len(pending))
+        try:
+            (_, results) = self.fw.zone.apply_operations(
+                [ x[0] for x in pending ], senders=[ x[1] for x in pending ],
+                independent=True)
+        except Exception as error:
+            self._error(pending, error)
+            return False
+        self._applied([ (operation, value) for ((operation, _, _, _),
+                                                (success, value))
+                        in zip(pending, results) if success ])
+        for ((operation, sender, reply_handler, error_handler),
+             (success, value)) in zip(pending, results):
+            if success:
+                reply_handler(value)
+            else:
+                log.error(value)
+                error_handler(FirewallDBusException(value))
+        return False
+
+    def _applied(self, applied):
+        # applied is a list of (operation, zone the operation applied to)
+        if len(applied) < 1:
+            return
+        try:
+            self.applied_callback([ (action, zone, item, value, timeout)
+                                    for ((action, _, item, value, timeout),
+                                         zone) in applied ])
+        except Exception:
+            log.exception()
+
+    def _error(self, pending, error):
+        if isinstance(error, FirewallError):
+            log.error(str(error))
+        else:
+            log.exception()
+        for (operation, sender, reply_handler, error_handler) in pending:
+            error_handler(FirewallDBusException(str(error)))
+
+############################################################################
+#
+# class OperationQueue
+#
+############################################################################
+
+class Operation(object):
+    def __init__(self, op_id, name, sender, func, done_func, reply_handler,
+                 error_handler, with_config):
+        self.id = op_id
+        self.name = name
+        self.sender = sender
+        self.func = func
+        self.done_func = done_func
+        self.reply_handler = reply_handler
+        self.error_handler = error_handler
+        self.with_config = with_config
+        self.fw = None
+        self.step = ""
+        self.result = None
+        self.error = None
+        self.thread = None
+        self.finished = False
+
+class OperationQueue(object):
+    """Queue for long running firewall operations
+
+    Operations like reload or panic mode are executed one after another in a
+    worker thread, so that the reply of the caller is delayed, but the
+    progress of the operation can be followed with getOperations and the
+    operation signals.
+
+    The started callback sets the fw attribute of the operation to a working
+    copy of the firewall. func is called in the worker thread with this copy
+    and a progress function, it must not change the config objects or emit
+    signals. After func returned, the commit callback replaces the firewall
+    with the copy, also if func failed, as the installed rules have been
+    changed with the copy. If func succeeded, done_func is called with the
+    result of func before the reply is sent to the caller.
+
+    The main loop keeps answering requests from the former firewall state
+    while the operation is running, only changes need to wait, see wait and
+    call_when_idle.
+
+    The callbacks are always called in the main loop.
+    """
+
+    def __init__(self, started_callback, progress_callback,
+                 finished_callback, commit_callback):
+        self.started_callback = started_callback
+        self.progress_callback = progress_callback
+        self.finished_callback = finished_callback
+        self.commit_callback = commit_callback
+        self._queue = deque()
+        self._current = None
+        self._last_id = 0
+        self._deferred = [ ]
+        self.waited = 0.0
+
+    def add(self, name, sender, func, done_func, reply_handler,
+            error_handler, with_config=False):
+        # with_config: the operation changes the permanent configuration
+        # of the firewall copy, like reload
+        self._last_id += 1
+        operation = Operation(self._last_id, name, sender, func, done_func,
+                              reply_handler, error_handler, with_config)
+        self._queue.append(operation)
+        if self._current is None:
+            self._next()
+        return operation.id
+
+    def get_operations(self):
+        operations = [ ]
+        if self._current is not None:
+            operations.append(self._current)
+        operations.extend(self._queue)
+        return [ (x.id, x.name, x.step) for x in operations ]
+
+    def is_busy(self):
+        return self._current is not None
+
+    def wait(self):
+        # Block the main loop until all queued operations are done, the
+        # worker threads are joined one after another. Changes of the
+        # firewall state in the main loop need to wait, else the change
+        # would be lost if the copy of the operation replaces the state.
+        if self._current is None:
+            return
+        start = time.time()
+        while self._current is not None:
+            self._current.thread.join()
+            self._finish(self._current)
+        waited = time.time() - start
+        self.waited += waited
+        metrics.observe("operations:wait", waited)
+
+    def call_when_idle(self, func, *args, **kwargs):
+        # Call func now if no operation is running, else after the last
+        # queued operation has been finished.
+        if self._current is None:
+            func(*args, **kwargs)
+        else:
+            self._deferred.append((func, args, kwargs))
+
+    def _next(self):
+        if len(self._queue) < 1:
+            self._current = None
+            deferred = self._deferred
+            self._deferred = [ ]
+            for (func, args, kwargs) in deferred:
+                try:
+                    func(*args, **kwargs)
+                except Exception:
+                    log.exception()
+            return
+        operation = self._queue.popleft()
+        self._current = operation
+        log.debug1("Starting operation %d '%s'" % (operation.id,
+                                                   operation.name))
+        self._call(self.started_callback, operation)
+        operation.thread = threading.Thread(target=self._run,
+                                            args=(operation,))
+        operation.thread.daemon = True
+        operation.thread.start()
+
+    def _run(self, operation):
+        # worker thread
+        def progress(step):
+            GLib.idle_add(self._progress, operation, step)
+        try:
+            operation.result = operation.func(operation.fw, progress)
+        except Exception as error:
+            operation.error = error
+        GLib.idle_add(self._finish, operation)
+
+    def _progress(self, operation, step):
+        if not operation.finished:
+            operation.step = step
+            self._call(self.progress_callback, operation)
+        return False
+
+    def _finish(self, operation):
+        if operation.finished:
+            return False
+        operation.finished = True
+        reply = (operation.reply_handler, operation.result)
+        try:
+            self.commit_callback(operation)
+        except Exception as error:
+            if operation.error is None:
+                operation.error = error
+        if operation.error is None and operation.done_func is not None:
+            try:
+                reply = (operation.reply_handler,
+                         operation.done_func(operation.result))
+            except Exception as error:
+                operation.error = error
+        if operation.error is not None:
+            if isinstance(operation.error, FirewallError):
+                log.error(str(operation.error))
+            else:
+                log.error("Operation '%s' failed: %s" % (operation.name,
+                                                          operation.error))
+            reply = (operation.error_handler,
+                     FirewallDBusException(str(operation.error)))
+        log.debug1("Operation %d '%s' finished" % (operation.id,
+                                                   operation.name))
+        self._call(self.finished_callback, operation)
+        self._next()
+        (handler, value) = reply
+        if handler is operation.reply_handler and value is None:
+            handler()
+        else:
+            handler(value)
+        return False
+
+    def _call(self, callback, operation):
+        try:
+            callback(operation)
+        except Exception:
+            log.exception()
+
 ############################################################################
 #
 # class FirewallD
@@ -62,9 +361,19 @@ class FirewallD(slip.dbus.service.Object):
         super(FirewallD, self).__init__(*args, **kwargs)
         self.fw = Firewall()
         self.path = args[0]
+        self.access_cache = SenderAccessCache()
+        self.access_cache.connect(dbus.SystemBus())
+        self.commit_queue = GroupCommitQueue(self.fw,
+                                             self._zoneItemsApplied)
+        self.operations = OperationQueue(self._operationStarted,
+                                         self._operationProgress,
+                                         self._operationFinished,
+                                         self._operationCommit)
+        set_operations(self.operations)
         self.start()
         self.config = FirewallDConfig(self.fw.config, self.path,
-                                      DBUS_PATH_CONFIG)
+                                      DBUS_PATH_CONFIG,
+                                      access_cache=self.access_cache)
 
     def __del__(self):
         self.stop()
@@ -82,30 +391,50 @@ class FirewallD(slip.dbus.service.Object):
         # stops firewall: unloads firewall modules, flushes chains and tables,
         #   resets policies
         log.debug1("stop()")
+        self.operations.wait()
+        self.commit_queue.flush()
         return self.fw.stop()
 
     # lockdown functions
 
     @dbus_handle_exceptions
-    def accessCheck(self, sender):
+    def accessCheck(self, sender, flush=True):
+        # Changes that are done directly must not overtake running
+        # operations and queued zone changes, therefore these are finished
+        # first.
+        if flush:
+            self.operations.wait()
+            self.commit_queue.flush()
         if self.fw.policies.query_lockdown():
             if sender is None:
                 log.error("Lockdown not possible, sender not set.")
                 return
-            bus = dbus.SystemBus()
-            context = context_of_sender(bus, sender)
-            if self.fw.policies.access_check("context", context):
-                return
-            uid = uid_of_sender(bus, sender)
-            if self.fw.policies.access_check("uid", uid):
-                return
-            user = user_of_uid(uid)
-            if self.fw.policies.access_check("user", user):
-                return
-            command = command_of_sender(bus, sender)
-            if self.fw.policies.access_check("command", command):
-                return
-            raise FirewallError(ACCESS_DENIED, "lockdown is enabled")
+            sender = str(sender)
+            generation = self.fw.policies.lockdown_whitelist.generation
+            allowed = self.access_cache.lookup(sender, "runtime",
+                                               generation)
+            if allowed is None:
+                allowed = self._accessAllowed(sender)
+                self.access_cache.store(sender, "runtime", generation,
+                                        allowed)
+            if not allowed:
+                raise FirewallError(ACCESS_DENIED, "lockdown is enabled")
+
+    def _accessAllowed(self, sender):
+        bus = dbus.SystemBus()
+        context = context_of_sender(bus, sender)
+        if self.fw.policies.access_check("context", context):
+            return True
+        uid = uid_of_sender(bus, sender)
+        if self.fw.policies.access_check("uid", uid):
+            return True
+        user = user_of_uid(uid)
+        if self.fw.policies.access_check("user", user):
+            return True
+        command = command_of_sender(bus, sender)
+        if self.fw.policies.access_check("command", command):
+            return True
+        return False
 
     # timeout functions
 
@@ -151,6 +480,9 @@ class FirewallD(slip.dbus.service.Object):
         elif prop == "IPv6_rpfilter":
             return self.fw.ipv6_rpfilter_enabled
 
+        elif prop == "IndividualSignals":
+            return self.fw.individual_signals
+
         elif prop == "BRIDGE":
             return self.fw.ebtables_enabled
 
@@ -194,6 +526,7 @@ class FirewallD(slip.dbus.service.Object):
             'IPv4': self._get_property("IPv4"),
             'IPv6': self._get_property("IPv6"),
             'IPv6_rpfilter': self._get_property("IPv6_rpfilter"),
+            'IndividualSignals': self._get_property("IndividualSignals"),
             'BRIDGE': self._get_property("BRIDGE"),
         }
         
@@ -226,23 +559,32 @@ class FirewallD(slip.dbus.service.Object):
     # reload
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
-    @dbus_service_method(DBUS_INTERFACE, in_signature='', out_signature='')
+    @dbus_service_method(DBUS_INTERFACE, in_signature='', out_signature='',
+                         async_callbacks=('reply_handler', 'error_handler'))
     @dbus_handle_exceptions
-    def reload(self, sender=None):
+    def reload(self, sender=None, reply_handler=None, error_handler=None):
         """Reload the firewall rules.
+
+        The reload is done in a worker thread, the reply is sent after it
+        has been finished.
         """
         log.debug1("reload()")
 
-        self.fw.reload()
-        self.config.reload()
-        self.Reloaded()
+        self.commit_queue.flush()
+        self.operations.add("reload", sender,
+                            lambda fw, progress: fw.reload(
+                                progress=progress),
+                            self._reloaded, reply_handler, error_handler,
+                            with_config=True)
 
     # complete_reload
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
-    @dbus_service_method(DBUS_INTERFACE, in_signature='', out_signature='')
+    @dbus_service_method(DBUS_INTERFACE, in_signature='', out_signature='',
+                         async_callbacks=('reply_handler', 'error_handler'))
     @dbus_handle_exceptions
-    def completeReload(self, sender=None):
+    def completeReload(self, sender=None, reply_handler=None,
+                       error_handler=None):
         """Completely reload the firewall.
 
         Completely reload the firewall: Stops firewall, unloads modules and 
@@ -250,8 +592,15 @@ class FirewallD(slip.dbus.service.Object):
         """
         log.debug1("completeReload()")
 
-        self.fw.reload(True)
-        self.config.reload()
+        self.commit_queue.flush()
+        self.operations.add("completeReload", sender,
+                            lambda fw, progress: fw.reload(
+                                True, progress=progress),
+                            self._reloaded, reply_handler, error_handler,
+                            with_config=True)
+
+    def _reloaded(self, result):
+        self.access_cache.invalidate()
         self.Reloaded()
 
     @dbus.service.signal(DBUS_INTERFACE)
@@ -259,37 +608,279 @@ class FirewallD(slip.dbus.service.Object):
     def Reloaded(self):
         log.debug1("Reloaded()")
 
+    # ruleset export and import
+
+    @slip.dbus.polkit.require_auth(PK_ACTION_INFO)
+    @dbus_service_method(DBUS_INTERFACE, in_signature='', out_signature='s',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    @dbus_handle_exceptions
+    def exportRuleset(self, sender=None, reply_handler=None,
+                      error_handler=None):
+        """Return the installed rules and the runtime state of the firewall
+        as JSON document for importRuleset.
+
+        The installed rules are saved in the worker thread after the running
+        operations, the main loop is not blocked.
+        """
+        log.debug1("exportRuleset()")
+        self.commit_queue.flush()
+        self.operations.add("exportRuleset", sender,
+                            lambda fw, progress: json.dumps(
+                                fw.export_ruleset(), sort_keys=True),
+                            None, reply_handler, error_handler)
+
+    @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
+    @dbus_service_method(DBUS_INTERFACE, in_signature='s', out_signature='',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    @dbus_handle_exceptions
+    def importRuleset(self, ruleset, sender=None, reply_handler=None,
+                      error_handler=None):
+        """Restore the rules and the runtime state of a document returned by
+        exportRuleset.
+
+        The rules are restored at once, the runtime state is taken from the
+        document instead of applying the settings again. Timeouts continue
+        with the remaining time. The Reloaded signal is emitted afterwards,
+        DefaultZoneChanged before if the default zone has been changed.
+        """
+        ruleset = dbus_to_python(ruleset, str)
+        log.debug1("importRuleset()")
+        try:
+            ruleset = json.loads(ruleset)
+        except ValueError as msg:
+            raise FirewallError(INVALID_VALUE, "invalid ruleset: %s" % msg)
+        # queued after the running operations, no need to wait for them
+        self.accessCheck(sender, flush=False)
+        self.commit_queue.flush()
+        self.operations.add("importRuleset", sender,
+                            lambda fw, progress: fw.import_ruleset(ruleset),
+                            self._rulesetImported, reply_handler,
+                            error_handler)
+
+    def _rulesetImported(self, default_zone):
+        if self.fw.import_default_zone(default_zone):
+            # update the copy of firewalld.conf of the permanent
+            # configuration, the file watcher will find no change then
+            self.fw.config.get_firewalld_conf().set("DefaultZone",
+                                                    default_zone)
+            self.config.PropertiesChanged(DBUS_INTERFACE_CONFIG,
+                                          { "DefaultZone": default_zone },
+                                          [ ])
+            self.DefaultZoneChanged(default_zone)
+
+        # the timeouts of the former runtime state are gone, arm the timeouts
+        # of the imported entries with the remaining time
+        self.cleanup_timeouts()
+        callbacks = { "services": self.disableTimedService,
+                      "ports": self.disableTimedPort,
+                      "protocols": self.disableTimedProtocol,
+                      "rules": self.disableTimedRichRule,
+                      "masquerade": self.disableTimedMasquerade,
+                      "forward_ports": self.disableTimedForwardPort,
+                      "icmp_blocks": self.disableTimedIcmpBlock }
+        now = time.time()
+        for zone in self.fw.zone.get_zones():
+            settings = self.fw.zone.get_settings(zone)
+            for key in callbacks:
+                for (entry_id, record) in settings[key].items():
+                    if record["timeout"] <= 0:
+                        continue
+                    timeout = max(int(record["date"] + record["timeout"] -
+                                      now), 1)
+                    if key == "masquerade":
+                        args = ( )
+                        x = "masquerade"
+                    elif isinstance(entry_id, tuple):
+                        args = entry_id
+                        x = entry_id
+                    else:
+                        args = (entry_id, )
+                        x = entry_id
+                    tag = GLib.timeout_add_seconds(timeout, callbacks[key],
+                                                   zone, *args)
+                    self.addTimeout(zone, x, tag)
+        self.access_cache.invalidate()
+        self.Reloaded()
+
+    # operations
+
+    def _operationStarted(self, operation):
+        self.commit_queue.hold()
+        operation.fw = self.fw.working_copy(operation.with_config)
+        self.OperationStarted(operation.id, operation.name,
+                              operation.sender or "")
+
+    def _operationCommit(self, operation):
+        # The working copy of the operation replaces the firewall, the main
+        # loop used the former state until now.
+        self.fw = operation.fw
+        operation.fw = None
+        self.fw.config.set_firewall(self.fw)
+        self.commit_queue.fw = self.fw
+        if operation.with_config:
+            # the config objects use the permanent configuration of the copy
+            self.config.config = self.fw.config
+            self.config.reload()
+
+    def _operationProgress(self, operation):
+        self.OperationProgress(operation.id, operation.step)
+
+    def _operationFinished(self, operation):
+        if operation.error is None:
+            self.OperationFinished(operation.id, True, "")
+        else:
+            self.OperationFinished(operation.id, False, str(operation.error))
+        self.commit_queue.release()
+
+    @slip.dbus.polkit.require_auth(PK_ACTION_INFO)
+    @dbus_service_method(DBUS_INTERFACE, in_signature='',
+                         out_signature='a(tss)')
+    @dbus_handle_exceptions
+    def getOperations(self, sender=None):
+        # Return the running and the queued operations with id, name and
+        # the last reported step
+        log.debug1("getOperations()")
+        return self.operations.get_operations()
+
+    @dbus.service.signal(DBUS_INTERFACE, signature='tss')
+    @dbus_handle_exceptions
+    def OperationStarted(self, op_id, name, sender):
+        log.debug1("OperationStarted(%d, '%s', '%s')" % (op_id, name,
+                                                          sender))
+
+    @dbus.service.signal(DBUS_INTERFACE, signature='ts')
+    @dbus_handle_exceptions
+    def OperationProgress(self, op_id, step):
+        log.debug1("OperationProgress(%d, '%s')" % (op_id, step))
+
+    @dbus.service.signal(DBUS_INTERFACE, signature='tbs')
+    @dbus_handle_exceptions
+    def OperationFinished(self, op_id, success, message):
+        log.debug1("OperationFinished(%d, %s, '%s')" % (op_id, success,
+                                                         message))
+
+    @slip.dbus.polkit.require_auth(PK_ACTION_INFO)
+    @dbus_service_method(DBUS_INTERFACE, in_signature='',
+                         out_signature='a{st}')
+    @dbus_handle_exceptions
+    def getAccessCheckStats(self, sender=None):
+        # Return hit and miss counters of the lockdown access cache
+        log.debug1("getAccessCheckStats()")
+        return self.access_cache.get_stats()
+
     # runtime to permanent
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
-    @dbus_service_method(DBUS_INTERFACE, in_signature='', out_signature='')
+    @dbus_service_method(DBUS_INTERFACE, in_signature='', out_signature='as',
+                         async_callbacks=('reply_handler', 'error_handler'))
     @dbus_handle_exceptions
-    def runtimeToPermanent(self, sender=None):
-        """Make runtime configuration permanent
+    def runtimeToPermanent(self, sender=None, reply_handler=None,
+                           error_handler=None):
+        """Make runtime configuration permanent, returns list of the
+        written configurations
         """
         log.debug1("copyRuntimeToPermanent()")
+        self.commit_queue.flush()
+        self.operations.add("runtimeToPermanent", sender,
+                            self._runtimeToPermanent,
+                            self._runtimeToPermanentDone, reply_handler,
+                            error_handler)
+
+    def _runtimeToPermanent(self, fw, progress):
+        # Collect the runtime settings that need to be copied from the
+        # working copy fw in the worker thread. The permanent configuration
+        # and the config objects are changed in _runtimeToPermanentDone in
+        # the main loop.
+        result = { }
+
+        # Only zones, that have been changed in runtime since they were
+        # loaded or copied last and zones missing in the permanent
+        # environment need to be copied.
+
+        permanent_zones = set(fw.config.get_zones())
+        zones = [ ]
+        for name in fw.zone.get_zones():
+            if name not in permanent_zones or fw.zone.is_dirty(name):
+                zones.append(name)
+            else:
+                log.debug1("Zone '%s' is unchanged" % name)
 
         # Services or icmptypes can not be modified in runtime, but they can
         # be removed or modified in permanent environment. Therefore copying
-        # of services and icmptypes to permanent is also needed.
+        # of services and icmptypes is needed if they are missing in the
+        # permanent environment or if they are used in a copied zone.
+
+        permanent_services = set(fw.config.get_services())
+        services = set()
+        for name in fw.service.get_services():
+            if name not in permanent_services:
+                services.add(name)
+        permanent_icmptypes = set(fw.config.get_icmptypes())
+        icmptypes = set()
+        for name in fw.icmptype.get_icmptypes():
+            if name not in permanent_icmptypes:
+                icmptypes.add(name)
+        for name in zones:
+            services.update(fw.zone.list_services(name))
+            icmptypes.update(fw.zone.list_icmp_blocks(name))
+
+        progress("services")
+        result["services"] = [ (name,
+                                 fw.service.get_service(name).export_config())
+                               for name in sorted(services) ]
+
+        progress("icmptypes")
+        result["icmptypes"] = [ (name, fw.icmptype.get_icmptype(
+                                    name).export_config())
+                                for name in sorted(icmptypes) ]
+
+        # zone runtime settings can be modified, but not service and
+        # icmptye settings
+        progress("zones")
+        result["zones"] = [ (name, fw.zone.get_config_with_settings(name),
+                             fw.zone.get_sequence(name))
+                            for name in zones ]
+
+        progress("direct")
+        result["direct"] = None
+        if fw.direct.is_dirty():
+            config = ( fw.direct.get_all_chains(),
+                       fw.direct.get_all_rules(),
+                       fw.direct.get_all_passthroughs() )
+            result["direct"] = (config, fw.direct.get_generation())
+        else:
+            log.debug1("Direct configuration is unchanged")
+
+        progress("policies")
+        result["policies"] = None
+        if fw.policies.is_dirty():
+            result["policies"] = \
+                fw.policies.lockdown_whitelist.export_config()
+        else:
+            log.debug1("Policies configuration is unchanged")
+
+        return result
+
+    def _runtimeToPermanentDone(self, result):
+        # Write the settings collected by _runtimeToPermanent, returns the
+        # list of the written configurations
+        written = [ ]
 
         # services
 
-        for name in self.fw.service.get_services():
-            config = self.getServiceSettings(name)
+        permanent_services = set(self.fw.config.get_services())
+        for (name, config) in result["services"]:
             try:
-                try:
-                    conf_obj = self.config.getServiceByName(name)
-                except FirewallError as e:
-                    if "INVALID_SERVICE" in e:
-                        log.debug1("Creating service '%s'" % name)
-                        self.config.addService(name, config)
-                    else:
-                        raise
+                if name not in permanent_services:
+                    log.debug1("Creating service '%s'" % name)
+                    self.config.addService(name, config)
+                    written.append("service:%s" % name)
                 else:
+                    conf_obj = self.config.getServiceByName(name)
                     if conf_obj.getSettings() != config:
                         log.debug1("Copying service '%s' settings" % name)
                         conf_obj.update(config)
+                        written.append("service:%s" % name)
                     else:
                         log.debug1("Service '%s' is identical" % name)
             except Exception as e:
@@ -298,21 +889,19 @@ class FirewallD(slip.dbus.service.Object):
 
         # icmptypes
 
-        for name in self.fw.icmptype.get_icmptypes():
-            config = self.getIcmpTypeSettings(name)
+        permanent_icmptypes = set(self.fw.config.get_icmptypes())
+        for (name, config) in result["icmptypes"]:
             try:
-                try:
-                    conf_obj = self.config.getIcmpTypeByName(name)
-                except FirewallError as e:
-                    if "INVALID_ICMPTYPE" in e:
-                        log.debug1("Creating icmptype '%s'" % name)
-                        self.config.addIcmpType(name, config)
-                    else:
-                        raise
+                if name not in permanent_icmptypes:
+                    log.debug1("Creating icmptype '%s'" % name)
+                    self.config.addIcmpType(name, config)
+                    written.append("icmptype:%s" % name)
                 else:
+                    conf_obj = self.config.getIcmpTypeByName(name)
                     if conf_obj.getSettings() != config:
                         log.debug1("Copying icmptype '%s' settings" % name)
                         conf_obj.update(config)
+                        written.append("icmptype:%s" % name)
                     else:
                         log.debug1("IcmpType '%s' is identical" % name)
             except Exception as e:
@@ -321,57 +910,117 @@ class FirewallD(slip.dbus.service.Object):
 
         # zones
 
-        for name in self.fw.zone.get_zones():
-            # zone runtime settings can be modified, but not service and
-            # icmptye settings
-            config = self.getZoneSettings(name)
+        permanent_zones = set(self.fw.config.get_zones())
+        for (name, config, sequence) in result["zones"]:
             try:
-                try:
-                    conf_obj = self.config.getZoneByName(name)
-                except FirewallError as e:
-                    if "INVALID_ZONE" in e:
-                        log.debug1("Creating zone '%s'" % name)
-                        self.config.addZone(name, config)
-                    else:
-                        raise
+                if name not in permanent_zones:
+                    log.debug1("Creating zone '%s'" % name)
+                    self.config.addZone(name, config)
+                    written.append("zone:%s" % name)
                 else:
+                    conf_obj = self.config.getZoneByName(name)
                     if conf_obj.getSettings() != config:
                         log.debug1("Copying zone '%s' settings" % name)
                         conf_obj.update(config)
+                        written.append("zone:%s" % name)
                     else:
                         log.debug1("Zone '%s' is identical" % name)
             except Exception as e:
                 raise FirewallError(RT_TO_PERM_FAILED,
                                     "zone '%s' : %s" % (name, e))
+            self.fw.zone.set_synced(name, sequence)
 
         # direct
 
-        # rt_config = self.fw.direct.get_config()
-        config = ( self.fw.direct.get_all_chains(),
-                   self.fw.direct.get_all_rules(),
-                   self.fw.direct.get_all_passthroughs() )
-        try:
-            if self.config.getSettings() != config:
-                log.debug1("Copying direct configuration")
-                self.config.update(config)
-            else:
-                log.debug1("Direct configuration is identical")
-        except Exception as e:
-            raise FirewallError(RT_TO_PERM_FAILED,
-                                "direct configuration: %s" % e)
+        if result["direct"] is not None:
+            (config, generation) = result["direct"]
+            try:
+                if self.config.getSettings() != config:
+                    log.debug1("Copying direct configuration")
+                    self.config.update(config)
+                    written.append("direct")
+                else:
+                    log.debug1("Direct configuration is identical")
+            except Exception as e:
+                raise FirewallError(RT_TO_PERM_FAILED,
+                                    "direct configuration: %s" % e)
+            self.fw.direct.set_synced(generation)
 
         # policies
 
-        config = self.fw.policies.lockdown_whitelist.export_config()
-        try:
-            if self.config.getSettings() != config:
-                log.debug1("Copying policies configuration")
-                self.config.setLockdownWhitelist(config)
-            else:
-                log.debug1("Policies configuration is identical")
-        except Exception as e:
-            raise FirewallError(RT_TO_PERM_FAILED,
-                                "policies configuration: %s" % e)
+        if result["policies"] is not None:
+            config = result["policies"]
+            try:
+                if self.config.getLockdownWhitelist() != config:
+                    log.debug1("Copying policies configuration")
+                    self.config.setLockdownWhitelist(config)
+                    written.append("policies")
+                else:
+                    log.debug1("Policies configuration is identical")
+            except Exception as e:
+                raise FirewallError(RT_TO_PERM_FAILED,
+                                    "policies configuration: %s" % e)
+            self.fw.policies.set_synced()
+
+        return written
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # METRICS
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+    @slip.dbus.polkit.require_auth(PK_ACTION_INFO)
+    @dbus_service_method(DBUS_INTERFACE_METRICS, in_signature='',
+                         out_signature='a{st}')
+    @dbus_handle_exceptions
+    def getCounters(self, sender=None):
+        """Return counters: backend commands and errors per family, group
+        commits and access cache statistics
+        """
+        log.debug1("metrics.getCounters()")
+        counters = metrics.get_counters()
+        counters["commit_queue:commits"] = self.commit_queue.commits
+        counters["commit_queue:requests"] = self.commit_queue.requests
+        for (key, value) in self.access_cache.get_stats().items():
+            counters["access_cache:%s" % key] = value
+        return counters
+
+    @slip.dbus.polkit.require_auth(PK_ACTION_INFO)
+    @dbus_service_method(DBUS_INTERFACE_METRICS, in_signature='',
+                         out_signature='a{sx}')
+    @dbus_handle_exceptions
+    def getGauges(self, sender=None):
+        """Return gauges: rules per family, table and chain and the backlog
+        of the timeout scheduler, the commit queue and operations
+        """
+        log.debug1("metrics.getGauges()")
+        gauges = metrics.get_gauges()
+        gauges["backlog:timeouts"] = sum([ len(x) for x in
+                                           self._timeouts.values() ])
+        gauges["backlog:commit_queue"] = self.commit_queue.pending()
+        gauges["backlog:operations"] = len(self.operations.get_operations())
+        return gauges
+
+    @slip.dbus.polkit.require_auth(PK_ACTION_INFO)
+    @dbus_service_method(DBUS_INTERFACE_METRICS, in_signature='',
+                         out_signature='a{s(tttat)}')
+    @dbus_handle_exceptions
+    def getHistograms(self, sender=None):
+        """Return latency histograms: backend command execution per family,
+        D-Bus methods and start and reload phases
+        """
+        log.debug1("metrics.getHistograms()")
+        return metrics.get_histograms()
+
+    @slip.dbus.polkit.require_auth(PK_ACTION_INFO)
+    @dbus_service_method(DBUS_INTERFACE_METRICS, in_signature='',
+                         out_signature='as')
+    @dbus_handle_exceptions
+    def getTraceSpans(self, sender=None):
+        """Return the recorded spans of the rule handling functions as JSON
+        strings, oldest first
+        """
+        log.debug1("metrics.getTraceSpans()")
+        return trace.dump()
 
     # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
     # POLICIES
@@ -675,31 +1324,43 @@ class FirewallD(slip.dbus.service.Object):
     # PANIC
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
-    @dbus_service_method(DBUS_INTERFACE, in_signature='', out_signature='')
+    @dbus_service_method(DBUS_INTERFACE, in_signature='', out_signature='',
+                         async_callbacks=('reply_handler', 'error_handler'))
     @dbus_handle_exceptions
-    def enablePanicMode(self, sender=None):
+    def enablePanicMode(self, sender=None, reply_handler=None,
+                        error_handler=None):
         """Enable panic mode.
         
         All ingoing and outgoing connections and packets will be blocked.
         """
         log.debug1("enablePanicMode()")
-        self.accessCheck(sender)
-        self.fw.enable_panic_mode()
-        self.PanicModeEnabled()
+        # queued after the running operations, no need to wait for them
+        self.accessCheck(sender, flush=False)
+        self.commit_queue.flush()
+        self.operations.add("enablePanicMode", sender,
+                            lambda fw, progress: fw.enable_panic_mode(),
+                            lambda result: self.PanicModeEnabled(),
+                            reply_handler, error_handler)
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
-    @dbus_service_method(DBUS_INTERFACE, in_signature='', out_signature='')
+    @dbus_service_method(DBUS_INTERFACE, in_signature='', out_signature='',
+                         async_callbacks=('reply_handler', 'error_handler'))
     @dbus_handle_exceptions
-    def disablePanicMode(self, sender=None):
+    def disablePanicMode(self, sender=None, reply_handler=None,
+                         error_handler=None):
         """Disable panic mode.
 
         Enables normal mode: Allowed ingoing and outgoing connections 
         will not be blocked anymore
         """
         log.debug1("disablePanicMode()")
-        self.accessCheck(sender)
-        self.fw.disable_panic_mode()
-        self.PanicModeDisabled()
+        # queued after the running operations, no need to wait for them
+        self.accessCheck(sender, flush=False)
+        self.commit_queue.flush()
+        self.operations.add("disablePanicMode", sender,
+                            lambda fw, progress: fw.disable_panic_mode(),
+                            lambda result: self.PanicModeDisabled(),
+                            reply_handler, error_handler)
 
     @slip.dbus.polkit.require_auth(PK_ACTION_INFO)
     @dbus_service_method(DBUS_INTERFACE, in_signature='', out_signature='b')
@@ -733,6 +1394,33 @@ class FirewallD(slip.dbus.service.Object):
         log.debug1("getZoneSettings(%s)", zone)
         return self.fw.zone.get_config_with_settings(zone)
 
+    @slip.dbus.polkit.require_auth(PK_ACTION_INFO)
+    @dbus_service_method(DBUS_INTERFACE, in_signature='ssii',
+                         out_signature='tiav')
+    @dbus_handle_exceptions
+    def getZoneSettingsRange(self, zone, key, offset, count, sender=None):
+        # returns change sequence number, number of entries and up to count
+        # entries of the setting key of zone starting at offset
+        zone = dbus_to_python(zone, str)
+        key = dbus_to_python(key, str)
+        offset = dbus_to_python(offset, int)
+        count = dbus_to_python(count, int)
+        log.debug1("getZoneSettingsRange(%s, %s, %d, %d)", zone, key, offset,
+                   count)
+        return self.fw.zone.get_settings_range(zone, key, offset, count)
+
+    @slip.dbus.polkit.require_auth(PK_ACTION_INFO)
+    @dbus_service_method(DBUS_INTERFACE, in_signature='st',
+                         out_signature='tba(svb)')
+    @dbus_handle_exceptions
+    def getZoneChanges(self, zone, sequence, sender=None):
+        # returns current change sequence number, flag if the changes are
+        # complete and the (key, entry, added) changes after sequence
+        zone = dbus_to_python(zone, str)
+        sequence = dbus_to_python(sequence, int)
+        log.debug1("getZoneChanges(%s, %d)", zone, sequence)
+        return self.fw.zone.get_changes(zone, sequence)
+
     @slip.dbus.polkit.require_auth(PK_ACTION_INFO)
     @dbus_service_method(DBUS_INTERFACE, in_signature='',
                          out_signature='as')
@@ -777,6 +1465,33 @@ class FirewallD(slip.dbus.service.Object):
 
     # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
+    # ALL SETTINGS
+
+    @slip.dbus.polkit.require_auth(PK_ACTION_INFO)
+    @dbus_service_method(DBUS_INTERFACE, in_signature='',
+                         out_signature='sa{s%s}a{s%s}a{s%s}' % \
+                         (Zone.DBUS_SIGNATURE, Service.DBUS_SIGNATURE,
+                          IcmpType.DBUS_SIGNATURE))
+    @dbus_handle_exceptions
+    def getAllSettings(self, sender=None):
+        # returns the default zone and the runtime settings of all zones,
+        # services and icmptypes in one message
+        log.debug1("getAllSettings()")
+        zones = { }
+        for zone in self.fw.zone.get_zones():
+            zones[zone] = self.fw.zone.get_config_with_settings(zone)
+        services = { }
+        for service in self.fw.service.get_services():
+            services[service] = \
+                self.fw.service.get_service(service).export_config()
+        icmptypes = { }
+        for icmptype in self.fw.icmptype.get_icmptypes():
+            icmptypes[icmptype] = \
+                self.fw.icmptype.get_icmptype(icmptype).export_config()
+        return (self.fw.get_default_zone(), zones, services, icmptypes)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
     # DEFAULT ZONE
 
     @slip.dbus.polkit.require_auth(PK_ACTION_INFO)
@@ -870,6 +1585,147 @@ class FirewallD(slip.dbus.service.Object):
             return zone
         return ""
 
+    @slip.dbus.polkit.require_auth(PK_ACTION_INFO)
+    @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='s',
+                         out_signature='as')
+    @dbus_handle_exceptions
+    def getZonesOfService(self, service, sender=None):
+        # Return the zones a service is enabled in.
+        service = dbus_to_python(service, str)
+        log.debug1("zone.getZonesOfService('%s')" % service)
+        return self.fw.zone.get_zones_of_service(service)
+
+    @slip.dbus.polkit.require_auth(PK_ACTION_INFO)
+    @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='s',
+                         out_signature='as')
+    @dbus_handle_exceptions
+    def getZonesOfIcmpType(self, icmptype, sender=None):
+        # Return the zones an icmptype is blocked in.
+        icmptype = dbus_to_python(icmptype, str)
+        log.debug1("zone.getZonesOfIcmpType('%s')" % icmptype)
+        return self.fw.zone.get_zones_of_icmptype(icmptype)
+
+    @slip.dbus.polkit.require_auth(PK_ACTION_INFO)
+    @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='s',
+                         out_signature='a{s(ii)}')
+    @dbus_handle_exceptions
+    def getMemoryUsage(self, zone, sender=None):
+        # Return number of entries and approximate memory usage in bytes
+        # of the runtime settings of a zone.
+        zone = dbus_to_python(zone, str)
+        log.debug1("zone.getMemoryUsage('%s')" % zone)
+        return self.fw.zone.get_memory_usage(zone)
+
+    @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
+    @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='a(ssssi)',
+                         out_signature='a(bs)')
+    @dbus_handle_exceptions
+    def bulkChange(self, operations, sender=None):
+        """Apply list of operations (action, zone, item, value, timeout)
+        all or nothing. Action is add or remove, item one of service, port,
+        protocol, source, interface or rule. Returns (True, zone) for every
+        operation on success, else the error for the failed operations.
+        """
+        operations = [ (dbus_to_python(action, str),
+                        dbus_to_python(zone, str),
+                        dbus_to_python(item, str),
+                        dbus_to_python(value, str),
+                        dbus_to_python(timeout, int))
+                       for (action, zone, item, value, timeout) \
+                       in operations ]
+        log.debug1("zone.bulkChange(%d operations)" % len(operations))
+        self.accessCheck(sender)
+        (success, results) = self.fw.zone.apply_operations(operations,
+                                                           sender)
+        if success:
+            self._zoneItemsApplied(
+                [ (action, _zone, item, value, timeout)
+                  for ((action, zone, item, value, timeout), (_, _zone))
+                  in zip(operations, results) ])
+        return results
+
+    def _zoneItemsApplied(self, changes):
+        # changes is a list of (action, zone, item, value, timeout) that has
+        # been applied in one commit
+        for (action, zone, item, value, timeout) in changes:
+            self._zoneItemApplied(action, zone, item, value, timeout)
+
+        # aggregated signal per zone and item with the effective changes
+        aggregated = { }
+        order = [ ]
+        for (action, zone, item, value, timeout) in changes:
+            if (zone, item) not in aggregated:
+                aggregated[(zone, item)] = { }
+                order.append((zone, item))
+            values = aggregated[(zone, item)]
+            if value in values and values[value][0] != action:
+                # added and removed again or the other way round
+                values[value] = (values[value][0], None)
+            elif value in values:
+                values[value] = (values[value][0], action)
+            else:
+                values[value] = (action, action)
+        for (zone, item) in order:
+            values = aggregated[(zone, item)]
+            added = [ x for x in values if values[x] == ("add", "add") ]
+            removed = [ x for x in values
+                        if values[x] == ("remove", "remove") ]
+            if len(added) > 0 or len(removed) > 0:
+                self.ZoneItemsChanged(zone, item, added, removed)
+
+    @dbus.service.signal(DBUS_INTERFACE_ZONE, signature='ssasas')
+    @dbus_handle_exceptions
+    def ZoneItemsChanged(self, zone, item, added, removed):
+        log.debug1("zone.ZoneItemsChanged('%s', '%s', %d, %d)" % \
+                   (zone, item, len(added), len(removed)))
+
+    def _forwardPortValue(self, port, protocol, toport, toaddr):
+        # forward port item value for ZoneItemsChanged
+        return "port=%s:proto=%s:toport=%s:toaddr=%s" % (port, protocol,
+                                                         toport, toaddr)
+
+    def _zoneItemApplied(self, action, zone, item, value, timeout):
+        # timeouts and signals as for the single add and remove methods
+        if item == "port":
+            (port, _, protocol) = value.partition("/")
+            args = (port, protocol)
+            key = args
+        elif item == "forward-port":
+            # toaddr is the last field and may contain colons
+            fields = dict(x.split("=", 1) for x in value.split(":", 3))
+            args = (fields["port"], fields["proto"], fields["toport"],
+                    fields["toaddr"])
+            key = args
+        elif item == "masquerade":
+            args = ( )
+            key = "masquerade"
+        else:
+            args = (value, )
+            key = value
+        signal = { "service": "Service", "port": "Port",
+                   "protocol": "Protocol", "rule": "RichRule",
+                   "interface": "Interface", "source": "Source",
+                   "masquerade": "Masquerade", "forward-port": "ForwardPort",
+                   "icmp-block": "IcmpBlock" }[item]
+        if action == "add":
+            if timeout > 0:
+                callback = getattr(self, "disableTimed%s" % signal)
+                tag = GLib.timeout_add_seconds(timeout, callback, zone,
+                                               *args)
+                self.addTimeout(zone, key, tag)
+            if not self.fw.individual_signals:
+                return
+            if item in [ "interface", "source" ]:
+                getattr(self, "%sAdded" % signal)(zone, *args)
+            else:
+                getattr(self, "%sAdded" % signal)(zone, *(args + (timeout, )))
+        else:
+            if item not in [ "interface", "source" ]:
+                self.removeTimeout(zone, key)
+            if not self.fw.individual_signals:
+                return
+            getattr(self, "%sRemoved" % signal)(zone, *args)
+
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG_INFO)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='s',
                          out_signature='b')
@@ -884,20 +1740,20 @@ class FirewallD(slip.dbus.service.Object):
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='ss',
-                         out_signature='s')
+                         out_signature='s',
+                         async_callbacks=('reply_handler', 'error_handler'))
     @dbus_handle_exceptions
-    def addInterface(self, zone, interface, sender=None):
+    def addInterface(self, zone, interface, sender=None,
+                     reply_handler=None, error_handler=None):
         """Add an interface to a zone.
         If zone is empty, use default zone.
         """
         zone = dbus_to_python(zone, str)
         interface = dbus_to_python(interface, str)
         log.debug1("zone.addInterface('%s', '%s')" % (zone, interface))
-        self.accessCheck(sender)
-        _zone = self.fw.zone.add_interface(zone, interface, sender)
-
-        self.InterfaceAdded(_zone, interface)
-        return _zone
+        self.accessCheck(sender, flush=False)
+        self.commit_queue.add(("add", zone, "interface", interface, 0),
+                              sender, reply_handler, error_handler)
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='ss',
@@ -932,20 +1788,20 @@ class FirewallD(slip.dbus.service.Object):
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='ss',
-                         out_signature='s')
+                         out_signature='s',
+                         async_callbacks=('reply_handler', 'error_handler'))
     @dbus_handle_exceptions
-    def removeInterface(self, zone, interface, sender=None):
+    def removeInterface(self, zone, interface, sender=None,
+                        reply_handler=None, error_handler=None):
         """Remove interface from a zone.
         If zone is empty, remove from zone the interface belongs to.
         """
         zone = dbus_to_python(zone, str)
         interface = dbus_to_python(interface, str)
         log.debug1("zone.removeInterface('%s', '%s')" % (zone, interface))
-        self.accessCheck(sender)
-        _zone = self.fw.zone.remove_interface(zone, interface)
-
-        self.InterfaceRemoved(_zone, interface)
-        return _zone
+        self.accessCheck(sender, flush=False)
+        self.commit_queue.add(("remove", zone, "interface", interface, 0),
+                              sender, reply_handler, error_handler)
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG_INFO)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='ss',
@@ -1005,20 +1861,20 @@ class FirewallD(slip.dbus.service.Object):
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='ss',
-                         out_signature='s')
+                         out_signature='s',
+                         async_callbacks=('reply_handler', 'error_handler'))
     @dbus_handle_exceptions
-    def addSource(self, zone, source, sender=None):
+    def addSource(self, zone, source, sender=None,
+                  reply_handler=None, error_handler=None):
         """Add a source to a zone.
         If zone is empty, use default zone.
         """
         zone = dbus_to_python(zone, str)
         source = dbus_to_python(source, str)
         log.debug1("zone.addSource('%s', '%s')" % (zone, source))
-        self.accessCheck(sender)
-        _zone = self.fw.zone.add_source(zone, source, sender)
-
-        self.SourceAdded(_zone, source)
-        return _zone
+        self.accessCheck(sender, flush=False)
+        self.commit_queue.add(("add", zone, "source", source, 0),
+                              sender, reply_handler, error_handler)
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='ss',
@@ -1039,20 +1895,20 @@ class FirewallD(slip.dbus.service.Object):
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='ss',
-                         out_signature='s')
+                         out_signature='s',
+                         async_callbacks=('reply_handler', 'error_handler'))
     @dbus_handle_exceptions
-    def removeSource(self, zone, source, sender=None):
+    def removeSource(self, zone, source, sender=None,
+                     reply_handler=None, error_handler=None):
         """Remove source from a zone.
         If zone is empty, remove from zone the source belongs to.
         """
         zone = dbus_to_python(zone, str)
         source = dbus_to_python(source, str)
         log.debug1("zone.removeSource('%s', '%s')" % (zone, source))
-        self.accessCheck(sender)
-        _zone = self.fw.zone.remove_source(zone, source)
-
-        self.SourceRemoved(_zone, source)
-        return _zone
+        self.accessCheck(sender, flush=False)
+        self.commit_queue.add(("remove", zone, "source", source, 0),
+                              sender, reply_handler, error_handler)
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG_INFO)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='ss',
@@ -1100,47 +1956,41 @@ class FirewallD(slip.dbus.service.Object):
 
     # RICH RULES
 
+    @after_operations
     @dbus_handle_exceptions
     def disableTimedRichRule(self, zone, rule):
         log.debug1("zone.disableTimedRichRule('%s', '%s')" % (zone, rule))
         del self._timeouts[zone][rule]
         obj = Rich_Rule(rule_str=rule)
         self.fw.zone.remove_rule(zone, obj)
-        self.RichRuleRemoved(zone, rule)
+        self._zoneItemsApplied([ ("remove", zone, "rule", rule, 0) ])
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='ssi',
-                         out_signature='s')
+                         out_signature='s',
+                         async_callbacks=('reply_handler', 'error_handler'))
     @dbus_handle_exceptions
-    def addRichRule(self, zone, rule, timeout, sender=None):
+    def addRichRule(self, zone, rule, timeout, sender=None,
+                    reply_handler=None, error_handler=None):
         zone = dbus_to_python(zone, str)
         rule = dbus_to_python(rule, str)
         timeout = dbus_to_python(timeout, int)
         log.debug1("zone.addRichRule('%s', '%s')" % (zone, rule))
-        obj = Rich_Rule(rule_str=rule)
-        _zone = self.fw.zone.add_rule(zone, obj, timeout)
-
-        if timeout > 0:
-            tag = GLib.timeout_add_seconds(timeout, self.disableTimedRichRule,
-                                           _zone, rule)
-            self.addTimeout(_zone, rule, tag)
-
-        self.RichRuleAdded(_zone, rule, timeout)
-        return _zone
+        self.commit_queue.add(("add", zone, "rule", rule, timeout),
+                              sender, reply_handler, error_handler)
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='ss',
-                         out_signature='s')
+                         out_signature='s',
+                         async_callbacks=('reply_handler', 'error_handler'))
     @dbus_handle_exceptions
-    def removeRichRule(self, zone, rule, sender=None):
+    def removeRichRule(self, zone, rule, sender=None,
+                       reply_handler=None, error_handler=None):
         zone = dbus_to_python(zone, str)
         rule = dbus_to_python(rule, str)
         log.debug1("zone.removeRichRule('%s', '%s')" % (zone, rule))
-        obj = Rich_Rule(rule_str=rule)
-        _zone = self.fw.zone.remove_rule(zone, obj)
-        self.removeTimeout(_zone, rule)
-        self.RichRuleRemoved(_zone, rule)
-        return _zone
+        self.commit_queue.add(("remove", zone, "rule", rule, 0),
+                              sender, reply_handler, error_handler)
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG_INFO)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='ss',
@@ -1179,51 +2029,44 @@ class FirewallD(slip.dbus.service.Object):
 
     # SERVICES
 
+    @after_operations
     @dbus_handle_exceptions
     def disableTimedService(self, zone, service):
         log.debug1("zone.disableTimedService('%s', '%s')" % (zone, service))
         del self._timeouts[zone][service]
         self.fw.zone.remove_service(zone, service)
-        self.ServiceRemoved(zone, service)
+        self._zoneItemsApplied([ ("remove", zone, "service", service, 0) ])
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='ssi',
-                         out_signature='s')
+                         out_signature='s',
+                         async_callbacks=('reply_handler', 'error_handler'))
     @dbus_handle_exceptions
-    def addService(self, zone, service, timeout, sender=None):
+    def addService(self, zone, service, timeout, sender=None,
+                   reply_handler=None, error_handler=None):
         # enables service <service> if not enabled already for zone
         zone = dbus_to_python(zone, str)
         service = dbus_to_python(service, str)
         timeout = dbus_to_python(timeout, int)
         log.debug1("zone.addService('%s', '%s', %d)" % (zone, service, timeout))
-        self.accessCheck(sender)
-
-        _zone = self.fw.zone.add_service(zone, service, timeout, sender)
-
-        if timeout > 0:
-            tag = GLib.timeout_add_seconds(timeout, self.disableTimedService,
-                                           _zone, service)
-            self.addTimeout(_zone, service, tag)
-
-        self.ServiceAdded(_zone, service, timeout)
-        return _zone
+        self.accessCheck(sender, flush=False)
+        self.commit_queue.add(("add", zone, "service", service, timeout),
+                              sender, reply_handler, error_handler)
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='ss',
-                         out_signature='s')
+                         out_signature='s',
+                         async_callbacks=('reply_handler', 'error_handler'))
     @dbus_handle_exceptions
-    def removeService(self, zone, service, sender=None):
+    def removeService(self, zone, service, sender=None,
+                      reply_handler=None, error_handler=None):
         # disables service for zone
         zone = dbus_to_python(zone, str)
         service = dbus_to_python(service, str)
         log.debug1("zone.removeService('%s', '%s')" % (zone, service))
-        self.accessCheck(sender)
-
-        _zone = self.fw.zone.remove_service(zone, service)
-
-        self.removeTimeout(_zone, service)
-        self.ServiceRemoved(_zone, service)
-        return _zone
+        self.accessCheck(sender, flush=False)
+        self.commit_queue.add(("remove", zone, "service", service, 0),
+                              sender, reply_handler, error_handler)
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG_INFO)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='ss',
@@ -1263,19 +2106,23 @@ class FirewallD(slip.dbus.service.Object):
 
     # PORTS
 
+    @after_operations
     @dbus_handle_exceptions
     def disableTimedPort(self, zone, port, protocol):
         log.debug1("zone.disableTimedPort('%s', '%s', '%s')" % \
                        (zone, port, protocol))
         del self._timeouts[zone][(port, protocol)]
         self.fw.zone.remove_port(zone, port, protocol)
-        self.PortRemoved(zone, port, protocol)
+        self._zoneItemsApplied([ ("remove", zone, "port",
+                                  "%s/%s" % (port, protocol), 0) ])
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='sssi',
-                         out_signature='s')
+                         out_signature='s',
+                         async_callbacks=('reply_handler', 'error_handler'))
     @dbus_handle_exceptions
-    def addPort(self, zone, port, protocol, timeout, sender=None):
+    def addPort(self, zone, port, protocol, timeout, sender=None,
+                reply_handler=None, error_handler=None):
         # adds port <port> <protocol> if not enabled already to zone
         zone = dbus_to_python(zone, str)
         port = dbus_to_python(port, str)
@@ -1283,34 +2130,28 @@ class FirewallD(slip.dbus.service.Object):
         timeout = dbus_to_python(timeout, int)
         log.debug1("zone.enablePort('%s', '%s', '%s')" % \
                        (zone, port, protocol))
-        self.accessCheck(sender)
-        _zone = self.fw.zone.add_port(zone, port, protocol, timeout, sender)
-
-        if timeout > 0:
-            tag = GLib.timeout_add_seconds(timeout, self.disableTimedPort,
-                                           _zone, port, protocol)
-            self.addTimeout(_zone, (port, protocol), tag)
-
-        self.PortAdded(_zone, port, protocol, timeout)
-        return _zone
+        self.accessCheck(sender, flush=False)
+        self.commit_queue.add(("add", zone, "port",
+                               "%s/%s" % (port, protocol), timeout),
+                              sender, reply_handler, error_handler)
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='sss',
-                         out_signature='s')
+                         out_signature='s',
+                         async_callbacks=('reply_handler', 'error_handler'))
     @dbus_handle_exceptions
-    def removePort(self, zone, port, protocol, sender=None):
+    def removePort(self, zone, port, protocol, sender=None,
+                   reply_handler=None, error_handler=None):
         # removes port<port> <protocol> if enabled from zone
         zone = dbus_to_python(zone, str)
         port = dbus_to_python(port, str)
         protocol = dbus_to_python(protocol, str)
         log.debug1("zone.removePort('%s', '%s', '%s')" % \
                        (zone, port, protocol))
-        self.accessCheck(sender)
-        _zone= self.fw.zone.remove_port(zone, port, protocol)
-
-        self.removeTimeout(_zone, (port, protocol))
-        self.PortRemoved(_zone, port, protocol)
-        return _zone
+        self.accessCheck(sender, flush=False)
+        self.commit_queue.add(("remove", zone, "port",
+                               "%s/%s" % (port, protocol), 0),
+                              sender, reply_handler, error_handler)
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG_INFO)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='sss',
@@ -1352,49 +2193,44 @@ class FirewallD(slip.dbus.service.Object):
 
     # PROTOCOLS
 
+    @after_operations
     @dbus_handle_exceptions
     def disableTimedProtocol(self, zone, protocol):
         log.debug1("zone.disableTimedProtocol('%s', '%s')" % (zone, protocol))
         del self._timeouts[zone][(protocol)]
         self.fw.zone.remove_protocol(zone, protocol)
-        self.ProtocolRemoved(zone, protocol)
+        self._zoneItemsApplied([ ("remove", zone, "protocol", protocol, 0) ])
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='ssi',
-                         out_signature='s')
+                         out_signature='s',
+                         async_callbacks=('reply_handler', 'error_handler'))
     @dbus_handle_exceptions
-    def addProtocol(self, zone, protocol, timeout, sender=None):
+    def addProtocol(self, zone, protocol, timeout, sender=None,
+                    reply_handler=None, error_handler=None):
         # adds protocol <protocol> if not enabled already to zone
         zone = dbus_to_python(zone, str)
         protocol = dbus_to_python(protocol, str)
         timeout = dbus_to_python(timeout, int)
         log.debug1("zone.enableProtocol('%s', '%s')" % (zone, protocol))
-        self.accessCheck(sender)
-        _zone = self.fw.zone.add_protocol(zone, protocol, timeout, sender)
-
-        if timeout > 0:
-            tag = GLib.timeout_add_seconds(timeout, self.disableTimedProtocol,
-                                           _zone, protocol)
-            self.addTimeout(_zone, protocol, tag)
-
-        self.ProtocolAdded(_zone, protocol, timeout)
-        return _zone
+        self.accessCheck(sender, flush=False)
+        self.commit_queue.add(("add", zone, "protocol", protocol, timeout),
+                              sender, reply_handler, error_handler)
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='ss',
-                         out_signature='s')
+                         out_signature='s',
+                         async_callbacks=('reply_handler', 'error_handler'))
     @dbus_handle_exceptions
-    def removeProtocol(self, zone, protocol, sender=None):
+    def removeProtocol(self, zone, protocol, sender=None,
+                       reply_handler=None, error_handler=None):
         # removes protocol<protocol> if enabled from zone
         zone = dbus_to_python(zone, str)
         protocol = dbus_to_python(protocol, str)
         log.debug1("zone.removeProtocol('%s', '%s')" % (zone, protocol))
-        self.accessCheck(sender)
-        _zone= self.fw.zone.remove_protocol(zone, protocol)
-
-        self.removeTimeout(_zone, protocol)
-        self.ProtocolRemoved(_zone, protocol)
-        return _zone
+        self.accessCheck(sender, flush=False)
+        self.commit_queue.add(("remove", zone, "protocol", protocol, 0),
+                              sender, reply_handler, error_handler)
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG_INFO)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='ss',
@@ -1434,11 +2270,12 @@ class FirewallD(slip.dbus.service.Object):
 
     # MASQUERADE
 
+    @after_operations
     @dbus_handle_exceptions
     def disableTimedMasquerade(self, zone):
         del self._timeouts[zone]["masquerade"]
         self.fw.zone.remove_masquerade(zone)
-        self.MasqueradeRemoved(zone)
+        self._zoneItemsApplied([ ("remove", zone, "masquerade", "yes", 0) ])
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='si',
@@ -1451,13 +2288,8 @@ class FirewallD(slip.dbus.service.Object):
         log.debug1("zone.addMasquerade('%s')" % (zone))
         self.accessCheck(sender)
         _zone = self.fw.zone.add_masquerade(zone, timeout, sender)
-        
-        if timeout > 0:
-            tag = GLib.timeout_add_seconds(timeout, self.disableTimedMasquerade,
-                                           _zone)
-            self.addTimeout(_zone, "masquerade", tag)
-
-        self.MasqueradeAdded(_zone, timeout)
+        self._zoneItemsApplied([ ("add", _zone, "masquerade", "yes",
+                                  timeout) ])
         return _zone
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
@@ -1470,9 +2302,7 @@ class FirewallD(slip.dbus.service.Object):
         log.debug1("zone.removeMasquerade('%s')" % (zone))
         self.accessCheck(sender)
         _zone = self.fw.zone.remove_masquerade(zone)
-
-        self.removeTimeout(_zone, "masquerade")
-        self.MasqueradeRemoved(_zone)
+        self._zoneItemsApplied([ ("remove", _zone, "masquerade", "yes", 0) ])
         return _zone
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG_INFO)
@@ -1499,11 +2329,15 @@ class FirewallD(slip.dbus.service.Object):
 
     # FORWARD PORT
 
+    @after_operations
     @dbus_handle_exceptions
-    def disable_forward_port(self, zone, port, protocol, toport, toaddr):
+    def disableTimedForwardPort(self, zone, port, protocol, toport, toaddr):
         del self._timeouts[zone][(port, protocol, toport, toaddr)]
         self.fw.zone.remove_forward_port(zone, port, protocol, toport, toaddr)
-        self.ForwardPortRemoved(zone, port, protocol, toport, toaddr)
+        self._zoneItemsApplied([ ("remove", zone, "forward-port",
+                                  self._forwardPortValue(port, protocol,
+                                                         toport, toaddr),
+                                  0) ])
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='sssssi',
@@ -1523,15 +2357,10 @@ class FirewallD(slip.dbus.service.Object):
         self.accessCheck(sender)
         _zone = self.fw.zone.add_forward_port(zone, port, protocol, toport,
                                               toaddr, timeout, sender)
-
-        if timeout > 0:
-            tag = GLib.timeout_add_seconds(timeout,
-                                           self.disable_forward_port,
-                                           _zone, port, protocol, toport,
-                                           toaddr)
-            self.addTimeout(_zone, (port, protocol, toport, toaddr), tag)
-
-        self.ForwardPortAdded(_zone, port, protocol, toport, toaddr, timeout)
+        self._zoneItemsApplied([ ("add", _zone, "forward-port",
+                                  self._forwardPortValue(port, protocol,
+                                                         toport, toaddr),
+                                  timeout) ])
         return _zone
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
@@ -1551,9 +2380,10 @@ class FirewallD(slip.dbus.service.Object):
         self.accessCheck(sender)
         _zone = self.fw.zone.remove_forward_port(zone, port, protocol, toport,
                                                  toaddr)
-
-        self.removeTimeout(_zone, (port, protocol, toport, toaddr))
-        self.ForwardPortRemoved(_zone, port, protocol, toport, toaddr)
+        self._zoneItemsApplied([ ("remove", _zone, "forward-port",
+                                  self._forwardPortValue(port, protocol,
+                                                         toport, toaddr),
+                                  0) ])
         return _zone
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG_INFO)
@@ -1602,12 +2432,13 @@ class FirewallD(slip.dbus.service.Object):
 
     # ICMP BLOCK
 
+    @after_operations
     @dbus_handle_exceptions
-    def disableTimedIcmpBlock(self, zone, icmp, sender):
+    def disableTimedIcmpBlock(self, zone, icmp):
         log.debug1("zone.disableTimedIcmpBlock('%s', '%s')" % (zone, icmp))
         del self._timeouts[zone][icmp]
         self.fw.zone.remove_icmp_block(zone, icmp)
-        self.IcmpBlockRemoved(zone, icmp)
+        self._zoneItemsApplied([ ("remove", zone, "icmp-block", icmp, 0) ])
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
     @dbus_service_method(DBUS_INTERFACE_ZONE, in_signature='ssi',
@@ -1621,13 +2452,8 @@ class FirewallD(slip.dbus.service.Object):
         log.debug1("zone.enableIcmpBlock('%s', '%s')" % (zone, icmp))
         self.accessCheck(sender)
         _zone = self.fw.zone.add_icmp_block(zone, icmp, timeout, sender)
-
-        if timeout > 0:
-            tag = GLib.timeout_add_seconds(timeout, self.disableTimedIcmpBlock,
-                                           _zone, icmp, sender)
-            self.addTimeout(_zone, icmp, tag)
-
-        self.IcmpBlockAdded(_zone, icmp, timeout)
+        self._zoneItemsApplied([ ("add", _zone, "icmp-block", icmp,
+                                  timeout) ])
         return _zone
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG)
@@ -1641,9 +2467,7 @@ class FirewallD(slip.dbus.service.Object):
         log.debug1("zone.removeIcmpBlock('%s', '%s')" % (zone, icmp))
         self.accessCheck(sender)
         _zone = self.fw.zone.remove_icmp_block(zone, icmp)
-
-        self.removeTimeout(_zone, icmp)
-        self.IcmpBlockRemoved(_zone, icmp)
+        self._zoneItemsApplied([ ("remove", _zone, "icmp-block", icmp, 0) ])
         return _zone
 
     @slip.dbus.polkit.require_auth(PK_ACTION_CONFIG_INFO)
@@ -37,8 +37,10 @@ import dbus.service
 import dbus.mainloop.glib
 import slip.dbus
 
+from firewall import config
 from firewall.config.dbus import *
 from firewall.core.logger import log
+from firewall.core.trace import trace
 from firewall.server.firewalld import FirewallD
 
 ############################################################################
@@ -53,6 +55,17 @@ def sighup(data):
 def sigterm(mainloop):
     mainloop.quit()
 
+def sigusr1(data):
+    # dump the trace spans as JSON lines
+    filename = config.FIREWALLD_LOGFILE + ".trace"
+    try:
+        trace.write(filename)
+    except Exception as msg:
+        log.error("Failed to write trace to '%s': %s", filename, msg)
+    else:
+        log.info1("Trace written to '%s'", filename)
+    return True
+
 ############################################################################
 #
 # run_server function
@@ -84,6 +97,8 @@ def run_server(debug_gc=False):
             id = GLib.timeout_add_seconds(gc_timeout, gc_collect)
 
     try:
+        # long running operations like reload are done in worker threads
+        dbus.mainloop.glib.threads_init()
         dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
         bus = dbus.SystemBus()
         name = dbus.service.BusName(DBUS_INTERFACE, bus=bus)
@@ -104,6 +119,8 @@ def run_server(debug_gc=False):
                         sighup, None)
         unix_signal_add(GLib.PRIORITY_HIGH, signal.SIGTERM,
                         sigterm, mainloop)
+        unix_signal_add(GLib.PRIORITY_HIGH, signal.SIGUSR1,
+                        sigusr1, None)
 
         mainloop.run()
 
@@ -161,6 +161,7 @@ assert_good "--help"
 assert_good "-V"
 assert_good "--reload"
 assert_good "--complete-reload"
+assert_good "--stats"
 assert_good "--panic-on"
 assert_good "--query-panic"
 assert_good "--panic-off"
@@ -341,6 +342,46 @@ assert_good "--remove-port 80/tcp --remove-port=443-444/udp"
 assert_bad  " --query-port=80/tcp"
 assert_bad  " --query-port=443-444/udp"
 
+batch=$(mktemp)
+cat > ${batch} <<EOF
+# runtime changes applied in one bulk change
+--add-port=80/tcp --add-port 443-444/udp
+--zone=${default_zone} --add-service=http
+--query-port=80/tcp
+--remove-port 80/tcp --remove-port=443-444/udp
+--remove-service=http --zone=${default_zone}
+EOF
+assert_good "--batch ${batch}"
+assert_bad  " --query-port=80/tcp"
+assert_bad  " --query-service=http"
+echo "--add-port=80/tcp" > ${batch}
+echo "--add-service=smtps" >> ${batch} # bad service name
+assert_bad  "--batch ${batch}"
+assert_bad  " --query-port=80/tcp" # not applied
+assert_bad  "--batch ${batch} --zone=${default_zone}" # impossible combination
+rm -f ${batch}
+
+ruleset=$(mktemp)
+assert_good "--add-port=8080/tcp --timeout=3600"
+assert_good "--add-service=http --timeout=3600"
+assert_good "--export-ruleset=${ruleset}"
+assert_good "--remove-port=8080/tcp"
+assert_good "--add-port=8081/tcp"
+# a chain of another tool is not changed by the import
+assert_good "--direct --passthrough ipv4 --table filter --new-chain fwtest_other"
+assert_good "--import-ruleset=${ruleset}"
+assert_good " --query-port=8080/tcp"
+assert_bad  " --query-port=8081/tcp"
+assert_good " --query-service=http"
+assert_good "--direct --passthrough ipv4 --table filter --list fwtest_other"
+assert_good "--direct --passthrough ipv4 --table filter --delete-chain fwtest_other"
+assert_good "--remove-port=8080/tcp"
+assert_good "--remove-service=http"
+echo "{" > ${ruleset}
+assert_bad  "--import-ruleset=${ruleset}" # invalid ruleset
+assert_bad  "--export-ruleset=${ruleset} --zone=${default_zone}" # impossible combination
+rm -f ${ruleset}
+
 assert_good "--permanent    --add-port=80/tcp --add-port 443-444/udp"
 assert_good "--permanent  --query-port=80/tcp --zone=${default_zone}"
 assert_good "--permanent  --query-port=443-444/udp"
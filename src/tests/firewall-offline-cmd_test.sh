@@ -309,8 +309,37 @@ assert_good "--remove-port 80/tcp --remove-port=443-444/udp"
 assert_bad  " --query-port=80/tcp"
 assert_bad  " --query-port=443-444/udp"
 
+batch=$(mktemp)
+cat > ${batch} <<EOF
+# configuration is loaded once and written at the end
+--add-port=80/tcp --add-port 443-444/udp
+--zone=${default_zone} --add-service=http
+--query-port=80/tcp
+--remove-port=443-444/udp
+EOF
+assert_good_notempty "--dry-run --batch ${batch}"
+assert_bad  " --query-port=80/tcp" # dry run
+assert_good "--batch ${batch}"
+assert_good " --query-port=80/tcp"
+assert_bad  " --query-port=443-444/udp"
+assert_good " --query-service=http"
+assert_good_notempty "--dry-run --remove-port=80/tcp"
+assert_good " --query-port=80/tcp" # dry run
+echo "--remove-port=80/tcp" > ${batch}
+echo "--add-service=smtps" >> ${batch} # bad service name
+assert_bad  "--batch ${batch}"
+assert_good " --query-port=80/tcp" # nothing written
+echo "--remove-service=http" > ${batch}
+echo "firewall-offline-cmd --remove-port=80/tcp" >> ${batch}
+assert_good "--batch ${batch}"
+assert_bad  " --query-port=80/tcp"
+assert_bad  " --query-service=http"
+rm -f ${batch}
+
 assert_good "   --add-masquerade --zone=${default_zone}"
 assert_good " --query-masquerade "
+assert_good_contains "--compile-ruleset=ipv4" "MASQUERADE"
+assert_bad  "--compile-ruleset=ipv5"
 assert_good "--remove-masquerade"
 assert_bad  " --query-masquerade"
 
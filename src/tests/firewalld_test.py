@@ -24,6 +24,9 @@
 # To use in git tree: PYTHONPATH=.. python firewalld-test.py
 
 import dbus
+import json
+import os
+import subprocess
 import sys
 import time
 import unittest
@@ -33,6 +36,19 @@ from firewall.config.dbus import *
 from firewall.dbus_utils import dbus_to_python
 from pprint import pprint
 
+# baseline for one-shot commands: interpreter start, import of dbus and a
+# plain getDefaultZone call
+STARTUP_BASELINE = """
+import dbus
+obj = dbus.SystemBus().get_object("%s", "%s", introspect=False)
+print(obj.getDefaultZone(dbus_interface="%s"))
+""" % (DBUS_INTERFACE, DBUS_PATH, DBUS_INTERFACE)
+# firewall-cmd --state and --get-default-zone may take at most this factor
+# of the baseline
+STARTUP_FACTOR = 2.0
+FIREWALL_CMD = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            os.pardir, "firewall-cmd")
+
 class TestFirewallD(unittest.TestCase):
     """
     For testing of temporary changes, ie. those that disappear with restart:
@@ -46,6 +62,8 @@ class TestFirewallD(unittest.TestCase):
         self.fw = dbus.Interface(dbus_obj, dbus_interface=DBUS_INTERFACE)
         self.fw_zone = dbus.Interface(dbus_obj,
                                      dbus_interface=DBUS_INTERFACE_ZONE)
+        self.fw_metrics = dbus.Interface(dbus_obj,
+                                         dbus_interface=DBUS_INTERFACE_METRICS)
 
     def test_get_setDefaultZone(self):
         old_zone = dbus_to_python(self.fw.getDefaultZone())
@@ -86,6 +104,17 @@ class TestFirewallD(unittest.TestCase):
         z = self.fw_zone.getZones()
         print ("\nZones:"); pprint(dbus_to_python(z))
 
+    def test_getAllSettings(self):
+        print ("\nGetting settings of all zones, services and icmptypes")
+        (default_zone, zones, services, icmptypes) = \
+            dbus_to_python(self.fw.getAllSettings())
+        self.assertEqual(default_zone, self.fw.getDefaultZone())
+        self.assertEqual(sorted(zones.keys()), self.fw_zone.getZones())
+        self.assertEqual(sorted(services.keys()), self.fw.listServices())
+        self.assertEqual(sorted(icmptypes.keys()), self.fw.listIcmpTypes())
+        self.assertEqual(zones[default_zone],
+                         dbus_to_python(self.fw.getZoneSettings(default_zone)))
+
     def test_zone_add_remove_queryInterface(self):
         interface = "foo"
         zone = "trusted"
@@ -296,6 +325,39 @@ class TestFirewallD(unittest.TestCase):
         print ("Checking if timeout has been working: ")
         self.assertFalse(self.fw_zone.queryIcmpBlock(zone, icmp))
 
+    def test_zone_bulkChange(self):
+        zone = "public"
+        operations = [ ("add", zone, "service", "samba", 0),
+                       ("add", zone, "port", "443/tcp", 0),
+                       ("add", zone, "interface", "foo", 0) ]
+        print ("\nApplying %d operations to '%s' zone" % (len(operations),
+                                                          zone))
+        ret = dbus_to_python(self.fw_zone.bulkChange(operations))
+        self.assertEqual(ret, [ (True, zone) ] * len(operations))
+        self.assertTrue(self.fw_zone.queryService(zone, "samba"))
+        self.assertTrue(self.fw_zone.queryPort(zone, "443", "tcp"))
+        self.assertTrue(self.fw_zone.queryInterface(zone, "foo"))
+
+        print ("Applying operations with one invalid operation")
+        operations = [ ("remove", zone, "service", "samba", 0),
+                       ("remove", zone, "port", "443/tcp", 0),
+                       ("add", zone, "interface", "foo", 0) ]
+        ret = dbus_to_python(self.fw_zone.bulkChange(operations))
+        self.assertFalse(ret[0][0])
+        self.assertFalse(ret[1][0])
+        self.assertTrue(ret[2][1].startswith("ZONE_ALREADY_SET"))
+        print ("Checking that nothing has been applied")
+        self.assertTrue(self.fw_zone.queryService(zone, "samba"))
+        self.assertTrue(self.fw_zone.queryPort(zone, "443", "tcp"))
+
+        operations = [ ("remove", zone, "service", "samba", 0),
+                       ("remove", zone, "port", "443/tcp", 0),
+                       ("remove", zone, "interface", "foo", 0) ]
+        ret = dbus_to_python(self.fw_zone.bulkChange(operations))
+        self.assertEqual(ret, [ (True, zone) ] * len(operations))
+        self.assertFalse(self.fw_zone.queryService(zone, "samba"))
+        self.assertFalse(self.fw_zone.queryInterface(zone, "foo"))
+
     def test_reload(self):
         interface = "foo"
         zone = "work"
@@ -307,6 +369,41 @@ class TestFirewallD(unittest.TestCase):
 
         self.fw_zone.removeInterface(zone, interface) #cleanup
 
+    def test_metrics(self):
+        self.fw.reload()
+        print ("\nChecking metrics after reload")
+        counters = dbus_to_python(self.fw_metrics.getCounters())
+        self.assertTrue(counters.get("backend_commands:ipv4", 0) > 0)
+        gauges = dbus_to_python(self.fw_metrics.getGauges())
+        self.assertTrue(gauges.get("rules:ipv4:filter:INPUT", 0) > 0)
+        self.assertEqual(gauges["backlog:operations"], 0)
+        histograms = dbus_to_python(self.fw_metrics.getHistograms())
+        (count, total, maximum, buckets) = histograms["reload:total"]
+        self.assertTrue(count > 0)
+        self.assertEqual(sum(buckets), count)
+        self.assertTrue("dbus:reload" in histograms)
+        spans = [ json.loads(x) for x in self.fw_metrics.getTraceSpans() ]
+        self.assertTrue(len(spans) > 0)
+        self.assertTrue("handle_rules" in [ x["name"] for x in spans ])
+
+    def _startup_time(self, args):
+        # best of three runs in a fresh interpreter
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        times = [ ]
+        for i in range(3):
+            start = time.time()
+            subprocess.check_output([ sys.executable ] + args, env=env)
+            times.append(time.time() - start)
+        return min(times)
+
+    def test_client_startup(self):
+        baseline = self._startup_time([ "-c", STARTUP_BASELINE ])
+        for option in [ "--state", "--get-default-zone" ]:
+            duration = self._startup_time([ FIREWALL_CMD, option ])
+            print ("\nfirewall-cmd %s took %.3fs, baseline %.3fs" % \
+                   (option, duration, baseline))
+            self.assertTrue(duration < baseline * STARTUP_FACTOR)
+
 if __name__ == '__main__':
     suite = unittest.TestLoader().loadTestsFromTestCase(TestFirewallD)
     unittest.TextTestRunner(verbosity=2).run(suite)
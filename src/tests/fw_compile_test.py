@@ -0,0 +1,106 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+# To use in git tree: PYTHONPATH=.. python fw_compile_test.py
+
+import unittest
+
+from firewall.core import ipXtables
+from firewall.core import ebtables
+from firewall.core.fw_compile import compiled_ruleset
+
+class TestCompiledRuleset(unittest.TestCase):
+    def setUp(self):
+        self.ruleset = compiled_ruleset("ipv4", ipXtables.BUILT_IN_CHAINS)
+
+    def rules(self, table="filter"):
+        return [ x for x in self.ruleset.restore_document().split("*")
+                 if x.startswith(table + "\n") ][0].splitlines()
+
+    def test_default_rules(self):
+        for table in ipXtables.DEFAULT_RULES:
+            for rule in ipXtables.DEFAULT_RULES[table]:
+                self.ruleset.set_rule([ "-t", table ] + rule.split())
+        lines = self.rules()
+        self.assertEqual(lines[:4], [ "filter", ":INPUT ACCEPT [0:0]",
+                                      ":OUTPUT ACCEPT [0:0]",
+                                      ":FORWARD ACCEPT [0:0]" ])
+        self.assertIn(":INPUT_direct - [0:0]", lines)
+        self.assertEqual(lines[-1], "COMMIT")
+        inputs = [ x for x in lines if x.startswith("-A INPUT ") ]
+        self.assertEqual(len(inputs), 8)
+        self.assertEqual(inputs[2], "-A INPUT -j INPUT_direct")
+
+    def test_insert_delete(self):
+        self.ruleset.set_rule([ "-N", "IN_x", "-t", "filter" ])
+        self.ruleset.set_rule([ "-A", "IN_x", "-j", "ACCEPT" ])
+        self.ruleset.set_rule([ "-I", "IN_x", 1, "-p", "tcp", "-j", "DROP" ])
+        self.ruleset.set_rule([ "-t", "filter", "--insert", "IN_x", "2",
+                                "-m", "comment", "--comment", "a b" ])
+        self.assertEqual([ x for x in self.rules() if x.startswith("-A") ],
+                         [ "-A IN_x -p tcp -j DROP",
+                           '-A IN_x -m comment --comment "a b"',
+                           "-A IN_x -j ACCEPT" ])
+        self.ruleset.set_rule([ "-D", "IN_x", "-p", "tcp", "-j", "DROP" ])
+        self.ruleset.set_rule([ "-D", "IN_x", "1" ])
+        self.assertRaises(ValueError, self.ruleset.set_rule,
+                          [ "-D", "IN_x", "-j", "DROP" ])
+        self.assertRaises(ValueError, self.ruleset.set_rule,
+                          [ "-X", "IN_x" ])
+        self.ruleset.set_rule([ "-F", "IN_x" ])
+        self.ruleset.set_rule([ "-X", "IN_x" ])
+        self.assertNotIn(":IN_x - [0:0]", self.rules())
+        self.assertRaises(ValueError, self.ruleset.set_rule,
+                          [ "-A", "IN_x", "-j", "ACCEPT" ])
+        self.assertRaises(ValueError, self.ruleset.set_rule,
+                          [ "-L", "-n" ])
+
+    def test_restore_rules(self):
+        self.ruleset.restore_rules("nat", [ [ "-N", "x" ],
+                                            [ "-I", "x", "1", "-j", "ACCEPT" ] ])
+        self.assertIn("-A x -j ACCEPT", self.rules("nat"))
+        # all or nothing
+        self.assertRaises(ValueError, self.ruleset.restore_rules, "nat",
+                          [ [ "-A", "x", "-j", "DROP" ],
+                            [ "-A", "y", "-j", "DROP" ] ])
+        self.assertNotIn("-A x -j DROP", self.rules("nat"))
+        # test only
+        self.ruleset.restore_rules("nat", [ [ "-A", "x", "-j", "DROP" ] ],
+                                   test=True)
+        self.assertNotIn("-A x -j DROP", self.rules("nat"))
+
+    def test_policy(self):
+        self.ruleset.set_policy("DROP")
+        self.assertIn(":INPUT DROP [0:0]", self.rules())
+        self.assertIn(":PREROUTING ACCEPT [0:0]", self.rules("nat"))
+        self.ruleset.flush()
+        self.assertIn(":INPUT ACCEPT [0:0]", self.rules())
+
+    def test_ebtables(self):
+        ruleset = compiled_ruleset("eb", ebtables.BUILT_IN_CHAINS)
+        for table in ebtables.DEFAULT_RULES:
+            for rule in ebtables.DEFAULT_RULES[table]:
+                ruleset.set_rule([ "-t", table ] + rule.split())
+        document = ruleset.restore_document()
+        self.assertIn(":INPUT_direct RETURN\n", document)
+        self.assertIn("-A INPUT -j INPUT_direct\n", document)
+        self.assertNotIn("COMMIT", document)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+# To use in git tree: PYTHONPATH=.. python fw_types_test.py
+
+import random
+import unittest
+
+from firewall.fw_types import LastUpdatedOrderedDict, PriorityPositions
+
+def naive_index(counts, priority):
+    # insert position as computed before by FirewallDirect.__rule
+    index = 1
+    positions = sorted(counts.keys())
+    j = 0
+    while j < len(positions) and priority >= positions[j]:
+        index += counts[positions[j]]
+        j += 1
+    return index
+
+class TestPriorityPositions(unittest.TestCase):
+    def check(self, priorities, seed):
+        rnd = random.Random(seed)
+        positions = PriorityPositions()
+        counts = { }
+        added = [ ]
+        for priority in priorities:
+            if len(added) > 0 and rnd.random() < 0.3:
+                removed = added.pop(rnd.randrange(len(added)))
+                positions.remove(removed)
+                counts[removed] -= 1
+                if counts[removed] == 0:
+                    del counts[removed]
+            self.assertEqual(1 + positions.count_le(priority),
+                             naive_index(counts, priority))
+            positions.add(priority)
+            counts[priority] = counts.get(priority, 0) + 1
+            added.append(priority)
+            self.assertEqual(len(positions), len(added))
+        self.assertEqual(positions.keys(), sorted(counts.keys()))
+
+    def test_few_priorities(self):
+        for seed in range(10):
+            rnd = random.Random(seed)
+            self.check([ rnd.randint(-3, 3) for i in range(500) ], seed)
+
+    def test_many_priorities(self):
+        for seed in range(10):
+            rnd = random.Random(seed)
+            self.check([ rnd.randint(-100000, 100000) for i in range(500) ],
+                       seed)
+
+    def test_growing_range(self):
+        # priorities outside of the covered range rebuild the tree
+        self.check([ (-1) ** i * 2 ** i for i in range(40) ], 0)
+
+    def test_remove_missing(self):
+        positions = PriorityPositions()
+        positions.add(1)
+        self.assertRaises(ValueError, positions.remove, 2)
+        positions.remove(1)
+        self.assertRaises(ValueError, positions.remove, 1)
+        self.assertEqual(positions.count_le(1), 0)
+
+class TestLastUpdatedOrderedDict(unittest.TestCase):
+    def test_order(self):
+        d = LastUpdatedOrderedDict()
+        d["a"] = 1
+        d["b"] = 2
+        d["c"] = 3
+        # an update keeps the position of the key
+        d["a"] = 4
+        self.assertEqual(d.keys(), [ "a", "b", "c" ])
+        self.assertEqual(d.values(), [ 4, 2, 3 ])
+        self.assertEqual(d.items(), [ ("a", 4), ("b", 2), ("c", 3) ])
+        del d["b"]
+        d["b"] = 5
+        self.assertEqual(d.keys(), [ "a", "c", "b" ])
+        self.assertEqual(list(d), [ "a", "c", "b" ])
+        # deleting a missing key is ignored
+        del d["x"]
+        self.assertEqual(len(d), 3)
+        self.assertEqual(d.copy().items(), d.items())
+
+    def test_membership(self):
+        d = LastUpdatedOrderedDict()
+        d[("tcp", "80")] = None
+        d["ssh"] = 1
+        self.assertTrue(("tcp", "80") in d)
+        self.assertTrue("ssh" in d)
+        self.assertFalse("http" in d)
+        self.assertFalse(0 in d)
+        del d["ssh"]
+        self.assertFalse("ssh" in d)
+        self.assertEqual(d.setdefault("ssh", 2), 2)
+        self.assertEqual(d.setdefault("ssh", 3), 2)
+
+    def test_index(self):
+        # integer keys that are not in the dict are indexes into the keys
+        d = LastUpdatedOrderedDict()
+        d["a"] = 1
+        d["b"] = 2
+        d["c"] = 3
+        self.assertEqual(d[0], "a")
+        self.assertEqual(d[2], "c")
+        self.assertEqual(d[-1], "c")
+        del d["a"]
+        self.assertEqual(d[0], "b")
+        self.assertRaises(IndexError, d.__getitem__, 2)
+
+    def test_delete_while_iterating(self):
+        d = LastUpdatedOrderedDict()
+        for i in range(10):
+            d["key%d" % i] = i
+        visited = [ ]
+        for key in d:
+            visited.append(key)
+            del d[key]
+        self.assertEqual(visited, [ "key%d" % i for i in range(10) ])
+        self.assertEqual(len(d), 0)
+        self.assertEqual(d.keys(), [ ])
+
+if __name__ == '__main__':
+    unittest.main()